@@ -1,6 +1,7 @@
 import streamlit as st
-from fiber_service_manager import FiberOpticServiceManager
-from fiber_calendar import FiberOpticCalendarIntegration
+import time
+import pandas as pd
+from fiber_service_manager import FiberOpticServiceManager, get_metrics_recorder
 from dashboard import show_dashboard
 from new_order import show_new_order
 from manage_orders import show_manage_orders
@@ -8,6 +9,38 @@ from calendar_view import show_calendar
 from reports import show_reports
 from settings import show_settings
 from schema import show_database_schema
+from snapshot import age_text
+import metrics
+
+# Intervalo (segundos) em que cada sessão confere se os dados mudaram
+DATA_CHANGE_CHECK_SECONDS = 5
+
+@st.fragment(run_every=DATA_CHANGE_CHECK_SECONDS)
+def watch_data_changes(feed):
+    """Reexecuta a página apenas quando o change feed registrou alguma mudança"""
+    if feed.version != st.session_state.get("data_version"):
+        st.rerun(scope="app")
+
+def show_debug_metrics(recorder, summary):
+    """Chamadas ao backend e tempo de renderização do rerun atual, com exportação"""
+    with st.sidebar.expander("🐞 Desempenho (depuração)", expanded=True):
+        st.metric("Renderização da página", f"{summary['render_seconds'] * 1000:.0f} ms")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Consultas", summary["backend_calls"])
+        col2.metric("Backend", f"{summary['backend_seconds'] * 1000:.0f} ms")
+        col3.metric("Repetidas", summary["duplicate_fetches"])
+        if summary["by_table"]:
+            calls = pd.DataFrame([
+                {"Chamada": key, "Qtd": entry["calls"], "ms": round(entry["seconds"] * 1000, 1),
+                 "Linhas": entry["rows"], "KB": round(entry["bytes"] / 1024, 1),
+                 "Repetidas": summary["duplicates_by_table"].get(key, 0)}
+                for key, entry in summary["by_table"].items()
+            ])
+            st.dataframe(calls, hide_index=True, use_container_width=True)
+        st.download_button("⬇️ Prometheus", recorder.to_prometheus(), file_name="fiber_os_metrics.prom",
+                           mime="text/plain")
+        st.download_button("⬇️ JSON lines", recorder.to_json_lines(), file_name="fiber_os_reruns.jsonl",
+                           mime="application/x-ndjson")
 
 def main():
     st.set_page_config(page_title="Sistema de OS - Fibra Óptica", page_icon="🌐", layout="wide")
@@ -15,11 +48,27 @@ def main():
     st.markdown("**Sistema de Gestão de Ordens de Serviço para Técnicos de Fibra Óptica**")
     st.markdown("---")
 
+    # O rerun começa antes do manager: probe do backend, cold start e bootstrap entram nas métricas
+    rerun = get_metrics_recorder().start_rerun()
     manager = FiberOpticServiceManager()
-    if not manager.supabase:
-        st.error("❌ Não foi possível conectar ao banco de dados. Verifique as configurações do Supabase.")
+    if not manager.storage:
+        st.error("❌ Não foi possível conectar ao banco de dados. Verifique as configurações do Supabase ou do STORAGE_BACKEND.")
         return
 
+    snapshot = manager.snapshot
+    if manager.offline:
+        st.warning(f"📴 **Sem conexão com o banco de dados.** Exibindo o snapshot local salvo em "
+                   f"{snapshot.saved_at.astimezone().strftime('%d/%m/%Y %H:%M')} ({age_text(snapshot.saved_at)}), "
+                   "somente leitura: criar, editar e excluir estão desabilitados até a conexão voltar.")
+    elif snapshot.serving_since:
+        st.info(f"⏳ Exibindo o snapshot local de {snapshot.serving_since.astimezone().strftime('%d/%m/%Y %H:%M')} "
+                f"({age_text(snapshot.serving_since)}) enquanto os dados atualizados carregam.")
+
+    # Versão dos dados com que esta renderização foi feita
+    st.session_state["data_version"] = manager.changes.version
+    with st.sidebar:
+        watch_data_changes(manager.changes)
+
     st.sidebar.title("🔧 Navegação")
     st.sidebar.markdown("**Fibra Óptica OS**")
     page = st.sidebar.selectbox(
@@ -27,29 +76,42 @@ def main():
         ["📊 Dashboard", "📝 Nova OS", "🔧 Gerenciar OS", "📅 Calendário", "📈 Relatórios", "⚙️ Configurações"]
     )
 
+    rerun.page = page
+
     with st.sidebar.expander("ℹ️ Status do Sistema"):
-        orders = manager.get_all_orders()
-        total_os = len(orders)
-        pending_os = len([o for o in orders if o["status"] == "Agendado"])
-        st.metric("Total OS", total_os)
-        st.metric("OS Pendentes", pending_os)
-        st.success("✅ Conectado ao Supabase")
+        # Mesmos frames do Dashboard: o manager guarda o resultado durante o rerun
+        frame, _ = manager.get_kpi_frames(with_technicians=False)
+        kpis = metrics.summary(frame)
+        st.metric("Total OS", kpis["total"])
+        st.metric("OS Pendentes", kpis["pending"])
+        if manager.offline:
+            st.error("📴 Offline: dados do snapshot local")
+        else:
+            st.success("✅ Conectado ao Supabase")
     
-    if page == "📊 Dashboard":
-        show_dashboard(manager)
-    elif page == "📝 Nova OS":
-        show_new_order(manager)
-    elif page == "🔧 Gerenciar OS":
-        show_manage_orders(manager)
-    elif page == "📅 Calendário":
-        show_calendar(manager)
-    elif page == "📈 Relatórios":
-        show_reports(manager)
-    elif page == "⚙️ Configurações":
-        show_settings(manager)
+    started = time.perf_counter()
+    try:
+        if page == "📊 Dashboard":
+            show_dashboard(manager)
+        elif page == "📝 Nova OS":
+            show_new_order(manager)
+        elif page == "🔧 Gerenciar OS":
+            show_manage_orders(manager)
+        elif page == "📅 Calendário":
+            show_calendar(manager)
+        elif page == "📈 Relatórios":
+            show_reports(manager)
+        elif page == "⚙️ Configurações":
+            show_settings(manager)
+    finally:
+        # Também fecha o rerun quando a página chama st.rerun()/st.stop()
+        summary = manager.metrics.finish_rerun(time.perf_counter() - started)
 
     if st.sidebar.checkbox("🗄️ Mostrar Schema SQL"):
         show_database_schema()
 
+    if st.sidebar.checkbox("🐞 Mostrar Métricas de Desempenho"):
+        show_debug_metrics(manager.metrics, summary)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""Benchmark do motor de métricas (metrics.py).
+
+Gera ordens sintéticas em tamanhos crescentes e mede o tempo de montar o
+frame e calcular todos os KPIs usados por dashboard e relatórios. O tempo
+por ordem deve ficar aproximadamente constante (escala linear).
+
+Uso: python benchmarks/bench_metrics.py [--sizes 10000,100000,500000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+SERVICE_TYPES = ["Instalação", "Reparo", "Manutenção", "Mudança", "Upgrade", "Diagnóstico", "Cancelamento"]
+REGIONS = ["Centro", "Zona Sul", "Zona Norte", "Zona Oeste", "Zona Leste"]
+
+
+def generate(n_orders, n_services=10, n_technicians=200, seed=42):
+    rng = random.Random(seed)
+    services = [{"id": i, "type": SERVICE_TYPES[i % len(SERVICE_TYPES)]} for i in range(1, n_services + 1)]
+    technicians = [{"id": i, "name": f"Técnico {i}", "region": REGIONS[i % len(REGIONS)]}
+                   for i in range(1, n_technicians + 1)]
+    start = date.today() - timedelta(days=365)
+    orders = [{
+        "id": i,
+        "service_id": rng.randint(1, n_services),
+        "technician_id": rng.randint(1, n_technicians),
+        "scheduled_date": (start + timedelta(days=rng.randint(0, 365))).isoformat(),
+        "status": rng.choice(metrics.STATUS_CATEGORIES),
+        "priority": rng.choice(metrics.PRIORITY_CATEGORIES),
+        "estimated_cost": round(rng.uniform(0, 300), 2),
+    } for i in range(1, n_orders + 1)]
+    return orders, services, technicians
+
+
+def run_all_kpis(orders, services, technicians):
+    frame = metrics.build_orders_frame(orders, services, technicians)
+    period = metrics.filter_period(frame, date.today() - timedelta(days=30), date.today())
+    for subset in (frame, period):
+        metrics.summary(subset)
+        metrics.type_distribution(subset)
+        metrics.region_distribution(subset)
+        metrics.service_type_report(subset)
+        metrics.technician_report(subset)
+        metrics.region_type_matrix(subset)
+        metrics.daily_counts(subset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,50000,100000,250000,500000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'ordens':>10} {'melhor (s)':>12} {'µs/ordem':>10}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        data = generate(size)
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            run_all_kpis(*data)
+            best = min(best, time.perf_counter() - started)
+        print(f"{size:>10} {best:>12.3f} {best / size * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Benchmark dos caminhos de dados de cada página contra o backend SQLite.
+
+Gera um banco sintético (datagen.py), monta o FiberOpticServiceManager sobre
+ele e mede, por cenário, o tempo de parede, o pico de memória (tracemalloc)
+e as chamadas ao backend. Cada repetição começa com os caches do manager
+vazios (carga a frio), salvo nos cenários marcados como "warm".
+
+A saída é JSON, para comparar execuções entre commits:
+
+    python benchmarks/bench_pages.py --orders 100000 --output antes.json
+
+Uso: python benchmarks/bench_pages.py [--orders N --clients N --technicians N --repeat N --db arquivo]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import datagen
+import metrics
+from fiber_calendar import CalendarFeeds
+from fiber_service_manager import FiberOpticServiceManager, ORDER_CALENDAR_SELECT, ORDER_DETAIL_CACHE_SIZE
+from data_cache import LRUCache, TableCache
+from order_store import OrderStore
+
+
+class CountingStorage:
+    """Repassa as chamadas a outro backend contando operações e linhas por tabela"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.calls = Counter()
+        self.rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def _wrap(self, operation, table, *args, **kwargs):
+        result = getattr(self.storage, operation)(table, *args, **kwargs)
+        self.calls[f"{operation}:{table}"] += 1
+        rows = result[0] if operation == "select" else result
+        self.rows += len(rows or [])
+        return result
+
+    def select(self, table, *args, **kwargs):
+        return self._wrap("select", table, *args, **kwargs)
+
+    def insert(self, table, *args, **kwargs):
+        return self._wrap("insert", table, *args, **kwargs)
+
+    def update(self, table, *args, **kwargs):
+        return self._wrap("update", table, *args, **kwargs)
+
+    def delete(self, table, *args, **kwargs):
+        return self._wrap("delete", table, *args, **kwargs)
+
+    def upsert(self, table, *args, **kwargs):
+        return self._wrap("upsert", table, *args, **kwargs)
+
+    def reset(self):
+        self.calls.clear()
+        self.rows = 0
+
+
+def orders_dataframe(manager, today):
+    return manager.get_orders_dataframe()
+
+
+def dashboard(manager, today):
+    frame, _ = manager.get_kpi_frames(with_technicians=False)
+    metrics.summary(frame)
+    metrics.type_distribution(frame)
+    metrics.region_distribution(frame)
+    upcoming, _ = manager.query_orders(status="Agendado", limit=8, ascending=True)
+    return manager.build_orders_dataframe(upcoming)
+
+
+def reports(manager, today):
+    period, tech_period = manager.get_kpi_frames(today - timedelta(days=30), today)
+    metrics.summary(period)
+    metrics.service_type_report(period)
+    metrics.technician_report(tech_period)
+    metrics.region_type_matrix(period)
+    return metrics.daily_counts(period)
+
+
+def reports_fallback(manager, today):
+    # Mesmo relatório sem os rollups: todas as ordens vão para o pandas
+    manager.cache.set("rollups_available", False)
+    return reports(manager, today)
+
+
+def calendar_month(manager, today):
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    # Mesmo caminho da página Calendário: todas as ordens do mês, sem limite de página
+    return manager.get_orders_between(month_start, month_end, columns=ORDER_CALENDAR_SELECT)
+
+
+def manage_orders_page(manager, today):
+    orders, total = manager.query_orders(limit=50)
+    return manager.build_orders_dataframe(orders)
+
+
+def manage_orders_search(manager, today):
+    orders, total = manager.query_orders(text="Silva", limit=50)
+    return manager.build_orders_dataframe(orders)
+
+
+# Digitação progressiva na busca rápida de Gerenciar OS
+TYPEAHEAD_QUERIES = ["j", "jo", "joa", "joao", "joao s", "joao si", "joao silva", "os00", "cto-001", "paulista"]
+
+
+def search_typeahead(manager, today):
+    for query in TYPEAHEAD_QUERIES:
+        manager.search_orders(query)
+
+
+def _prepare_search(manager):
+    # O índice é feito uma vez por versão dos dados; mede-se só a digitação
+    manager.search_orders("x")
+
+
+def orders_dataframe_warm(manager, today):
+    return manager.get_orders_dataframe()
+
+
+def _prepare_warm(manager):
+    manager.get_orders_dataframe()
+    # Força o delta na próxima chamada (sem esperar o intervalo mínimo entre sincronizações)
+    manager.orders._last_sync = 0.0
+
+
+# (nome, função, prepara) — `prepara` roda depois de zerar os caches e fora da medição
+SCENARIOS = [
+    ("orders_dataframe", orders_dataframe, None),
+    ("orders_dataframe_warm", orders_dataframe_warm, _prepare_warm),
+    ("dashboard", dashboard, None),
+    ("reports", reports, None),
+    ("reports_fallback", reports_fallback, None),
+    ("calendar_month", calendar_month, None),
+    ("manage_orders_page", manage_orders_page, None),
+    ("manage_orders_search", manage_orders_search, None),
+    ("search_typeahead", search_typeahead, _prepare_search),
+]
+
+
+def reset_caches(manager):
+    # Todos os caches do processo que o manager usa; índices de busca, rotas e
+    # flags de disponibilidade ficam no TableCache e saem junto com ele
+    manager.cache = TableCache(ttl=manager.cache.ttl)
+    manager.orders = OrderStore()
+    manager.order_details = LRUCache(maxsize=ORDER_DETAIL_CACHE_SIZE)
+    manager.calendar_feeds = CalendarFeeds()
+    manager._kpi_frames = {}
+
+
+def build_manager(db_path):
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = db_path
+    # Fora do `streamlit run` os decorators de cache emitem avisos a cada chamada
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    manager = FiberOpticServiceManager()
+    manager.storage = CountingStorage(manager.storage)
+    return manager
+
+
+def run_scenario(manager, function, prepare, today, repeat):
+    times = []
+    for _ in range(repeat):
+        reset_caches(manager)
+        if prepare:
+            prepare(manager)
+        manager.storage.reset()
+        started = time.perf_counter()
+        function(manager, today)
+        times.append(time.perf_counter() - started)
+    calls = dict(manager.storage.calls)
+    rows = manager.storage.rows
+
+    # Memória medida numa execução à parte: o tracemalloc distorce os tempos
+    reset_caches(manager)
+    if prepare:
+        prepare(manager)
+    tracemalloc.start()
+    function(manager, today)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_s": {"min": min(times), "median": statistics.median(times), "max": max(times)},
+        "peak_memory_bytes": peak,
+        "backend_calls": sum(calls.values()),
+        "backend_calls_by_table": calls,
+        "rows_fetched": rows,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=50_000)
+    parser.add_argument("--technicians", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scenarios", help="lista separada por vírgula (padrão: todos)")
+    parser.add_argument("--db", help="banco SQLite já gerado por datagen.py (senão, gera um temporário)")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    today = date.today()
+    workdir = None
+    db_path = args.db
+    generation_s = None
+    if not db_path:
+        workdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(workdir.name, "bench.db")
+        started = time.perf_counter()
+        datagen.generate(datagen.SQLiteStorage(db_path), args.orders, args.clients, args.technicians,
+                         seed=args.seed, today=today)
+        generation_s = time.perf_counter() - started
+
+    manager = build_manager(db_path)
+    selected = set(args.scenarios.split(",")) if args.scenarios else None
+    results = {}
+    for name, function, prepare in SCENARIOS:
+        if selected is None or name in selected:
+            results[name] = run_scenario(manager, function, prepare, today, args.repeat)
+            print(f"{name}: {results[name]['wall_s']['median']:.3f}s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "backend": manager.storage.name,
+            "orders": args.orders if not args.db else None,
+            "clients": args.clients if not args.db else None,
+            "technicians": args.technicians if not args.db else None,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "generation_s": generation_s,
+            "date": today.isoformat(),
+        },
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if workdir:
+        manager.storage.connection.close()
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
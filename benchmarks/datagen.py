@@ -0,0 +1,143 @@
+"""Gerador de dados sintéticos para benchmarks.
+
+Preenche um banco SQLite (storage.SQLiteStorage) com clientes, técnicos,
+serviços, equipamentos e ordens em distribuições próximas das reais:
+status concentrado em concluídas, datas mais densas perto de hoje e
+carga desigual entre técnicos e clientes.
+
+Uso: python benchmarks/datagen.py banco.db [--orders 100000 --clients 50000 --technicians 200]
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SQLiteStorage
+
+FIRST_NAMES = ["João", "Maria", "José", "Ana", "Carlos", "Mariana", "Paulo", "Fernanda", "Lucas", "Juliana",
+               "Pedro", "Camila", "Rafael", "Beatriz", "Gustavo", "Letícia", "André", "Patrícia", "Márcio", "Luíza"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima",
+              "Gomes", "Costa", "Ribeiro", "Martins", "Carvalho", "Araújo", "Conceição", "Simões", "Gonçalves"]
+STREETS = ["Rua das Flores", "Av. Paulista", "Rua Augusta", "Rua da Consolação", "Av. Brigadeiro Faria Lima",
+           "Rua Vergueiro", "Av. São João", "Rua Teodoro Sampaio", "Rua Oscar Freire", "Av. Ipiranga"]
+NEIGHBORHOODS = ["Vila Madalena", "Bela Vista", "Consolação", "Pinheiros", "Moema", "Santana", "Tatuapé",
+                 "Lapa", "Butantã", "Mooca"]
+PLANS = ["100MB", "200MB", "300MB", "500MB", "1GB"]
+# Caixa aproximada da cidade de São Paulo, para as coordenadas dos clientes
+LATITUDE_RANGE = (-23.75, -23.45)
+LONGITUDE_RANGE = (-46.80, -46.40)
+REGIONS = ["Centro", "Zona Sul", "Zona Norte", "Zona Oeste", "Zona Leste"]
+SPECIALTIES = ["Instalação", "Reparo", "Manutenção", "Geral"]
+LEVELS = ["Júnior", "Pleno", "Sênior"]
+SERVICES = [
+    ("Instalação Residencial", "Instalação", 0.00, 3), ("Instalação Empresarial", "Instalação", 0.00, 4),
+    ("Reparo de Cabo Rompido", "Reparo", 150.00, 2), ("Troca de Equipamento ONT", "Manutenção", 80.00, 1),
+    ("Mudança de Endereço", "Mudança", 100.00, 3), ("Upgrade de Plano", "Upgrade", 0.00, 1),
+    ("Reparo em CTO", "Reparo", 200.00, 4), ("Verificação de Sinal", "Diagnóstico", 50.00, 1),
+    ("Emenda de Fibra", "Reparo", 120.00, 2), ("Cancelamento", "Cancelamento", 0.00, 1),
+]
+SERVICE_WEIGHTS = [30, 8, 14, 10, 6, 8, 4, 10, 6, 4]
+EQUIPMENT = [("ONT Huawei HG8010H", "ONT", 150.00), ("ONT Nokia G-010G-A", "ONT", 120.00),
+             ("Router Wi-Fi AC1200", "Router", 200.00), ("Splitter 1x8", "Splitter", 25.00),
+             ("Cabo Drop 100m", "Cabo", 80.00), ("Conector SC/APC", "Conector", 5.00),
+             ("Cordão Óptico 3m", "Cordão", 15.00)]
+PRIORITIES = ["Baixa", "Normal", "Alta", "Urgente"]
+PRIORITY_WEIGHTS = [15, 60, 20, 5]
+# Status por idade da ordem: o passado é quase todo concluído, o futuro está agendado
+PAST_STATUSES = (["Concluído", "Cancelado", "Aguardando Peças", "Em Campo", "Agendado"], [78, 10, 6, 3, 3])
+FUTURE_STATUSES = (["Agendado", "Aguardando Peças", "Cancelado"], [88, 7, 5])
+TIMES = [f"{hour:02d}:{minute:02d}" for hour in range(8, 18) for minute in (0, 30)]
+
+TIMESTAMP = "2024-01-01T00:00:00.000+00:00"
+
+
+def _zipf_weights(n, s=1.1):
+    """Pesos decrescentes: poucos itens concentram a maior parte da carga"""
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def generate(storage, n_orders=100_000, n_clients=50_000, n_technicians=200, days_back=365, days_ahead=60,
+             seed=42, today=None):
+    """Gera os dados no SQLiteStorage informado; retorna a contagem por tabela"""
+    rng = random.Random(seed)
+    today = today or date.today()
+    connection = storage.connection
+
+    clients = []
+    for i in range(1, n_clients + 1):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+        clients.append((i, name, f"(11) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+                        f"cliente{i}@email.com",
+                        f"{rng.choice(STREETS)}, {rng.randint(1, 3000)} - {rng.choice(NEIGHBORHOODS)}",
+                        f"CTO-{rng.randint(1, max(n_clients // 16, 1)):04d}", rng.choice(PLANS),
+                        round(rng.uniform(*LATITUDE_RANGE), 6), round(rng.uniform(*LONGITUDE_RANGE), 6), TIMESTAMP))
+    technicians = [(i, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", rng.choice(SPECIALTIES),
+                    REGIONS[i % len(REGIONS)], rng.choice(LEVELS), TIMESTAMP) for i in range(1, n_technicians + 1)]
+    services = [(i, name, kind, price, duration, TIMESTAMP)
+                for i, (name, kind, price, duration) in enumerate(SERVICES, start=1)]
+    equipment = [(i, name, kind, price, TIMESTAMP) for i, (name, kind, price) in enumerate(EQUIPMENT, start=1)]
+
+    client_ids = rng.choices(range(1, n_clients + 1), weights=_zipf_weights(n_clients, 0.6), k=n_orders)
+    technician_ids = rng.choices(range(1, n_technicians + 1), weights=_zipf_weights(n_technicians, 0.8),
+                                 k=n_orders)
+    service_ids = rng.choices(range(1, len(SERVICES) + 1), weights=SERVICE_WEIGHTS, k=n_orders)
+    priorities = rng.choices(PRIORITIES, weights=PRIORITY_WEIGHTS, k=n_orders)
+    orders = []
+    for i in range(n_orders):
+        # Mais ordens recentes que antigas (decaimento exponencial para o passado)
+        if rng.random() < 0.85:
+            offset = -min(int(rng.expovariate(1 / (days_back / 4))), days_back)
+        else:
+            offset = rng.randint(0, days_ahead)
+        scheduled = today + timedelta(days=offset)
+        statuses, weights = PAST_STATUSES if offset < 0 else FUTURE_STATUSES
+        status = rng.choices(statuses, weights=weights)[0]
+        service_id = service_ids[i]
+        cost = SERVICES[service_id - 1][2] or round(rng.uniform(0, 300), 2)
+        completed_at = f"{scheduled.isoformat()}T18:00:00" if status == "Concluído" else None
+        # Última alteração: conclusão para ordens passadas, criação (até 30 dias antes) para futuras
+        touched = min(scheduled, today) - timedelta(days=0 if offset < 0 else rng.randint(1, 30))
+        timestamp = f"{touched.isoformat()}T{rng.randint(8, 19):02d}:{rng.randint(0, 59):02d}:00.000+00:00"
+        orders.append((i + 1, f"OS{i + 1:08X}", client_ids[i], service_id, technician_ids[i],
+                       scheduled.isoformat(), rng.choice(TIMES), "Ordem gerada para benchmark", status,
+                       priorities[i], cost, f"-{rng.randint(15, 27)}" if status == "Concluído" else "",
+                       "", clients[client_ids[i] - 1][5], completed_at, "[]", timestamp, timestamp))
+
+    with storage._lock, connection:
+        connection.executemany("INSERT INTO clients (id, name, phone, email, address, cto, plan, latitude, longitude, "
+                               "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", clients)
+        connection.executemany("INSERT INTO technicians (id, name, specialty, region, level, created_at) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", technicians)
+        connection.executemany("INSERT INTO services (id, name, type, price, duration, created_at) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", services)
+        connection.executemany("INSERT INTO equipment (id, name, type, price, created_at) VALUES (?, ?, ?, ?, ?)",
+                               equipment)
+        connection.executemany(
+            "INSERT INTO service_orders (id, order_number, client_id, service_id, technician_id, scheduled_date, "
+            "scheduled_time, description, status, priority, estimated_cost, signal_level, observations, "
+            "cto_reference, completed_at, equipment_used, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", orders)
+        connection.execute("ANALYZE")
+    return {"service_orders": n_orders, "clients": n_clients, "technicians": n_technicians,
+            "services": len(services), "equipment": len(equipment)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="arquivo SQLite a criar")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=50_000)
+    parser.add_argument("--technicians", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} já existe")
+    counts = generate(SQLiteStorage(args.path), args.orders, args.clients, args.technicians, seed=args.seed)
+    print(", ".join(f"{table}: {count}" for table, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
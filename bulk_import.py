@@ -0,0 +1,218 @@
+import sys
+import unicodedata
+
+import pandas as pd
+import streamlit as st
+
+PRIORITIES = ["Baixa", "Normal", "Alta", "Urgente"]
+
+# Cabeçalho normalizado (sem acento, minúsculo) -> campo interno
+IMPORT_COLUMNS = {
+    "cliente": "client",
+    "servico": "service",
+    "tecnico": "technician",
+    "data": "scheduled_date",
+    "hora": "scheduled_time",
+    "descricao": "description",
+    "prioridade": "priority",
+    "valor": "estimated_cost",
+    "cto": "cto_reference",
+    "sinal (dbm)": "signal_level",
+    "observacoes": "observations",
+}
+
+# Formatos aceitos, tentados em ordem (o último de cada lista é o das células de data/hora do Excel)
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S"]
+TIME_FORMATS = ["%H:%M", "%H:%M:%S"]
+
+REQUIRED_COLUMNS = ["client", "service", "technician", "scheduled_date", "scheduled_time", "description"]
+
+
+def normalize_text(value):
+    """Casefold sem acentos, usado para casar cabeçalhos e nomes da planilha com o cadastro"""
+    text = unicodedata.normalize("NFKD", str(value).strip())
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+
+def normalize_series(values):
+    """Versão vetorizada de normalize_text para uma coluna inteira"""
+    return (values.astype("object").fillna("").astype(str).str.strip()
+            .str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii").str.casefold())
+
+
+def read_import_file(file, filename=None):
+    """Lê um CSV (separador detectado) ou XLSX como texto"""
+    name = (filename or getattr(file, "name", "") or str(file)).lower()
+    if name.endswith((".xlsx", ".xls")):
+        return pd.read_excel(file, dtype=str)
+    return pd.read_csv(file, dtype=str, sep=None, engine="python", encoding="utf-8-sig")
+
+
+def _parse_formats(values, formats):
+    """Datas/horas no primeiro formato que servir, linha a linha; NaT se nenhum servir"""
+    text = values.str.strip()
+    parsed = pd.to_datetime(text, format=formats[0], errors="coerce")
+    for fmt in formats[1:]:
+        parsed = parsed.fillna(pd.to_datetime(text, format=fmt, errors="coerce"))
+    return parsed
+
+
+def _lookup(names, rows, key="name"):
+    """Resolve nomes para ids com um mapa pré-montado (nome normalizado -> id)"""
+    reference = pd.DataFrame.from_records(rows, columns=["id", key]).dropna()
+    mapping = pd.Series(reference["id"].to_numpy(), index=normalize_series(reference[key]))
+    mapping = mapping[~mapping.index.duplicated(keep="last")]
+    return normalize_series(names).map(mapping).where(names.notna())
+
+
+def prepare_orders(df, clients, services, technicians):
+    """Valida a planilha de forma vetorizada e monta as linhas para inserção.
+
+    Retorna (ordens, linhas_de_origem, erros): `ordens` estão no formato da
+    tabela service_orders (sem order_number), `linhas_de_origem` diz a linha
+    da planilha de cada ordem e `erros` é um DataFrame com Linha e Erro.
+    """
+    df = df.rename(columns=lambda column: IMPORT_COLUMNS.get(normalize_text(column), column))
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        inverse = {field: header for header, field in IMPORT_COLUMNS.items()}
+        raise ValueError("Colunas obrigatórias ausentes: " + ", ".join(inverse[m] for m in missing))
+
+    # Linha 1 é o cabeçalho da planilha
+    source_rows = pd.Series(df.index + 2, index=df.index)
+    prices = {service["id"]: service.get("price") or 0 for service in services}
+
+    client_id = _lookup(df["client"], clients)
+    service_id = _lookup(df["service"], services)
+    technician_id = _lookup(df["technician"], technicians)
+    # ISO (como sai da exportação) ou DD/MM/AAAA; células de data/hora do Excel chegam como
+    # "AAAA-MM-DD 00:00:00" e "HH:MM:SS". Qualquer outro formato é rejeitado
+    scheduled_date = _parse_formats(df["scheduled_date"], DATE_FORMATS)
+    scheduled_time = _parse_formats(df["scheduled_time"], TIME_FORMATS)
+    priority = df.get("priority", pd.Series(index=df.index, dtype=object)).fillna("Normal").str.strip().str.capitalize()
+    cost_text = df.get("estimated_cost", pd.Series(index=df.index, dtype=object))
+    estimated_cost = pd.to_numeric(cost_text.str.replace("R$", "", regex=False).str.replace(",", ".", regex=False),
+                                   errors="coerce")
+    estimated_cost = estimated_cost.fillna(service_id.map(prices))
+    description = df["description"].fillna("").str.strip()
+
+    checks = [
+        (client_id.isna(), "cliente não encontrado"),
+        (service_id.isna(), "serviço não encontrado"),
+        (technician_id.isna(), "técnico não encontrado"),
+        (scheduled_date.isna(), "data inválida (use AAAA-MM-DD ou DD/MM/AAAA)"),
+        (scheduled_time.isna(), "hora inválida (use HH:MM)"),
+        (description == "", "descrição vazia"),
+        (~priority.isin(PRIORITIES), "prioridade inválida"),
+        (cost_text.notna() & estimated_cost.isna(), "valor inválido"),
+    ]
+    messages = pd.Series("", index=df.index)
+    for mask, message in checks:
+        messages = messages.where(~mask, messages + "; " + message)
+    invalid = messages != ""
+    errors = pd.DataFrame({"Linha": source_rows[invalid], "Erro": messages[invalid].str.lstrip("; ")})
+
+    valid = ~invalid
+    prepared = pd.DataFrame({
+        "client_id": client_id[valid].astype("int64"),
+        "service_id": service_id[valid].astype("int64"),
+        "technician_id": technician_id[valid].astype("int64"),
+        "scheduled_date": scheduled_date[valid].dt.strftime("%Y-%m-%d"),
+        "scheduled_time": scheduled_time[valid].dt.strftime("%H:%M"),
+        "description": description[valid],
+        "priority": priority[valid],
+        "estimated_cost": estimated_cost[valid].astype(float),
+    })
+    for column in ["cto_reference", "signal_level", "observations"]:
+        prepared[column] = df[column][valid].fillna("") if column in df.columns else ""
+    # astype(object) converte os escalares numpy para tipos Python (serializáveis em JSON)
+    orders = prepared.astype(object).to_dict("records")
+    return orders, source_rows[valid].tolist(), errors
+
+
+def schedule_conflict_messages(manager, orders, source_rows, allow_conflicts=False):
+    """Mensagem de conflito de agenda por posição do lote (só as que têm conflito)"""
+    messages = {}
+    for position, (existing, earlier) in enumerate(manager.find_batch_conflicts(orders, allow_conflicts)):
+        if not (existing or earlier):
+            continue
+        others = [manager.orders.get(order_id) for order_id in existing]
+        targets = [f"OS {order['order_number']}" for order in others if order]
+        targets += [f"linha {source_rows[other]}" for other in earlier]
+        prefix = "aviso (importada): " if allow_conflicts else ""
+        messages[position] = prefix + "conflito de agenda do técnico com " + ", ".join(targets)
+    return messages
+
+
+def import_orders(manager, df, batch_size=None, progress=None, allow_conflicts=False):
+    """Valida e insere as ordens da planilha; retorna (criadas, DataFrame de erros).
+
+    OS que se sobrepõem à agenda do técnico (ou a outra linha da planilha) são
+    recusadas; com `allow_conflicts` são criadas e o conflito vai como aviso.
+    """
+    orders, source_rows, errors = prepare_orders(
+        df, manager.get_all_clients(), manager.get_all_services(), manager.get_all_technicians()
+    )
+    conflicts = schedule_conflict_messages(manager, orders, source_rows, allow_conflicts)
+    if conflicts:
+        errors = pd.concat([errors, pd.DataFrame({
+            "Linha": [source_rows[position] for position in conflicts],
+            "Erro": list(conflicts.values()),
+        })], ignore_index=True)
+        if not allow_conflicts:
+            orders = [order for position, order in enumerate(orders) if position not in conflicts]
+            source_rows = [row for position, row in enumerate(source_rows) if position not in conflicts]
+    kwargs = {"progress": progress}
+    if batch_size:
+        kwargs["batch_size"] = batch_size
+    created, insert_errors = manager.create_service_orders_bulk(orders, **kwargs)
+    if insert_errors:
+        errors = pd.concat([errors, pd.DataFrame({
+            "Linha": [source_rows[position] for position, _ in insert_errors],
+            "Erro": [message for _, message in insert_errors],
+        })], ignore_index=True)
+    return created, errors.sort_values("Linha").reset_index(drop=True)
+
+
+def show_bulk_import(manager):
+    """Importação de OS em lote a partir de CSV/XLSX"""
+    st.markdown("Colunas: **Cliente, Serviço, Técnico, Data, Hora, Descrição** "
+                "(opcionais: Prioridade, Valor, CTO, Sinal (dBm), Observações). "
+                "Data em AAAA-MM-DD ou DD/MM/AAAA; hora em HH:MM.")
+    uploaded = st.file_uploader("📄 Arquivo CSV ou XLSX", type=["csv", "xlsx"], disabled=manager.offline)
+    batch_size = st.number_input("Linhas por lote", min_value=50, max_value=5000, value=500, step=50)
+    allow_conflicts = st.checkbox("Importar mesmo com conflito de agenda (apenas avisar)")
+    if uploaded and st.button("📥 Importar OS", type="primary", disabled=manager.offline):
+        try:
+            df = read_import_file(uploaded)
+        except Exception as e:
+            st.error(f"Erro ao ler arquivo: {e}")
+            return
+        bar = st.progress(0.0, text="Importando...")
+        try:
+            created, errors = import_orders(
+                manager, df, batch_size=int(batch_size), allow_conflicts=allow_conflicts,
+                progress=lambda done, total: bar.progress(done / total, text=f"{done}/{total} linhas enviadas"),
+            )
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            return
+        st.success(f"✅ {len(created)} OS criadas de {len(df)} linhas.")
+        if not errors.empty:
+            st.warning(f"⚠️ {len(errors)} linhas com erro" + (" ou aviso" if allow_conflicts else ""))
+            st.dataframe(errors, use_container_width=True)
+            st.download_button("⬇️ Baixar relatório de erros", errors.to_csv(index=False).encode("utf-8"),
+                               file_name="erros_importacao.csv", mime="text/csv")
+
+
+if __name__ == "__main__":
+    # Uso: python bulk_import.py planilha.csv [linhas_por_lote]
+    from fiber_service_manager import FiberOpticServiceManager
+
+    manager = FiberOpticServiceManager()
+    created, errors = import_orders(manager, read_import_file(sys.argv[1]),
+                                    batch_size=int(sys.argv[2]) if len(sys.argv) > 2 else None,
+                                    progress=lambda done, total: print(f"{done}/{total}", file=sys.stderr))
+    print(f"{len(created)} OS criadas; {len(errors)} linhas com erro")
+    if not errors.empty:
+        print(errors.to_csv(index=False))
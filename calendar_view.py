@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+import calendar
+from datetime import datetime, date
+from fiber_service_manager import ORDER_CALENDAR_SELECT
+from fiber_calendar import feed_filename
 
 def show_calendar(manager):
     """Visualização em calendário para fibra óptica"""
@@ -16,35 +19,30 @@ def show_calendar(manager):
     with col3:
         view_type = st.selectbox("🔍 Visualização", ["Por Região", "Por Tipo de Serviço", "Por Técnico"])
     
-    # Busca dados do banco
-    orders = manager.get_all_orders()
-    clients = {c['id']: c for c in manager.get_all_clients()}
-    services = {s['id']: s for s in manager.get_all_services()}
-    technicians = {t['id']: t for t in manager.get_all_technicians()}
+    # Busca só as ordens do mês, já com cliente, serviço e técnico embutidos
+    month_start = date(selected_year, selected_month, 1)
+    month_end = date(selected_year, selected_month, calendar.monthrange(selected_year, selected_month)[1])
+    orders = manager.get_orders_between(month_start, month_end, columns=ORDER_CALENDAR_SELECT)
     
-    # Filtra ordens do mês selecionado
     month_orders = []
-    
     for order in orders:
-        order_date = datetime.strptime(order["scheduled_date"], "%Y-%m-%d")
-        if order_date.month == selected_month and order_date.year == selected_year:
-            client = clients.get(order["client_id"], {})
-            service = services.get(order["service_id"], {})
-            technician = technicians.get(order["technician_id"], {})
-            
-            month_orders.append({
-                "OS": order["order_number"],
-                "Data": order["scheduled_date"],
-                "Hora": order["scheduled_time"],
-                "Cliente": client.get("name", "N/A"),
-                "CTO": client.get("cto", "N/A"),
-                "Serviço": service.get("name", "N/A"),
-                "Tipo": service.get("type", "N/A"),
-                "Técnico": technician.get("name", "N/A"),
-                "Região": technician.get("region", "N/A"),
-                "Status": order["status"],
-                "Prioridade": order["priority"]
-            })
+        client = order.get("clients") or {}
+        service = order.get("services") or {}
+        technician = order.get("technicians") or {}
+        
+        month_orders.append({
+            "OS": order["order_number"],
+            "Data": order["scheduled_date"],
+            "Hora": order["scheduled_time"],
+            "Cliente": client.get("name", "N/A"),
+            "CTO": client.get("cto", "N/A"),
+            "Serviço": service.get("name", "N/A"),
+            "Tipo": service.get("type", "N/A"),
+            "Técnico": technician.get("name", "N/A"),
+            "Região": technician.get("region", "N/A"),
+            "Status": order["status"],
+            "Prioridade": order["priority"]
+        })
     
     if month_orders:
         df = pd.DataFrame(month_orders)
@@ -108,10 +106,53 @@ def show_calendar(manager):
         
         if not day_orders.empty:
             day_orders = day_orders.sort_values("Hora")
-            st.dataframe(day_orders[["OS", "Hora", "Cliente", "Serviço", "Técnico", "Região", "Status"]], 
+            st.dataframe(day_orders[["OS", "Hora", "Cliente", "Serviço", "Técnico", "Região", "Status"]],
                         use_container_width=True)
+
+            # Sequência otimizada por técnico: urgentes primeiro, menor deslocamento entre clientes
+            st.subheader("🧭 Rota Otimizada do Dia")
+            routes = manager.plan_day_routes(selected_date)
+            if not routes.empty:
+                route_df = routes.merge(day_orders, left_on="order_number", right_on="OS")
+                route_df = route_df.rename(columns={"sequence": "Ordem", "arrival": "Chegada", "departure": "Saída",
+                                                    "distance_km": "Deslocamento (km)"})
+                technicians = sorted(route_df["Técnico"].unique())
+                selected_tech = st.selectbox("👨‍🔧 Técnico", ["Todos"] + technicians)
+                if selected_tech != "Todos":
+                    route_df = route_df[route_df["Técnico"] == selected_tech]
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("🛣️ Deslocamento Total", f"{route_df['Deslocamento (km)'].sum():.1f} km")
+                with col2:
+                    st.metric("⏰ OS Fora da Jornada", int((~route_df["within_workday"]).sum()))
+                st.dataframe(route_df[["Técnico", "Ordem", "OS", "Chegada", "Saída", "Hora", "Prioridade",
+                                       "Cliente", "Serviço", "Deslocamento (km)"]],
+                             use_container_width=True, hide_index=True,
+                             column_config={
+                                 "Chegada": st.column_config.TimeColumn("Chegada", format="HH:mm"),
+                                 "Saída": st.column_config.TimeColumn("Saída", format="HH:mm"),
+                                 "Deslocamento (km)": st.column_config.NumberColumn("Deslocamento (km)",
+                                                                                    format="%.1f"),
+                             })
+                st.caption("Clientes sem latitude/longitude entram no fim do seu grupo de prioridade, "
+                           "pelo horário agendado.")
         else:
             st.info(f"📅 Nenhum agendamento para {selected_date.strftime('%d/%m/%Y')}")
             
     else:
-        st.info("📅 Nenhum agendamento encontrado para este mês")
\ No newline at end of file
+        st.info("📅 Nenhum agendamento encontrado para este mês")
+    
+    # Feeds ICS em cache: o arquivo só muda (e o ETag junto) quando alguma OS do feed muda
+    with st.expander("📆 Assinar Agenda (ICS)"):
+        feeds = manager.refresh_calendar_feeds()
+        if feeds is None or not feeds.feeds():
+            st.info("📅 Nenhuma OS recente ou futura para gerar feeds")
+            return
+        kind = st.radio("Feed por", ["Técnico", "Região"], horizontal=True)
+        options = [feed for feed in feeds.feeds() if feed[0][0] == ("tecnico" if kind == "Técnico" else "regiao")]
+        selected = st.selectbox("📆 Feed", options, format_func=lambda feed: f"{feed[1]} ({feed[3]} OS)")
+        content, etag = feeds.get(selected[0])
+        st.download_button("⬇️ Baixar .ics", content.encode("utf-8"), file_name=feed_filename(selected[0]),
+                           mime="text/calendar")
+        st.caption(f"ETag {etag} · OS dos últimos {feeds.past_days} dias em diante. "
+                   "Para publicar os arquivos num servidor web: python fiber_calendar.py pasta_de_saida")
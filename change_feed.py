@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import threading
+
+from supabase import acreate_client
+
+# Tabelas cujas mudanças invalidam ou atualizam os caches do manager
+WATCHED_TABLES = ("service_orders", "clients", "technicians", "services", "equipment")
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    """Distribui notificações de mudança (tabela, evento, registro) aos assinantes.
+
+    `event` é "INSERT", "UPDATE" ou "DELETE"; `record` traz a linha nova e
+    `old_record` a anterior (em DELETE, ao menos o id). `version` aumenta a
+    cada notificação, o que permite às páginas saber se algo mudou.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    @property
+    def live(self):
+        """True quando as mudanças do banco chegam por push (dispensa polling)"""
+        return False
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+        return lambda: self.unsubscribe(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, table, event, record=None, old_record=None):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.version += 1
+        for callback in subscribers:
+            try:
+                callback(table, event, record or {}, old_record or {})
+            except Exception:
+                logger.exception("Erro ao aplicar mudança em %s", table)
+
+    def start(self):
+        pass
+
+
+class LocalChangeFeed(ChangeFeed):
+    """Fonte de eventos em processo: só vê as escritas feitas por este app (e testes)"""
+
+
+class SupabaseRealtimeFeed(ChangeFeed):
+    """Escuta postgres_changes do Supabase Realtime numa thread própria.
+
+    As tabelas precisam estar na publicação supabase_realtime (ver schema).
+    Enquanto o canal não estiver inscrito, `live` é False e o manager segue
+    sincronizando por polling.
+    """
+
+    def __init__(self, supabase_url, supabase_key, tables=WATCHED_TABLES, channel_name="fiber-os-changes"):
+        super().__init__()
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.tables = tables
+        self.channel_name = channel_name
+        self._subscribed = threading.Event()
+        self._thread = None
+
+    @property
+    def live(self):
+        return self._subscribed.is_set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="supabase-realtime", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            asyncio.run(self._listen())
+        except Exception:
+            logger.exception("Canal Realtime encerrado; voltando ao polling")
+        finally:
+            self._subscribed.clear()
+
+    async def _listen(self):
+        client = await acreate_client(self.supabase_url, self.supabase_key)
+        channel = client.channel(self.channel_name)
+        for table in self.tables:
+            channel.on_postgres_changes("*", schema="public", table=table, callback=self._on_payload)
+        await channel.subscribe(self._on_status)
+        # Mantém a thread viva; o cliente Realtime reconecta sozinho
+        await asyncio.Event().wait()
+
+    def _on_status(self, status, error=None):
+        if str(getattr(status, "value", status)) == "SUBSCRIBED":
+            self._subscribed.set()
+        else:
+            # Canal caiu ou expirou: eventos podem ter sido perdidos
+            self._subscribed.clear()
+            if error:
+                logger.warning("Realtime: %s (%s)", status, error)
+
+    def _on_payload(self, payload):
+        data = payload.get("data", payload)
+        self.publish(data.get("table"), data.get("type"), data.get("record"), data.get("old_record"))
@@ -1,47 +1,45 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from datetime import datetime
+import metrics
+from fiber_service_manager import ORDER_COLUMN_CONFIG
 
 def show_dashboard(manager):
     """Dashboard específico para fibra óptica"""
     st.header("📊 Dashboard - Fibra Óptica")
     
-    # Busca dados do banco
-    orders = manager.get_all_orders()
-    services = manager.get_all_services()
-    technicians = manager.get_all_technicians()
+    # Agregados pré-calculados no servidor (ou frame das ordens, sem rollups) e próximas OS, ao mesmo tempo
+    data, errors = manager.fetch_parallel({
+        "kpis": lambda: manager.get_kpi_frames(with_technicians=False),
+        "upcoming": lambda: manager.query_orders(status="Agendado", limit=8, ascending=True),
+    })
+    manager.report_fetch_errors(errors)
+    frame, _ = data.get("kpis") or (metrics.build_orders_frame([], [], []), None)
+    kpis = metrics.summary(frame)
     
     # Métricas principais
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        total_orders = len(orders)
-        st.metric("Total OS", total_orders, delta=None)
+        st.metric("Total OS", kpis["total"], delta=None)
     
     with col2:
-        pending_orders = len([o for o in orders if o["status"] == "Agendado"])
-        st.metric("OS Pendentes", pending_orders)
+        st.metric("OS Pendentes", kpis["pending"])
     
     with col3:
-        in_progress = len([o for o in orders if o["status"] == "Em Campo"])
-        st.metric("Em Campo", in_progress)
+        st.metric("Em Campo", kpis["in_progress"])
     
     with col4:
-        completed_orders = len([o for o in orders if o["status"] == "Concluído"])
-        st.metric("Concluídas", completed_orders)
+        st.metric("Concluídas", kpis["completed"])
     
     with col5:
-        installations = len([o for o in orders if any(s["id"] == o["service_id"] and s["type"] == "Instalação" for s in services)])
-        st.metric("Instalações", installations)
+        st.metric("Instalações", kpis["installations"])
     
     # Métricas de receita e SLA
     st.markdown("### 💰 Indicadores Financeiros e SLA")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_revenue = sum([o["estimated_cost"] for o in orders if o["status"] == "Concluído"])
-        st.metric("Receita Total", f"R$ {total_revenue:.2f}")
+        st.metric("Receita Total", f"R$ {kpis['revenue']:.2f}")
     
     with col2:
         avg_resolution_time = 2.5  # Simulado
@@ -56,21 +54,17 @@ def show_dashboard(manager):
         st.metric("Satisfação", f"{customer_satisfaction:.1f}/5.0", delta="0.3")
     
     # Gráficos específicos de fibra óptica
-    if orders:
+    if kpis["total"]:
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("📊 OS por Tipo de Serviço")
-            service_types = {}
-            for order in orders:
-                service = next((s for s in services if s["id"] == order["service_id"]), {})
-                service_type = service.get("type", "Outros")
-                service_types[service_type] = service_types.get(service_type, 0) + 1
+            service_types = metrics.type_distribution(frame)
             
-            if service_types:
+            if not service_types.empty:
                 fig = px.pie(
-                    values=list(service_types.values()),
-                    names=list(service_types.keys()),
+                    values=service_types.values,
+                    names=service_types.index.astype(str),
                     title="Distribuição por Tipo de Serviço",
                     color_discrete_sequence=px.colors.qualitative.Set3
                 )
@@ -78,18 +72,14 @@ def show_dashboard(manager):
         
         with col2:
             st.subheader("🌍 OS por Região")
-            region_counts = {}
-            for order in orders:
-                technician = next((t for t in technicians if t["id"] == order["technician_id"]), {})
-                region = technician.get("region", "N/A")
-                region_counts[region] = region_counts.get(region, 0) + 1
+            region_counts = metrics.region_distribution(frame)
             
-            if region_counts:
+            if not region_counts.empty:
                 fig = px.bar(
-                    x=list(region_counts.keys()),
-                    y=list(region_counts.values()),
+                    x=region_counts.index.astype(str),
+                    y=region_counts.values,
                     title="OS por Região de Atendimento",
-                    color=list(region_counts.values()),
+                    color=region_counts.values,
                     color_continuous_scale="viridis"
                 )
                 fig.update_layout(showlegend=False)
@@ -97,13 +87,12 @@ def show_dashboard(manager):
     
     # Timeline das próximas OS
     st.subheader("🗓️ Próximas OS Agendadas")
-    df = manager.get_orders_dataframe()
-    if not df.empty:
-        today = datetime.now().date()
-        df_future = df[df["Status"] == "Agendado"].sort_values("Data").head(8)
+    upcoming, _ = data.get("upcoming", ([], 0))
+    if kpis["total"]:
+        df_future = manager.build_orders_dataframe(upcoming)
         if not df_future.empty:
             st.dataframe(df_future[["OS", "Cliente", "Serviço", "Técnico", "Região", "Data", "Hora", "CTO"]], 
-                        use_container_width=True)
+                        column_config=ORDER_COLUMN_CONFIG, use_container_width=True)
         else:
             st.info("✅ Nenhuma OS pendente encontrada")
     else:
@@ -0,0 +1,298 @@
+import bisect
+import math
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Jornada de atendimento, dividida em blocos de 30 minutos (08:00-18:00)
+WORKDAY_START = 8 * 60
+WORKDAY_END = 18 * 60
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = (WORKDAY_END - WORKDAY_START) // SLOT_MINUTES
+
+# Duração (horas) assumida quando o serviço não informa
+DEFAULT_DURATION_HOURS = 2
+
+# OS nesses status não ocupam a agenda do técnico
+FREE_STATUSES = ["Cancelado"]
+
+# Pesos do ranking: maior pontuação = melhor candidato
+REGION_WEIGHT = 3.0
+SPECIALTY_WEIGHT = 2.0
+LEVEL_WEIGHT = 1.0
+# Multiplica a fração da jornada já comprometida no dia
+LOAD_WEIGHT = 2.0
+
+LEVEL_SCORES = {"Júnior": 0.0, "Pleno": 0.5, "Sênior": 1.0}
+GENERALIST_SPECIALTY = "Geral"
+
+# Dias à frente (além do pedido) procurados por next_free
+FREE_SLOT_HORIZON_DAYS = 14
+
+
+def slot_time(slot):
+    """Horário de início de um bloco da jornada"""
+    minutes = WORKDAY_START + int(slot) * SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+def time_slot(value, round_up=False):
+    """Bloco que contém o horário (datetime.time ou "HH:MM"), limitado à jornada;
+    com `round_up`, o primeiro bloco que começa a partir dele"""
+    if isinstance(value, str):
+        hours, minutes = value[:5].split(":")
+        value = time(int(hours), int(minutes))
+    offset = value.hour * 60 + value.minute - WORKDAY_START + (value.second > 0 if round_up else 0)
+    slot = -(-offset // SLOT_MINUTES) if round_up else offset // SLOT_MINUTES
+    return min(max(slot, 0), SLOTS_PER_DAY)
+
+
+def duration_slots(hours):
+    return min(max(math.ceil(float(hours) * 60 / SLOT_MINUTES), 1), SLOTS_PER_DAY)
+
+
+def minute_of_day(value):
+    """datetime.time ou "HH:MM[:SS]" -> minutos desde a meia-noite"""
+    if isinstance(value, str):
+        hours, minutes = value[:5].split(":")
+        return int(hours) * 60 + int(minutes)
+    return value.hour * 60 + value.minute
+
+
+def _round_to_slot(minute):
+    """Próximo início de bloco da jornada a partir de `minute`"""
+    return WORKDAY_START + -(-(minute - WORKDAY_START) // SLOT_MINUTES) * SLOT_MINUTES
+
+
+class BookingIndex:
+    """Reservas por técnico e dia, em listas ordenadas pelo início (minutos do dia).
+
+    Uma consulta de sobreposição é um acesso ao dicionário (técnico, dia) e um
+    bisect: só as reservas que começam antes do fim pedido são examinadas, e
+    num dia são poucas. Os dias são strings ISO ("AAAA-MM-DD").
+    """
+
+    def __init__(self, technician_ids=(), days=(), starts=(), ends=(), order_ids=()):
+        self._agenda = {}
+        rows = sorted(zip(technician_ids, days, starts, ends, order_ids), key=lambda row: (row[0], row[1], row[2]))
+        for technician_id, day, start, end, order_id in rows:
+            starts_, ends_, ids_ = self._agenda.setdefault((technician_id, day), ([], [], []))
+            starts_.append(start)
+            ends_.append(end)
+            ids_.append(order_id)
+
+    def __len__(self):
+        return sum(len(starts) for starts, _, _ in self._agenda.values())
+
+    def add(self, technician_id, day, start, end, order_id=None):
+        starts, ends, ids = self._agenda.setdefault((technician_id, str(day)), ([], [], []))
+        position = bisect.bisect_right(starts, start)
+        starts.insert(position, start)
+        ends.insert(position, end)
+        ids.insert(position, order_id)
+
+    def overlaps(self, technician_id, day, start, end, exclude=None):
+        """Ids das reservas do técnico no dia que cruzam [start, end)"""
+        agenda = self._agenda.get((technician_id, str(day)))
+        if not agenda:
+            return []
+        starts, ends, ids = agenda
+        last = bisect.bisect_left(starts, end)
+        return [ids[i] for i in range(last) if ends[i] > start and ids[i] != exclude]
+
+    def next_free(self, technician_id, day, minutes, not_before=WORKDAY_START, horizon_days=FREE_SLOT_HORIZON_DAYS):
+        """Primeiro (data, minuto) a partir de `day`/`not_before` com `minutes` livres
+        na jornada, alinhado aos blocos de 30 minutos; None se não houver no horizonte"""
+        day = date.fromisoformat(str(day))
+        for offset in range(horizon_days + 1):
+            current = day + timedelta(days=offset)
+            cursor = _round_to_slot(max(not_before if offset == 0 else WORKDAY_START, WORKDAY_START))
+            starts, ends, _ = self._agenda.get((technician_id, current.isoformat()), ((), (), ()))
+            for start, end in zip(starts, ends):
+                if start >= cursor + minutes:
+                    break
+                cursor = max(cursor, _round_to_slot(end))
+            if cursor + minutes <= WORKDAY_END:
+                return current, cursor
+        return None
+
+
+def _most_frequent(frame, key, value):
+    """Valor mais frequente de `value` para cada `key` (Series indexada por key)"""
+    counts = frame.dropna(subset=[key, value]).groupby([key, value], observed=True).size()
+    counts = counts.sort_values(ascending=False, kind="stable")
+    counts = counts[~counts.index.get_level_values(0).duplicated()]
+    return pd.Series(counts.index.get_level_values(1), index=counts.index.get_level_values(0))
+
+
+class DispatchEngine:
+    """Ranking de técnicos para uma nova OS por região, especialidade, nível,
+    horas já comprometidas no dia e primeiro horário livre.
+
+    Na construção as ordens viram tabelas por técnico e dia: minutos
+    comprometidos (`load`) e as reservas em blocos de 30 minutos, das quais a
+    grade de ocupação técnicos x blocos de um dia é montada sob demanda e
+    guardada. Rankear é uma conta vetorizada sobre os técnicos, sem voltar
+    às ordens. As mesmas reservas, em minutos exatos, formam o `index`
+    (BookingIndex) usado nas checagens de conflito e no próximo horário livre.
+    A região do cliente é a região mais frequente dos técnicos que já o
+    atenderam (clientes não têm região cadastrada).
+    """
+
+    def __init__(self, orders, services, technicians, today=None):
+        self.today = today or date.today()
+        self.technicians = pd.DataFrame.from_records(
+            technicians, columns=["id", "name", "specialty", "region", "level"]).drop_duplicates("id")
+        self.technicians = self.technicians.reset_index(drop=True)
+        self.positions = pd.Series(np.arange(len(self.technicians)), index=self.technicians["id"])
+        self.services = pd.DataFrame.from_records(services, columns=["id", "name", "type", "duration"])
+        self.services = self.services.drop_duplicates("id").set_index("id")
+        durations = pd.to_numeric(self.services["duration"], errors="coerce").fillna(DEFAULT_DURATION_HOURS)
+        self.durations = durations.astype(float).to_dict()
+
+        frame = pd.DataFrame.from_records(orders, columns=["id", "client_id", "service_id", "technician_id",
+                                                           "scheduled_date", "scheduled_time", "status"])
+        frame["region"] = frame["technician_id"].map(self.technicians.set_index("id")["region"])
+        self.client_regions = _most_frequent(frame, "client_id", "region")
+
+        # Só o que está agendado de hoje em diante entra nas tabelas de carga
+        frame["day"] = frame["scheduled_date"].astype("string").str.slice(0, 10)
+        active = ((frame["day"] >= self.today.isoformat()) & ~frame["status"].isin(FREE_STATUSES)
+                  & frame["technician_id"].isin(self.positions.index) & frame["scheduled_time"].notna())
+        bookings = frame[active]
+        hours = bookings["service_id"].map(self.services["duration"])
+        hours = pd.to_numeric(hours, errors="coerce").fillna(DEFAULT_DURATION_HOURS)
+        clock = bookings["scheduled_time"].astype("string").str.slice(0, 5)
+        start = (pd.to_numeric(clock.str.slice(0, 2), errors="coerce") * 60
+                 + pd.to_numeric(clock.str.slice(3, 5), errors="coerce")).fillna(WORKDAY_START)
+        end = start + hours * 60
+        self.bookings = pd.DataFrame({
+            "technician_id": bookings["technician_id"].to_numpy(),
+            "position": bookings["technician_id"].map(self.positions).to_numpy(),
+            "day": bookings["day"].to_numpy(),
+            "start_slot": ((start - WORKDAY_START) // SLOT_MINUTES).clip(0, SLOTS_PER_DAY).astype(int).to_numpy(),
+            "end_slot": np.ceil((end - WORKDAY_START) / SLOT_MINUTES).clip(0, SLOTS_PER_DAY).astype(int).to_numpy(),
+            "minutes": (hours * 60).to_numpy(),
+        })
+        self.load = self.bookings.groupby(["day", "technician_id"])["minutes"].sum()
+        self.index = BookingIndex(self.bookings["technician_id"].tolist(), self.bookings["day"].tolist(),
+                                  start.astype(int).tolist(), end.round().astype(int).tolist(),
+                                  bookings["id"].tolist())
+        self._days = self.bookings.groupby("day").indices
+        self._occupancy = {}
+
+    def occupancy(self, day):
+        """Matriz booleana técnicos x blocos do dia: True onde já há OS"""
+        day = str(day)
+        if day not in self._occupancy:
+            grid = np.zeros((len(self.technicians), SLOTS_PER_DAY + 1), dtype=np.int32)
+            rows = self.bookings.iloc[self._days.get(day, [])]
+            # +1 no início e -1 no fim de cada reserva; a soma acumulada dá quantas OS cobrem o bloco
+            np.add.at(grid, (rows["position"].to_numpy(), rows["start_slot"].to_numpy()), 1)
+            np.add.at(grid, (rows["position"].to_numpy(), rows["end_slot"].to_numpy()), -1)
+            self._occupancy[day] = np.cumsum(grid, axis=1)[:, :SLOTS_PER_DAY] > 0
+        return self._occupancy[day]
+
+    def committed_minutes(self, day):
+        """Minutos comprometidos de cada técnico no dia (na ordem de `technicians`)"""
+        day = str(day)
+        if day not in self.load.index.get_level_values(0):
+            return np.zeros(len(self.technicians))
+        return self.load.loc[day].reindex(self.technicians["id"]).fillna(0).to_numpy()
+
+    def first_free_slots(self, day, hours, not_before=0):
+        """Primeiro bloco de cada técnico com `hours` livres em sequência, ou -1"""
+        need = duration_slots(hours)
+        busy = np.zeros((len(self.technicians), SLOTS_PER_DAY + 1), dtype=np.int32)
+        busy[:, 1:] = np.cumsum(self.occupancy(day), axis=1)
+        free = (busy[:, need:] - busy[:, :-need]) == 0
+        free[:, :not_before] = False
+        return np.where(free.any(axis=1), free.argmax(axis=1), -1)
+
+    def rank(self, client_id, service_id, day, not_before=None):
+        """Técnicos do melhor para o pior candidato, com pontuação, horas comprometidas
+        no dia e primeiro horário livre (`start_time`, None sem vaga para a duração).
+
+        `not_before` (datetime.time) descarta horários anteriores, ex.: o horário atual
+        quando o agendamento é para hoje.
+        """
+        technicians = self.technicians
+        service_type = self.services.at[service_id, "type"] if service_id in self.services.index else None
+        hours = self.duration_hours(service_id)
+
+        region = self.client_regions.get(client_id)
+        region_score = (technicians["region"] == region).to_numpy(dtype=float) if region else 0.0
+        specialty = technicians["specialty"].fillna("").str.lower()
+        specialist = specialty.str.contains(str(service_type or "").lower(), regex=False) if service_type else None
+        if specialist is not None and specialist.any():
+            specialty_score = np.where(specialist, 1.0,
+                                       np.where(technicians["specialty"] == GENERALIST_SPECIALTY, 0.5, 0.0))
+        else:
+            # Tipo sem especialista (ex.: Mudança, Upgrade): todos empatam
+            specialty_score = 0.5
+        level_score = technicians["level"].map(LEVEL_SCORES).fillna(0.0).to_numpy()
+        committed = self.committed_minutes(day)
+        load_fraction = committed / (WORKDAY_END - WORKDAY_START)
+
+        start = time_slot(not_before, round_up=True) if not_before is not None else 0
+        slots = self.first_free_slots(day, hours, start)
+        result = technicians.assign(
+            score=(REGION_WEIGHT * region_score + SPECIALTY_WEIGHT * specialty_score
+                   + LEVEL_WEIGHT * level_score - LOAD_WEIGHT * load_fraction),
+            committed_hours=committed / 60,
+            slot=slots,
+            available=slots >= 0,
+            region_match=region_score > 0 if region else False,
+        )
+        result["start_time"] = [slot_time(slot) if slot >= 0 else None for slot in slots]
+        return result.sort_values(["available", "score", "slot"], ascending=[False, False, True],
+                                  kind="stable").reset_index(drop=True)
+
+    def client_region(self, client_id):
+        return self.client_regions.get(client_id)
+
+    def duration_hours(self, service_id):
+        return self.durations.get(service_id, DEFAULT_DURATION_HOURS)
+
+    def conflicts(self, technician_id, day, start_time, service_id, exclude=None):
+        """Ids das OS do técnico que se sobrepõem a uma OS do serviço começando em `start_time`"""
+        start = minute_of_day(start_time)
+        return self.index.overlaps(technician_id, str(day), start, start + round(self.duration_hours(service_id) * 60),
+                                   exclude)
+
+    def batch_conflicts(self, orders, keep_conflicting=False):
+        """Conflitos de um lote de novas OS (dicts com technician_id, service_id,
+        scheduled_date e scheduled_time), na ordem do lote.
+
+        Para cada OS devolve (ids de OS existentes, posições de OS anteriores do
+        lote) que se sobrepõem a ela. OS com conflito só entram na agenda do
+        lote com `keep_conflicting` (quando serão criadas mesmo assim).
+        """
+        batch = BookingIndex()
+        result = []
+        for position, order in enumerate(orders):
+            technician_id, day = order["technician_id"], str(order["scheduled_date"])[:10]
+            start = minute_of_day(order["scheduled_time"])
+            end = start + round(self.duration_hours(order["service_id"]) * 60)
+            existing = self.index.overlaps(technician_id, day, start, end)
+            earlier = batch.overlaps(technician_id, day, start, end)
+            result.append((existing, earlier))
+            if keep_conflicting or not (existing or earlier):
+                batch.add(technician_id, day, start, end, position)
+        return result
+
+    def next_free(self, technician_id, day, service_id, not_before=None):
+        """Próximo horário livre do técnico para o serviço (datetime), ou None no horizonte"""
+        found = self.index.next_free(technician_id, str(day), round(self.duration_hours(service_id) * 60),
+                                     minute_of_day(not_before) if not_before is not None else WORKDAY_START)
+        if found is None:
+            return None
+        free_day, minute = found
+        return datetime.combine(free_day, time(minute // 60, minute % 60))
+
+
+def not_before_for(day):
+    """Hoje só valem horários a partir de agora; outros dias, a jornada inteira"""
+    now = datetime.now()
+    return now.time() if day == now.date() else None
@@ -0,0 +1,294 @@
+import argparse
+import os
+import sys
+import tempfile
+import zipfile
+
+import pandas as pd
+import streamlit as st
+
+from storage import DEFAULT_PAGE_SIZE
+
+# Linhas por requisição/escrita; a memória usada é proporcional a este valor, não ao total.
+# Não passa do max-rows do PostgREST: uma página maior volta truncada pelo servidor
+EXPORT_CHUNK_SIZE = DEFAULT_PAGE_SIZE
+
+# Acima disso a exportação pela tela avisa que o arquivo fica em memória (a linha de comando não tem limite)
+UI_EXPORT_WARN_ROWS = 50000
+
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet",
+                  "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+
+ORDER_EXPORT_COLUMNS = ("id,order_number,client_id,service_id,technician_id,scheduled_date,scheduled_time,"
+                        "status,priority,estimated_cost,signal_level,completed_at,customer_satisfaction,"
+                        "description,observations,cto_reference,equipment_used,created_at")
+
+# Coluna de saída -> (tabela de referência, campo) ou coluna da própria ordem
+EXPORT_COLUMNS = {
+    "OS": "order_number",
+    "Data": "scheduled_date",
+    "Hora": "scheduled_time",
+    "Status": "status",
+    "Prioridade": "priority",
+    "Cliente": ("clients", "name"),
+    "Telefone": ("clients", "phone"),
+    "Endereço": ("clients", "address"),
+    "CTO": ("clients", "cto"),
+    "Plano": ("clients", "plan"),
+    "Serviço": ("services", "name"),
+    "Tipo": ("services", "type"),
+    "Técnico": ("technicians", "name"),
+    "Região": ("technicians", "region"),
+    "Valor": "estimated_cost",
+    "Sinal (dBm)": "signal_level",
+    "Concluído em": "completed_at",
+    "Satisfação": "customer_satisfaction",
+    "Descrição": "description",
+    "Observações": "observations",
+    "CTO da OS": "cto_reference",
+    "Equipamentos": "equipment_used",
+    "Criado em": "created_at",
+}
+NUMERIC_COLUMNS = ("Valor", "Satisfação")
+REFERENCE_KEYS = {"clients": "client_id", "services": "service_id", "technicians": "technician_id"}
+
+
+def reference_maps(manager):
+    """Tabelas de referência (já em cache no manager) como frames indexados por id"""
+    maps = {}
+    for table, rows in (("clients", manager.get_all_clients()), ("services", manager.get_all_services()),
+                        ("technicians", manager.get_all_technicians())):
+        fields = [column[1] for column in EXPORT_COLUMNS.values() if isinstance(column, tuple) and column[0] == table]
+        frame = pd.DataFrame.from_records(rows, columns=["id"] + fields)
+        maps[table] = frame.drop_duplicates("id").set_index("id")
+    return maps
+
+
+def period_filters(date_from=None, date_to=None):
+    filters = []
+    if date_from:
+        filters.append(("scheduled_date", "gte", str(date_from)))
+    if date_to:
+        filters.append(("scheduled_date", "lte", str(date_to)))
+    return filters
+
+
+def to_export_frame(rows, maps):
+    """Um bloco de ordens com os campos de cliente, serviço e técnico resolvidos pelos mapas"""
+    orders = pd.DataFrame.from_records(rows)
+    frame = pd.DataFrame(index=orders.index)
+    for name, source in EXPORT_COLUMNS.items():
+        if isinstance(source, tuple):
+            table, field = source
+            frame[name] = orders[REFERENCE_KEYS[table]].map(maps[table][field])
+        else:
+            frame[name] = orders[source] if source in orders else None
+    frame["Equipamentos"] = frame["Equipamentos"].map(
+        lambda value: ", ".join(map(str, value)) if isinstance(value, list) else value)
+    for name in NUMERIC_COLUMNS:
+        frame[name] = pd.to_numeric(frame[name], errors="coerce").astype("float64")
+    text_columns = [name for name in EXPORT_COLUMNS if name not in NUMERIC_COLUMNS]
+    frame[text_columns] = frame[text_columns].astype("string")
+    return frame
+
+
+class CSVWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8-sig", newline="")
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Exportação em Parquet requer o pacote pyarrow")
+        self.pa = pa
+        schema = pa.schema([(name, pa.float64() if name in NUMERIC_COLUMNS else pa.string())
+                            for name in EXPORT_COLUMNS])
+        # Cada bloco vira um row group; só o bloco atual fica em memória
+        self.writer = pq.ParquetWriter(path, schema, compression="snappy")
+        self.schema = schema
+
+    def write(self, frame):
+        self.writer.write_table(self.pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self.writer.close()
+
+
+def _column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+# Caracteres de controle que o XML não aceita (nem escapados)
+_XML_ILLEGAL = r"[\x00-\x08\x0b\x0c\x0e-\x1f]"
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Ordens" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'),
+}
+
+
+class XLSXWriter:
+    """Planilha XLSX gravada em fluxo, um bloco de linhas por vez.
+
+    O XML de cada bloco é montado com operações vetorizadas do pandas e vai
+    direto para a entrada da planilha dentro do zip; escrever célula a célula
+    pelo openpyxl levava minutos para 100 mil ordens. Textos vão como
+    inlineStr, então não há tabela de strings compartilhadas para guardar.
+    """
+
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self.sheet = self.zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self.letters = [_column_letter(i) for i in range(len(EXPORT_COLUMNS))]
+        self.next_row = 1
+        self._write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+        self.write(pd.DataFrame([list(EXPORT_COLUMNS)], columns=list(EXPORT_COLUMNS), dtype="string"))
+
+    def _write(self, text):
+        self.sheet.write(text.encode("utf-8"))
+
+    def write(self, frame):
+        if frame.empty:
+            return
+        numbers = pd.RangeIndex(self.next_row, self.next_row + len(frame)).astype(str).to_series(index=frame.index)
+        row_xml = '<row r="' + numbers + '">'
+        for letter, name in zip(self.letters, frame.columns):
+            values = frame[name]
+            ref = '<c r="' + letter + numbers
+            if values.dtype.kind == "f":
+                cells = ref + '"><v>' + values.map(repr) + "</v></c>"
+            else:
+                text = (values.astype("string").str.replace(_XML_ILLEGAL, "", regex=True)
+                        .str.replace("&", "&amp;", regex=False).str.replace("<", "&lt;", regex=False)
+                        .str.replace(">", "&gt;", regex=False))
+                cells = ref + '" t="inlineStr"><is><t xml:space="preserve">' + text + "</t></is></c>"
+            row_xml += cells.where(values.notna(), "").astype(object)
+        self._write("".join(row_xml + "</row>"))
+        self.next_row += len(frame)
+
+    def close(self):
+        self._write("</sheetData></worksheet>")
+        self.sheet.close()
+        for name, content in _XLSX_PARTS.items():
+            self.zip.writestr(name, content)
+        self.zip.close()
+
+
+WRITERS = {"csv": CSVWriter, "parquet": ParquetWriter, "xlsx": XLSXWriter}
+
+
+def export_orders(manager, path, fmt=None, chunk_size=EXPORT_CHUNK_SIZE, date_from=None, date_to=None,
+                  progress=None):
+    """Grava as ordens em `path` bloco a bloco; retorna o número de linhas exportadas.
+
+    O formato vem de `fmt` ou da extensão do arquivo (csv, parquet, xlsx).
+    `progress(linhas_exportadas)` é chamado após cada bloco. `chunk_size` é
+    limitado a DEFAULT_PAGE_SIZE, o máximo de linhas por resposta do servidor.
+    """
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt not in WRITERS:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+    chunk_size = min(chunk_size, DEFAULT_PAGE_SIZE)
+    maps = reference_maps(manager)
+    writer = WRITERS[fmt](path)
+    exported = 0
+    try:
+        for rows in manager.iter_orders(chunk_size, ORDER_EXPORT_COLUMNS, period_filters(date_from, date_to)):
+            writer.write(to_export_frame(rows, maps))
+            exported += len(rows)
+            if progress:
+                progress(exported)
+    finally:
+        writer.close()
+    return exported
+
+
+def show_export(manager):
+    """Exportação de OS para análise (CSV, Parquet ou XLSX)"""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        fmt = st.selectbox("Formato", list(EXPORT_FORMATS), format_func=str.upper, key="export_format")
+    with col2:
+        date_from = st.date_input("De", value=None, key="export_from")
+    with col3:
+        date_to = st.date_input("Até", value=None, key="export_to")
+    st.caption("A exportação pela tela guarda o arquivo inteiro em memória até o download. Para bases grandes, "
+               "use a linha de comando, que grava em blocos sem carregar tudo: "
+               "python export.py ordens.csv --from AAAA-MM-DD --to AAAA-MM-DD")
+    if st.button("📤 Gerar Exportação", type="primary"):
+        status = st.empty()
+        # O arquivo só existe até ser lido para o botão de download; a pasta é apagada em seguida
+        with tempfile.TemporaryDirectory(prefix="fiber_os_export_") as directory:
+            path = os.path.join(directory, f"ordens.{fmt}")
+            try:
+                exported = export_orders(manager, path, fmt, date_from=date_from, date_to=date_to,
+                                         progress=lambda count: status.caption(f"⏳ {count} OS exportadas..."))
+            except Exception as e:
+                st.error(f"Erro ao exportar: {e}")
+                return
+            with open(path, "rb") as f:
+                content = f.read()
+        status.success(f"✅ {exported} OS exportadas")
+        if exported > UI_EXPORT_WARN_ROWS:
+            st.warning(f"⚠️ {exported} OS ({len(content) / 1e6:.0f} MB) ficam em memória até o download; "
+                       "prefira a linha de comando para exportações deste tamanho.")
+        st.download_button(f"⬇️ Baixar ordens.{fmt}", content, file_name=f"ordens.{fmt}", mime=EXPORT_FORMATS[fmt])
+
+
+if __name__ == "__main__":
+    # Uso: python export.py saida.(csv|parquet|xlsx) [--from AAAA-MM-DD] [--to AAAA-MM-DD] [--chunk-size N]
+    from fiber_service_manager import FiberOpticServiceManager
+
+    parser = argparse.ArgumentParser(description="Exporta as ordens de serviço em blocos")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS))
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    count = export_orders(FiberOpticServiceManager(), args.path, args.format, args.chunk_size, args.date_from,
+                          args.date_to, progress=lambda done: print(f"{done}", file=sys.stderr))
+    print(f"{count} OS exportadas para {args.path}")
@@ -1,19 +1,333 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import unicodedata
+from datetime import date, datetime, time, timedelta, timezone
+
+# Ordens agendadas há mais que isso ficam fora dos feeds
+FEED_PAST_DAYS = 30
+CALENDAR_TIMEZONE = "America/Sao_Paulo"
+PRODID = "-//Fibra OS//Agenda de Ordens de Servico//PT-BR"
+UID_DOMAIN = "fibra-os"
+DEFAULT_DURATION_HOURS = 2
+# Definição do fuso referenciado pelo TZID dos eventos (RFC 5545, 3.6.5). São Paulo
+# não tem horário de verão desde 2019: um único bloco STANDARD em -03:00 basta
+VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    f"TZID:{CALENDAR_TIMEZONE}",
+    "BEGIN:STANDARD",
+    "DTSTART:19700101T000000",
+    "TZOFFSETFROM:-0300",
+    "TZOFFSETTO:-0300",
+    "TZNAME:-03",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+# Manifesto gravado junto dos .ics: arquivo -> nome, ETag e quantidade de eventos
+FEED_MANIFEST = "feeds.json"
+
+
+def _escape(text):
+    """Escapa um valor TEXT do iCalendar (RFC 5545, 3.3.11)"""
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line):
+    """Quebra a linha em partes de até 75 bytes, sem partir caracteres UTF-8"""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while len(data) - start > limit:
+        end = start + limit
+        # Bytes 10xxxxxx continuam um caractere: recua até o início dele
+        while data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end])
+        start, limit = end, 74
+    parts.append(data[start:])
+    return b"\r\n ".join(parts).decode("utf-8") + "\r\n"
+
+
+def _local_datetime(day, clock):
+    """Data e hora locais (sem fuso) no formato do iCalendar; None se inválidas"""
+    try:
+        clock = str(clock)
+        return datetime.combine(date.fromisoformat(str(day)[:10]), time(int(clock[:2]), int(clock[3:5])))
+    except ValueError:
+        return None
+
+
+def _utc_stamp(value):
+    """Carimbo UTC (DTSTAMP) a partir de um timestamp ISO; fixo se ausente, para o conteúdo não mudar à toa"""
+    try:
+        stamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        stamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return stamp.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_event(event):
+    """VEVENT (texto com CRLF) a partir de um dict com os campos planos do evento.
+
+    Campos: id (número da OS), client_name, service_name, service_type,
+    technician_name, scheduled_date, scheduled_time, duration e, opcionais,
+    address, cto, plan, region, description, status, updated_at,
+    latitude/longitude. None se data ou hora forem inválidas.
+    """
+    start = _local_datetime(event["scheduled_date"], event["scheduled_time"])
+    if start is None:
+        return None
+    end = start + timedelta(hours=float(event.get("duration") or DEFAULT_DURATION_HOURS))
+    summary = f"OS: {event['service_name']} - {event['client_name']}"
+    description = (f"Ordem de Serviço #{event['id']}\n"
+                   f"Tipo: {event['service_type']}\n"
+                   f"Cliente: {event['client_name']}\n"
+                   f"Endereço: {event.get('address') or 'N/A'}\n"
+                   f"CTO: {event.get('cto') or 'N/A'}\n"
+                   f"Plano: {event.get('plan') or 'N/A'}\n"
+                   f"Técnico: {event['technician_name']}\n"
+                   f"Região: {event.get('region') or 'N/A'}\n"
+                   f"Descrição: {event.get('description') or ''}")
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event['id']}@{UID_DOMAIN}",
+        f"DTSTAMP:{_utc_stamp(event.get('updated_at'))}",
+        f"DTSTART;TZID={CALENDAR_TIMEZONE}:{start.strftime('%Y%m%dT%H%M%S')}",
+        f"DTEND;TZID={CALENDAR_TIMEZONE}:{end.strftime('%Y%m%dT%H%M%S')}",
+        f"SUMMARY:{_escape(summary)}",
+        f"DESCRIPTION:{_escape(description)}",
+        f"STATUS:{'CANCELLED' if event.get('status') == 'Cancelado' else 'CONFIRMED'}",
+    ]
+    if event.get("address"):
+        lines.append(f"LOCATION:{_escape(event['address'])}")
+    if event.get("latitude") is not None and event.get("longitude") is not None:
+        lines.append(f"GEO:{float(event['latitude']):.6f};{float(event['longitude']):.6f}")
+    if event.get("status"):
+        lines.append(f"CATEGORIES:{_escape(event['status'])}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+def render_calendar(name, events):
+    """VCALENDAR completo com os VEVENTs já renderizados"""
+    header = "".join(_fold(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+        f"X-WR-TIMEZONE:{CALENDAR_TIMEZONE}",
+    ] + VTIMEZONE)
+    return header + "".join(events) + "END:VCALENDAR\r\n"
+
+
+def content_etag(content):
+    """ETag forte (entre aspas) derivado do conteúdo"""
+    return '"' + hashlib.sha256(content.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _slug(text):
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return "-".join("".join(ch if ch.isalnum() else " " for ch in text).split()) or "sem-nome"
+
+
+def feed_filename(key):
+    kind, value = key
+    return f"{kind}-{_slug(value)}.ics"
+
+
+def order_event(order, client, service, technician):
+    """Campos planos do evento de uma OS da tabela service_orders, com as referências resolvidas"""
+    client, service, technician = client or {}, service or {}, technician or {}
+    return {
+        "id": order.get("order_number") or order.get("id"),
+        "client_name": client.get("name", "N/A"),
+        "address": client.get("address"),
+        "cto": order.get("cto_reference") or client.get("cto"),
+        "plan": client.get("plan"),
+        "latitude": client.get("latitude"),
+        "longitude": client.get("longitude"),
+        "service_name": service.get("name", "N/A"),
+        "service_type": service.get("type", "N/A"),
+        "duration": service.get("duration"),
+        "technician_name": technician.get("name", "N/A"),
+        "region": technician.get("region"),
+        "scheduled_date": order.get("scheduled_date"),
+        "scheduled_time": order.get("scheduled_time"),
+        "description": order.get("description"),
+        "status": order.get("status"),
+        "updated_at": order.get("updated_at") or order.get("created_at"),
+    }
+
+
+def _same_sources(previous, current):
+    # Linhas trocadas por objetos novos só quando mudam; a igualdade cobre recargas do cache
+    return all(a is b or a == b for a, b in zip(previous, current))
+
+
+class CalendarFeeds:
+    """Feeds iCalendar por técnico ("tecnico", id) e por região ("regiao", nome).
+
+    Cada OS vira um VEVENT guardado junto das linhas que o geraram (ordem,
+    cliente, serviço e técnico). `refresh` só renderiza de novo os eventos
+    cujas linhas mudaram e só remonta os feeds que ganharam, perderam ou
+    tiveram algum evento alterado; os demais mantêm conteúdo e ETag, então
+    um cliente de calendário que consulta o feed recebe o mesmo arquivo até
+    algo mudar de fato.
+    """
+
+    def __init__(self, past_days=FEED_PAST_DAYS):
+        self.past_days = past_days
+        self.version = 0
+        # Origem do último refresh ((versão das ordens, dia), clientes, serviços, técnicos), mantida pelo chamador
+        self.source = None
+        self._events = {}
+        self._members = {}
+        self._names = {}
+        self._feeds = {}
+        self._lock = threading.RLock()
+
+    def refresh(self, orders, clients, services, technicians, today=None):
+        """Aplica o estado atual das ordens; retorna as chaves dos feeds remontados"""
+        since = ((today or date.today()) - timedelta(days=self.past_days)).isoformat()
+        clients = {c["id"]: c for c in clients}
+        services = {s["id"]: s for s in services}
+        technicians = {t["id"]: t for t in technicians}
+        with self._lock:
+            dirty, seen = set(), set()
+            for order in orders:
+                day = str(order.get("scheduled_date") or "")[:10]
+                if not day or day < since:
+                    continue
+                order_id = order["id"]
+                seen.add(order_id)
+                technician = technicians.get(order.get("technician_id"))
+                sources = (order, clients.get(order.get("client_id")), services.get(order.get("service_id")),
+                           technician)
+                cached = self._events.get(order_id)
+                if cached is not None and _same_sources(cached[0], sources):
+                    continue
+                if cached is not None:
+                    self._drop(order_id, cached[2], dirty)
+                event = render_event(order_event(*sources))
+                keys = ()
+                if event is not None and technician:
+                    keys = (("tecnico", technician["id"]), ("regiao", technician.get("region") or "N/A"))
+                    self._names[keys[0]] = f"OS - {technician.get('name', 'Técnico')}"
+                    self._names[keys[1]] = f"OS - Região {keys[1][1]}"
+                    for key in keys:
+                        self._members.setdefault(key, {})[order_id] = (day, str(order.get("scheduled_time")),
+                                                                       order_id)
+                    dirty.update(keys)
+                self._events[order_id] = (sources, event, keys)
+            for order_id in self._events.keys() - seen:
+                self._drop(order_id, self._events.pop(order_id)[2], dirty)
+            for key in dirty:
+                self._rebuild(key)
+            if dirty:
+                self.version += 1
+            return dirty
+
+    def _drop(self, order_id, keys, dirty):
+        for key in keys:
+            self._members.get(key, {}).pop(order_id, None)
+        dirty.update(keys)
+
+    def _rebuild(self, key):
+        members = self._members.get(key)
+        if not members:
+            self._members.pop(key, None)
+            self._feeds.pop(key, None)
+            return
+        order_ids = sorted(members, key=members.get)
+        content = render_calendar(self._names[key], [self._events[order_id][1] for order_id in order_ids])
+        self._feeds[key] = (content, content_etag(content), len(order_ids))
+
+    def get(self, key):
+        """(conteúdo .ics, ETag) do feed, ou None se não houver eventos"""
+        with self._lock:
+            feed = self._feeds.get(key)
+            return (feed[0], feed[1]) if feed else None
+
+    def feeds(self):
+        """Lista (chave, nome, ETag, eventos) de todos os feeds, por tipo e nome"""
+        with self._lock:
+            feeds = [(key, self._names[key], etag, count) for key, (_, etag, count) in self._feeds.items()]
+        return sorted(feeds, key=lambda feed: (feed[0][0], feed[1]))
+
+    def write(self, directory):
+        """Grava os feeds em `directory` (um .ics cada e o manifesto FEED_MANIFEST).
+
+        Arquivos cujo ETag já consta no manifesto não são tocados, preservando
+        a data de modificação usada pelo servidor web; feeds que deixaram de
+        existir são removidos. Retorna os nomes dos arquivos gravados.
+        """
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, FEED_MANIFEST)
+        try:
+            with open(manifest_path, encoding="utf-8") as handle:
+                previous = json.load(handle)
+        except (OSError, ValueError):
+            previous = {}
+        with self._lock:
+            snapshot = {feed_filename(key): (self._names[key], content, etag, count)
+                        for key, (content, etag, count) in self._feeds.items()}
+        written = []
+        for filename, (name, content, etag, count) in snapshot.items():
+            path = os.path.join(directory, filename)
+            if previous.get(filename, {}).get("etag") == etag and os.path.exists(path):
+                continue
+            _write_atomic(path, content)
+            written.append(filename)
+        for filename in previous.keys() - snapshot.keys():
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                pass
+        manifest = {filename: {"name": name, "etag": etag, "events": count}
+                    for filename, (name, _, etag, count) in sorted(snapshot.items())}
+        _write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2))
+        return written
+
+
+def _write_atomic(path, content):
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8", newline="") as handle:
+        handle.write(content)
+    os.replace(temporary, path)
+
+
 class FiberOpticCalendarIntegration:
     @staticmethod
     def create_calendar_event(order_data):
+        """Evento iCalendar de uma OS recém-criada (os feeds o incluem na próxima atualização)"""
+        event = render_event(order_data)
+        if event is None:
+            return {"status": "error", "event_id": None, "details": None}
         event_details = {
             "title": f"OS: {order_data['service_name']} - {order_data['client_name']}",
-            "description": f"""Ordem de Serviço #{order_data['id']}
-Tipo: {order_data['service_type']}
-Cliente: {order_data['client_name']}
-Endereço: {order_data.get('address', 'N/A')}
-CTO: {order_data.get('cto', 'N/A')}
-Plano: {order_data.get('plan', 'N/A')}
-Técnico: {order_data['technician_name']}
-Região: {order_data.get('region', 'N/A')}
-Descrição: {order_data['description']}""",
             "start_time": f"{order_data['scheduled_date']} {order_data['scheduled_time']}",
-            "duration": order_data.get('duration', 2),
+            "duration": order_data.get('duration', DEFAULT_DURATION_HOURS),
             "attendees": [order_data.get('client_email', ''), order_data.get('technician_email', '')]
         }
-        return {"status": "success", "event_id": f"cal_{order_data['id']}", "details": event_details}
\ No newline at end of file
+        return {"status": "success", "event_id": f"{order_data['id']}@{UID_DOMAIN}", "details": event_details,
+                "ics": render_calendar(event_details["title"], [event])}
+
+
+if __name__ == "__main__":
+    # Uso: python fiber_calendar.py pasta_de_saida
+    from fiber_service_manager import FiberOpticServiceManager
+
+    feeds = FiberOpticServiceManager().refresh_calendar_feeds()
+    if feeds is None:
+        sys.exit(1)
+    written = feeds.write(sys.argv[1])
+    print(f"{len(feeds.feeds())} feeds; {len(written)} arquivos gravados")
@@ -1,8 +1,97 @@
 import streamlit as st
 import pandas as pd
+import os
+import threading
 import uuid
-from datetime import datetime
+from datetime import datetime, date
 from supabase import create_client, Client
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from data_cache import TableCache, LRUCache
+from order_store import OrderStore, ID_CHUNK_SIZE
+from change_feed import LocalChangeFeed, SupabaseRealtimeFeed
+from storage import SupabaseStorage, SQLiteStorage, iter_rows, fan_out
+from instrumentation import InstrumentedStorage, MetricsRecorder
+from search_index import ClientSearchIndex, OrderSearchIndex, client_fingerprint, normalize, tokenize
+from dispatch import DispatchEngine, FREE_STATUSES
+from routing import plan_routes
+from fiber_calendar import CalendarFeeds
+from snapshot import SnapshotState, load_snapshot, snapshot_rows, recent_orders, write_snapshot
+import metrics
+
+# Versão do schema/dados iniciais registrada em app_meta; incremente ao mudar o seed
+SCHEMA_VERSION = "1"
+
+# Tempo (segundos) que as tabelas de referência ficam em cache
+REFERENCE_CACHE_TTL = 300
+REFERENCE_TABLES = ('clients', 'services', 'technicians', 'equipment')
+# Nomes exibidos nos erros das leituras em paralelo
+DATA_LABELS = {'clients': 'clientes', 'services': 'serviços', 'technicians': 'técnicos', 'equipment': 'equipamentos',
+               'orders': 'ordens', 'kpis': 'indicadores', 'upcoming': 'próximas OS'}
+
+# Verificação do backend: prazo da consulta de teste e intervalo entre verificações (segundos)
+BACKEND_PROBE_TIMEOUT = 5
+BACKEND_PROBE_INTERVAL = 30
+
+# Intervalo mínimo (segundos) entre snapshots locais gravados em segundo plano
+SNAPSHOT_INTERVAL = 600
+
+# Prazo (segundos) de cada chamada das leituras em paralelo de uma página
+PAGE_LOAD_TIMEOUT = 20
+
+# View com a coluna search_text (schema.py, Schema Completo) usada pela busca textual no servidor
+ORDER_SEARCH_VIEW = 'service_orders_search'
+
+# Sem a view, limite de clientes resolvidos pela busca textual (evita URLs gigantes no filtro in.)
+MAX_TEXT_SEARCH_CLIENTS = 200
+
+# Linhas por requisição na importação em lote de OS
+BULK_INSERT_BATCH_SIZE = 500
+
+# OS detalhadas mantidas em memória (LRU por id)
+ORDER_DETAIL_CACHE_SIZE = 256
+
+# Os índices de busca valem enquanto os dados indexados não mudam; o TTL só libera memória ociosa
+SEARCH_INDEX_TTL = 3600
+
+# OS alteradas desde a construção do índice de busca a partir das quais ele é refeito (em segundo plano)
+ORDER_SEARCH_MAX_PENDING = 2000
+
+# Uma reconstrução do índice de busca das OS por vez no processo
+_order_search_build = threading.Lock()
+
+# Tamanho da página ao ler tabelas de agregados (limite de linhas do PostgREST)
+ROLLUP_PAGE_SIZE = 1000
+
+# Linhas por página em iter_orders e requisições simultâneas nas leituras em lote.
+# No SQLite (local, conexão única com lock) as páginas são lidas em sequência.
+ORDER_CHUNK_SIZE = 1000
+ORDER_FETCH_WORKERS = 4
+
+# Seleções com cliente, serviço e técnico embutidos (resource embedding do PostgREST):
+# uma única requisição traz a ordem já com os nomes resolvidos
+ORDER_LIST_SELECT = (
+    "id,order_number,client_id,service_id,technician_id,scheduled_date,scheduled_time,"
+    "status,priority,estimated_cost,signal_level,"
+    "clients(name,cto,plan),services(name,type),technicians(name,region)"
+)
+ORDER_DETAIL_SELECT = "*,clients(name,phone,address,cto,plan),services(name,type),technicians(name,region)"
+ORDER_CALENDAR_SELECT = (
+    "id,order_number,scheduled_date,scheduled_time,status,priority,"
+    "clients(name,cto),services(name,type),technicians(name,region)"
+)
+ORDER_ROUTE_SELECT = "id,order_number,client_id,service_id,technician_id,scheduled_time,status,priority"
+
+# Campos da OS lidos por build_orders_dataframe
+ORDER_FRAME_SOURCE_COLUMNS = ["id", "order_number", "client_id", "service_id", "technician_id", "scheduled_date",
+                              "scheduled_time", "status", "priority", "estimated_cost", "signal_level"]
+
+# Formatação das colunas do frame de OS, aplicada só na exibição (st.dataframe)
+ORDER_COLUMN_CONFIG = {
+    "Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+    "Hora": st.column_config.TimeColumn("Hora", format="HH:mm"),
+    "Valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+    "Sinal (dBm)": st.column_config.NumberColumn("Sinal (dBm)", format="%.1f"),
+}
 
 @st.cache_resource
 def init_supabase():
@@ -15,16 +104,219 @@ def init_supabase():
         st.error(f"Erro ao conectar com Supabase: {e}")
         return None
 
+@st.cache_resource
+def init_storage():
+    """Backend de dados do processo, escolhido por STORAGE_BACKEND.
+    
+    "supabase" (padrão) usa o projeto configurado em SUPABASE_URL/SUPABASE_KEY;
+    "sqlite" usa um banco local em SQLITE_PATH (":memory:" para um banco volátil),
+    com o mesmo schema, útil offline e em benchmarks.
+    """
+    backend = _get_secret("STORAGE_BACKEND", "supabase")
+    if backend == "sqlite":
+        try:
+            return SQLiteStorage(_get_secret("SQLITE_PATH", "fiber_os.db"))
+        except Exception as e:
+            st.error(f"Erro ao abrir banco SQLite: {e}")
+            return None
+    if backend != "supabase":
+        st.error(f"STORAGE_BACKEND desconhecido: {backend}")
+        return None
+    supabase = init_supabase()
+    return SupabaseStorage(supabase) if supabase else None
+
+def _category(values, known=()):
+    """Coluna categórica; categorias conhecidas primeiro (ordem de exibição), sem perder valores novos"""
+    values = values.fillna("N/A")
+    categories = list(known) + sorted(set(values.unique()) - set(known))
+    return pd.Categorical(values, categories=categories)
+
+@st.cache_resource
+def get_reference_cache():
+    """Cache das tabelas de referência, único por processo (compartilhado entre sessões)"""
+    return TableCache(ttl=REFERENCE_CACHE_TTL)
+
+@st.cache_resource
+def get_order_store():
+    """Cópia local de service_orders, única por processo (compartilhada entre sessões)"""
+    return OrderStore()
+
+@st.cache_resource
+def get_order_detail_cache():
+    """OS com cliente, serviço e técnico embutidos, por id (compartilhado entre sessões)"""
+    return LRUCache(maxsize=ORDER_DETAIL_CACHE_SIZE)
+
+@st.cache_resource
+def get_calendar_feeds():
+    """Feeds ICS por técnico e região, únicos por processo (compartilhados entre sessões)"""
+    return CalendarFeeds()
+
+@st.cache_resource
+def get_metrics_recorder():
+    """Métricas de chamadas ao backend e renderização, únicas por processo.
+    
+    METRICS_LOG (opcional) é um arquivo onde cada rerun é anexado como linha JSON.
+    """
+    return MetricsRecorder(log_path=_get_secret("METRICS_LOG"))
+
+def _get_secret(name, default=None):
+    """Lê um secret do Streamlit, com a variável de ambiente de mesmo nome como alternativa"""
+    try:
+        value = st.secrets.get(name)
+    except Exception:
+        value = None
+    return value if value is not None else os.environ.get(name, default)
+
+@st.cache_resource
+def get_change_feed():
+    """Feed de mudanças do processo, já ligado ao cache de referência e à cópia das ordens.
+    
+    CHANGE_FEED = "realtime" (padrão) escuta o Supabase Realtime;
+    "local" só recebe as escritas feitas por este processo. O backend
+    SQLite usa sempre o feed local.
+    """
+    supabase_url = _get_secret("SUPABASE_URL")
+    use_realtime = _get_secret("STORAGE_BACKEND", "supabase") == "supabase"
+    if use_realtime and _get_secret("CHANGE_FEED", "realtime") == "realtime" and supabase_url:
+        feed = SupabaseRealtimeFeed(supabase_url, _get_secret("SUPABASE_KEY"))
+    else:
+        feed = LocalChangeFeed()
+    feed.subscribe(apply_change)
+    feed.start()
+    return feed
+
+def apply_change(table, event, record, old_record):
+    """Atualiza só a entrada afetada pelos caches compartilhados"""
+    if table == 'service_orders':
+        get_order_store().apply_change(event, record, old_record)
+        get_order_detail_cache().invalidate((old_record if event == 'DELETE' else record).get('id'))
+    elif table in REFERENCE_TABLES:
+        get_reference_cache().patch(table, lambda rows: _patch_rows(rows, event, record, old_record))
+        # Nomes embutidos nas OS detalhadas podem ter mudado
+        get_order_detail_cache().invalidate()
+
+def _patch_rows(rows, event, record, old_record):
+    row_id = (old_record if event == 'DELETE' else record).get('id')
+    patched = [r for r in rows if r.get('id') != row_id] if event == 'DELETE' else list(rows)
+    if event != 'DELETE':
+        positions = {r.get('id'): i for i, r in enumerate(patched)}
+        if row_id in positions:
+            patched[positions[row_id]] = record
+        else:
+            patched.append(record)
+    return patched
+
+@st.cache_resource
+def get_snapshot_state():
+    """Snapshot local do processo (snapshot.SnapshotState).
+    
+    SNAPSHOT_PATH é o arquivo SQLite do snapshot; por padrão fica ligado só
+    com o Supabase ("fiber_os_snapshot.db"), e um valor vazio o desliga.
+    """
+    default = "fiber_os_snapshot.db" if _get_secret("STORAGE_BACKEND", "supabase") == "supabase" else ""
+    return SnapshotState(_get_secret("SNAPSHOT_PATH", default) or None)
+
+@st.cache_resource
+def warm_start(_manager):
+    """Cold start a partir do snapshot local, uma vez por processo"""
+    return _manager._warm_start()
+
+@st.cache_resource
+def bootstrap_database(_manager, schema_version):
+    """Executa a inicialização do banco uma vez por processo e versão de schema"""
+    return _manager.initialize_database(schema_version)
+
 class FiberOpticServiceManager:
     def __init__(self):
-        self.supabase = init_supabase()
-        if self.supabase:
-            self.initialize_database()
+        storage = init_storage()
+        self.metrics = get_metrics_recorder()
+        self.snapshot = get_snapshot_state()
+        self.order_details = get_order_detail_cache()
+        self.calendar_feeds = get_calendar_feeds()
+        self.changes = get_change_feed()
+        self.fetch_workers = ORDER_FETCH_WORKERS if storage and storage.name == "supabase" else 1
+        # O manager é criado a cada rerun: frames de KPI lidos uma vez por rerun (barra lateral e páginas)
+        self._kpi_frames = {}
+        self.offline = storage is None or not self.snapshot.backend_available(
+            lambda: storage.select('services', 'id', limit=1), BACKEND_PROBE_TIMEOUT, BACKEND_PROBE_INTERVAL)
+        resources = self.snapshot.offline_resources() if self.offline and self.snapshot.path else None
+        if resources:
+            # Backend fora do ar: leitura do snapshot local, com cache e cópia de ordens próprios
+            storage, self.cache, self.orders = resources
+            self.order_details = LRUCache(maxsize=ORDER_DETAIL_CACHE_SIZE)
+            self.fetch_workers = 1
+        else:
+            self.offline = False
+            self.cache = get_reference_cache()
+            self.orders = get_order_store()
+        # Toda chamada ao backend passa pelo wrapper que mede tempo, linhas e payload
+        self.storage = InstrumentedStorage(storage, self.metrics) if storage else None
+        if self.storage and not self.offline:
+            if self.snapshot.path:
+                warm_start(self)
+                if self.snapshot.due(SNAPSHOT_INTERVAL) and not self.snapshot.serving_since:
+                    # Se a carga do cold start falhou, ela é refeita em vez de só gravar o snapshot
+                    self.snapshot.run_in_background(
+                        self._refresh_from_backend if self.snapshot.refresh_pending else self.save_snapshot)
+            if not bootstrap_database(self, SCHEMA_VERSION):
+                # Falhou: descarta o resultado em cache para tentar de novo no próximo rerun
+                bootstrap_database.clear()
+    
+    def _warm_start(self):
+        """Cold start: serve o snapshot local já e busca tudo do backend em segundo plano.
+        Retorna True se havia snapshot para servir."""
+        storage, saved_at = load_snapshot(self.snapshot.path)
+        if storage is None:
+            return False
+        tables, orders = snapshot_rows(storage)
+        for table, rows in tables.items():
+            if self.cache.get(table) is None:
+                self.cache.set(table, rows)
+        self.snapshot.saved_at = saved_at
+        if not self.orders.seed(orders):
+            return False
+        self.snapshot.serving_since = saved_at
+        self.snapshot.refresh_pending = True
+        self.snapshot.run_in_background(self._refresh_from_backend)
+        return True
+    
+    def _refresh_from_backend(self):
+        """Recarrega referências e ordens do backend (thread de fundo) e grava um snapshot novo.
+        
+        Em falha, as páginas deixam de se apresentar como cold start e o backend
+        passa a indisponível; a carga é refeita num rerun depois do intervalo."""
+        try:
+            tables = {table: self._load_table(table) for table in REFERENCE_TABLES}
+            self.orders.reload(self.storage, self.fetch_workers)
+        except Exception as e:
+            self.snapshot.backend_failed(e)
+            raise
+        for table, rows in tables.items():
+            self.cache.set(table, rows)
+        self.snapshot.refresh_pending = False
+        self.snapshot.serving_since = None
+        self.save_snapshot()
     
-    def initialize_database(self):
+    def save_snapshot(self):
+        """Grava no SNAPSHOT_PATH as tabelas de referência e as ordens recentes em memória"""
+        tables = {table: self.cache.get_or_load(table, lambda table=table: self._load_table(table))
+                  for table in REFERENCE_TABLES}
+        self.orders.sync(self.storage, delta=not self.changes.live, workers=self.fetch_workers)
+        saved_at = write_snapshot(self.snapshot.path, tables, recent_orders(self.orders.all()))
+        self.snapshot.saved(saved_at)
+        return saved_at
+    
+    def initialize_database(self, schema_version=SCHEMA_VERSION):
+        """Insere os dados iniciais nas tabelas vazias e registra a versão em app_meta.
+        
+        Se app_meta já registra `schema_version`, nada é consultado além do marcador.
+        Retorna True quando o banco está pronto.
+        """
+        if self._get_seed_version() == schema_version:
+            return True
         try:
-            clients_result = self.supabase.table('clients').select('*').limit(1).execute()
-            if not clients_result.data:
+            clients_rows, _ = self.storage.select('clients', 'id', limit=1)
+            if not clients_rows:
                 default_clients = [
                     {
                         "name": "João Silva",
@@ -51,10 +343,11 @@ class FiberOpticServiceManager:
                         "plan": "200MB"
                     }
                 ]
-                self.supabase.table('clients').insert(default_clients).execute()
+                self.storage.insert('clients', default_clients)
+                self.cache.invalidate('clients')
             
-            services_result = self.supabase.table('services').select('*').limit(1).execute()
-            if not services_result.data:
+            services_rows, _ = self.storage.select('services', 'id', limit=1)
+            if not services_rows:
                 default_services = [
                     {"name": "Instalação Residencial", "price": 0.00, "duration": 3, "type": "Instalação"},
                     {"name": "Instalação Empresarial", "price": 0.00, "duration": 4, "type": "Instalação"},
@@ -67,10 +360,11 @@ class FiberOpticServiceManager:
                     {"name": "Emenda de Fibra", "price": 120.00, "duration": 2, "type": "Reparo"},
                     {"name": "Cancelamento", "price": 0.00, "duration": 1, "type": "Cancelamento"}
                 ]
-                self.supabase.table('services').insert(default_services).execute()
+                self.storage.insert('services', default_services)
+                self.cache.invalidate('services')
             
-            technicians_result = self.supabase.table('technicians').select('*').limit(1).execute()
-            if not technicians_result.data:
+            technicians_rows, _ = self.storage.select('technicians', 'id', limit=1)
+            if not technicians_rows:
                 default_technicians = [
                     {"name": "Carlos Fibra", "specialty": "Instalação", "region": "Zona Sul", "level": "Sênior"},
                     {"name": "Ana Conecta", "specialty": "Reparo", "region": "Centro", "level": "Pleno"},
@@ -78,10 +372,11 @@ class FiberOpticServiceManager:
                     {"name": "Mariana Link", "specialty": "Instalação", "region": "Zona Oeste", "level": "Sênior"},
                     {"name": "Pedro Optical", "specialty": "Reparo", "region": "Zona Leste", "level": "Pleno"}
                 ]
-                self.supabase.table('technicians').insert(default_technicians).execute()
+                self.storage.insert('technicians', default_technicians)
+                self.cache.invalidate('technicians')
             
-            equipment_result = self.supabase.table('equipment').select('*').limit(1).execute()
-            if not equipment_result.data:
+            equipment_rows, _ = self.storage.select('equipment', 'id', limit=1)
+            if not equipment_rows:
                 default_equipment = [
                     {"name": "ONT Huawei HG8010H", "type": "ONT", "price": 150.00},
                     {"name": "ONT Nokia G-010G-A", "type": "ONT", "price": 120.00},
@@ -91,10 +386,37 @@ class FiberOpticServiceManager:
                     {"name": "Conector SC/APC", "type": "Conector", "price": 5.00},
                     {"name": "Cordão Óptico 3m", "type": "Cordão", "price": 15.00}
                 ]
-                self.supabase.table('equipment').insert(default_equipment).execute()
+                self.storage.insert('equipment', default_equipment)
+                self.cache.invalidate('equipment')
         
         except Exception as e:
             st.error(f"Erro ao inicializar dados: {e}")
+            return False
+        
+        self._set_seed_version(schema_version)
+        return True
+    
+    def _get_seed_version(self):
+        try:
+            rows, _ = self.storage.select('app_meta', 'value', filters=[('key', 'eq', 'seed_version')])
+            return rows[0]['value'] if rows else None
+        except Exception:
+            # Tabela app_meta ainda não criada: segue com as verificações completas
+            return None
+    
+    def _set_seed_version(self, schema_version):
+        try:
+            self.storage.upsert('app_meta', [{"key": "seed_version", "value": schema_version}])
+        except Exception:
+            pass
+    
+    def _publish(self, table, event, rows):
+        """Notifica as linhas escritas por este manager aos assinantes do change feed"""
+        for row in rows or []:
+            if event == 'DELETE':
+                self.changes.publish(table, event, old_record=row)
+            else:
+                self.changes.publish(table, event, record=row)
     
     def generate_id(self):
         return str(uuid.uuid4())[:8].upper()
@@ -117,9 +439,10 @@ class FiberOpticServiceManager:
                 "observations": order_data.get("observations", ""),
                 "cto_reference": order_data.get("cto_reference", "")
             }
-            result = self.supabase.table('service_orders').insert(order).execute()
-            if result.data:
-                return result.data[0]
+            rows = self.storage.insert('service_orders', [order])
+            if rows:
+                self._publish('service_orders', 'INSERT', rows)
+                return rows[0]
             else:
                 st.error("Erro ao criar ordem de serviço")
                 return None
@@ -127,133 +450,656 @@ class FiberOpticServiceManager:
             st.error(f"Erro ao criar OS: {e}")
             return None
     
+    def generate_order_numbers(self, count):
+        """Gera `count` números de OS distintos entre si"""
+        numbers = set()
+        while len(numbers) < count:
+            numbers.add(f"OS{self.generate_id()}")
+        return list(numbers)
+    
+    def create_service_orders_bulk(self, orders, batch_size=BULK_INSERT_BATCH_SIZE, progress=None):
+        """Insere ordens em lotes (uma requisição por lote).
+        
+        `orders` são dicionários já no formato da tabela, sem order_number.
+        Um lote que falha é refeito linha a linha para isolar as linhas com
+        erro; números de OS repetidos no banco são gerados de novo uma vez.
+        `progress(feitas, total)` é chamado após cada lote. Retorna
+        (criadas, erros), onde erros é uma lista de (posição em orders, mensagem).
+        """
+        created = []
+        errors = []
+        numbers = self.generate_order_numbers(len(orders))
+        for start in range(0, len(orders), batch_size):
+            batch = [
+                {**order, "order_number": number, "status": order.get("status") or "Agendado"}
+                for order, number in zip(orders[start:start + batch_size], numbers[start:start + batch_size])
+            ]
+            try:
+                created.extend(self.storage.insert('service_orders', batch))
+            except Exception:
+                for offset, order in enumerate(batch):
+                    row, error = self._insert_single_order(order)
+                    if row:
+                        created.append(row)
+                    else:
+                        errors.append((start + offset, error))
+            if progress:
+                progress(min(start + batch_size, len(orders)), len(orders))
+        self._publish('service_orders', 'INSERT', created)
+        return created, errors
+    
+    def _insert_single_order(self, order):
+        for attempt in range(2):
+            try:
+                return self.storage.insert('service_orders', [order])[0], None
+            except Exception as e:
+                message = str(e)
+                # 23505/duplicate key no Postgres, UNIQUE constraint failed no SQLite
+                duplicate = '23505' in message or 'duplicate key' in message or 'UNIQUE constraint' in message
+                if attempt == 0 and duplicate and 'order_number' in message:
+                    order = {**order, "order_number": f"OS{self.generate_id()}"}
+                    continue
+                return None, message
+    
+    def _status_update_data(self, new_status, completion_data=None):
+        update_data = {"status": new_status}
+        if new_status == "Concluído" and completion_data:
+            update_data.update({
+                "completed_at": datetime.now().isoformat(),
+                "signal_level": completion_data.get("signal_level", ""),
+                "equipment_used": completion_data.get("equipment_used", []),
+                "observations": completion_data.get("observations", ""),
+                "customer_satisfaction": completion_data.get("customer_satisfaction", "")
+            })
+        return update_data
+    
     def update_order_status(self, order_id, new_status, completion_data=None):
         try:
-            update_data = {"status": new_status}
-            if new_status == "Concluído" and completion_data:
-                update_data.update({
-                    "completed_at": datetime.now().isoformat(),
-                    "signal_level": completion_data.get("signal_level", ""),
-                    "equipment_used": completion_data.get("equipment_used", []),
-                    "observations": completion_data.get("observations", ""),
-                    "customer_satisfaction": completion_data.get("customer_satisfaction", "")
-                })
-            result = self.supabase.table('service_orders').update(update_data).eq('id', order_id).execute()
-            return result.data
+            update_data = self._status_update_data(new_status, completion_data)
+            rows = self.storage.update('service_orders', update_data, [('id', 'eq', order_id)])
+            self.order_details.invalidate(order_id)
+            self._publish('service_orders', 'UPDATE', rows)
+            return rows
         except Exception as e:
             st.error(f"Erro ao atualizar status: {e}")
             return None
     
+    def bulk_update_status(self, order_ids, new_status, completion_data=None):
+        """Atualiza o status de várias OS com um único UPDATE filtrado por id (in.).
+        
+        Retorna {id: True/False} indicando quais ids foram de fato atualizados.
+        """
+        order_ids = list(dict.fromkeys(order_ids))
+        results = {order_id: False for order_id in order_ids}
+        if not order_ids:
+            return results
+        update_data = self._status_update_data(new_status, completion_data)
+        try:
+            # Listas muito grandes são divididas só para manter a URL curta
+            for start in range(0, len(order_ids), ID_CHUNK_SIZE):
+                chunk = order_ids[start:start + ID_CHUNK_SIZE]
+                rows = self.storage.update('service_orders', update_data, [('id', 'in', chunk)])
+                for order_id in chunk:
+                    self.order_details.invalidate(order_id)
+                self._publish('service_orders', 'UPDATE', rows)
+                for row in rows:
+                    results[row['id']] = True
+        except Exception as e:
+            st.error(f"Erro ao atualizar status em lote: {e}")
+        return results
+    
+    def _load_table(self, table):
+        """Tabela inteira em páginas por id (uma única seleção seria truncada pelo limite do servidor)"""
+        return [row for page in iter_rows(self.storage, table, workers=self.fetch_workers) for row in page]
+    
+    def _get_reference_table(self, table):
+        rows = self.cache.get_or_load(table, lambda: self._load_table(table))
+        # Cópia rasa para que a página não altere a lista compartilhada
+        return list(rows)
+    
+    def fetch_parallel(self, calls, timeout=PAGE_LOAD_TIMEOUT):
+        """Executa várias leituras ao mesmo tempo (storage.fan_out); retorna (resultados, erros).
+        
+        As threads recebem o contexto do Streamlit deste rerun, então avisos
+        st.* feitos dentro das chamadas aparecem na página.
+        """
+        script_context = get_script_run_ctx()
+        
+        def attach(call):
+            def run():
+                if script_context is not None:
+                    add_script_run_ctx(threading.current_thread(), script_context)
+                return call()
+            return run
+        
+        return fan_out({name: attach(call) for name, call in calls.items()}, timeout)
+    
+    def load_reference_tables(self, *tables, timeout=PAGE_LOAD_TIMEOUT):
+        """Tabelas de referência pedidas, buscando ao mesmo tempo as que não estão em cache.
+        
+        Retorna as listas na ordem pedida. Tabelas que falham ou estouram o
+        prazo vêm vazias e são relatadas juntas num único st.error.
+        """
+        missing = [table for table in tables if self.cache.get(table) is None]
+        errors = {}
+        if len(missing) > 1:
+            _, errors = self.fetch_parallel(
+                {table: (lambda table=table: self._get_reference_table(table)) for table in missing}, timeout)
+        loaded = {}
+        for table in tables:
+            if table in errors:
+                continue
+            try:
+                loaded[table] = self._get_reference_table(table)
+            except Exception as e:
+                errors[table] = e
+        self.report_fetch_errors(errors)
+        return [loaded.get(table, []) for table in tables]
+    
+    @staticmethod
+    def report_fetch_errors(errors):
+        """Um único st.error com todas as falhas (nome -> exceção) de uma leitura em paralelo"""
+        if errors:
+            st.error("Erro ao carregar " + "; ".join(f"{DATA_LABELS.get(name, name)}: {e}"
+                                                      for name, e in errors.items()))
+    
     def get_all_clients(self):
         try:
-            result = self.supabase.table('clients').select('*').execute()
-            return result.data
+            return self._get_reference_table('clients')
         except Exception as e:
             st.error(f"Erro ao buscar clientes: {e}")
             return []
     
     def get_all_services(self):
         try:
-            result = self.supabase.table('services').select('*').execute()
-            return result.data
+            return self._get_reference_table('services')
         except Exception as e:
             st.error(f"Erro ao buscar serviços: {e}")
             return []
     
     def get_all_technicians(self):
         try:
-            result = self.supabase.table('technicians').select('*').execute()
-            return result.data
+            return self._get_reference_table('technicians')
         except Exception as e:
             st.error(f"Erro ao buscar técnicos: {e}")
             return []
     
     def get_all_equipment(self):
         try:
-            result = self.supabase.table('equipment').select('*').execute()
-            return result.data
+            return self._get_reference_table('equipment')
         except Exception as e:
             st.error(f"Erro ao buscar equipamentos: {e}")
             return []
     
-    def get_all_orders(self):
+    def get_all_orders(self, columns='*'):
+        """Todas as ordens. Sem seleção específica vêm da cópia local
+        sincronizada por delta (OrderStore); com `columns`, direto do banco."""
         try:
-            result = self.supabase.table('service_orders').select('*').execute()
-            return result.data
+            if columns == '*':
+                # Com o feed ao vivo, as mudanças chegam por push e o delta é dispensado
+                self.orders.sync(self.storage, delta=not self.changes.live, workers=self.fetch_workers)
+                return self.orders.all()
+            return [row for page in self.iter_orders(columns=columns) for row in page]
         except Exception as e:
             st.error(f"Erro ao buscar ordens: {e}")
             return []
+    
+    def get_orders_between(self, date_from, date_to, columns=ORDER_LIST_SELECT):
+        """Todas as ordens agendadas no período (datas inclusivas), em ordem de id.
+        
+        Paginadas por id como em _load_table: uma única seleção seria truncada
+        pelo limite de linhas do servidor em meses movimentados."""
+        try:
+            filters = [('scheduled_date', 'gte', str(date_from)), ('scheduled_date', 'lte', str(date_to))]
+            return [row for page in self.iter_orders(columns=columns, filters=filters) for row in page]
+        except Exception as e:
+            st.error(f"Erro ao buscar ordens: {e}")
+            return []
+    
+    def iter_orders(self, chunk_size=ORDER_CHUNK_SIZE, columns='*', filters=(), concurrent=None):
+        """Ordens em páginas (listas de até `chunk_size` linhas), paginadas por id.
+        
+        Para leituras em lote que não cabem numa resposta do servidor ou que
+        não devem ficar inteiras em memória (exportação, carga da cópia local).
+        `concurrent` busca páginas em paralelo; por padrão só no Supabase.
+        """
+        workers = self.fetch_workers if concurrent is None else (ORDER_FETCH_WORKERS if concurrent else 1)
+        return iter_rows(self.storage, 'service_orders', columns, filters, chunk_size, workers)
+    
+    def get_order(self, order_id):
+        """Uma OS com cliente, serviço e técnico embutidos (uma única requisição),
+        guardada num cache LRU por id. Retorna None se a OS não existir."""
+        order = self.order_details.get(order_id)
+        if order is not None:
+            return order
+        try:
+            rows, _ = self.storage.select('service_orders', ORDER_DETAIL_SELECT, filters=[('id', 'eq', order_id)])
+        except Exception as e:
+            st.error(f"Erro ao buscar OS: {e}")
+            return None
+        if not rows:
+            return None
+        self.order_details.set(order_id, rows[0])
+        return rows[0]
             
     def delete_order(self, order_id):
         try:
-            result = self.supabase.table('service_orders').delete().eq('id', order_id).execute()
+            rows = self.storage.delete('service_orders', [('id', 'eq', order_id)])
+            self.order_details.invalidate(order_id)
+            self._publish('service_orders', 'DELETE', rows)
             # Retorna True se deletou ao menos uma linha
-            return bool(result.data)
+            return bool(rows)
         except Exception as e:
             st.error(f"Erro ao excluir OS: {e}")
             return False
         
+    def query_orders(self, status=None, priority=None, service_type=None, region=None,
+                     date_from=None, date_to=None, text=None, limit=None, offset=0,
+                     columns=ORDER_LIST_SELECT, ascending=False):
+        """Busca ordens com os filtros aplicados no backend de dados.
+        
+        Tipo de serviço e região são resolvidos para ids pelas tabelas de
+        referência em cache. A busca textual (número da OS, nome, CTO,
+        endereço e telefone do cliente, sem acentos) roda no Supabase sobre
+        a view ORDER_SEARCH_VIEW; localmente, ou sem a view, os clientes vêm
+        do índice de busca em memória (no Supabase, limitados e com aviso).
+        `columns` é a seleção
+        PostgREST (por padrão com cliente, serviço e técnico embutidos);
+        a ordenação é por data agendada, decrescente salvo `ascending=True`.
+        Retorna (ordens, total), onde total é a contagem de linhas que
+        atendem aos filtros.
+        """
+        try:
+            filters = []
+            if status:
+                filters.append(('status', 'eq', status))
+            if priority:
+                filters.append(('priority', 'eq', priority))
+            if service_type:
+                service_ids = [s['id'] for s in self.get_all_services() if s.get('type') == service_type]
+                if not service_ids:
+                    return [], 0
+                filters.append(('service_id', 'in', service_ids))
+            if region:
+                technician_ids = [t['id'] for t in self.get_all_technicians() if t.get('region') == region]
+                if not technician_ids:
+                    return [], 0
+                filters.append(('technician_id', 'in', technician_ids))
+            if date_from:
+                filters.append(('scheduled_date', 'gte', str(date_from)))
+            if date_to:
+                filters.append(('scheduled_date', 'lte', str(date_to)))
+            order = [('scheduled_date', not ascending), ('id', not ascending)]
+            if text and text.strip():
+                # No Supabase a busca vai para a view; localmente o filtro in. não tem limite de URL
+                remote = self.storage.name == 'supabase'
+                if remote and self.cache.get('search_view_available') is not False:
+                    try:
+                        search_filters = filters + self._search_text_filters(text)
+                        return self._select_orders(ORDER_SEARCH_VIEW, columns, search_filters, order, limit, offset)
+                    except Exception:
+                        # View não instalada: evita tentar de novo a cada renderização
+                        self.cache.set('search_view_available', False)
+                filters.append(self._text_search_filter(text.strip(), MAX_TEXT_SEARCH_CLIENTS if remote else None))
+            return self._select_orders('service_orders', columns, filters, order, limit, offset)
+        except Exception as e:
+            st.error(f"Erro ao buscar ordens: {e}")
+            return [], 0
+    
+    def _select_orders(self, table, columns, filters, order, limit, offset):
+        rows, total = self.storage.select(table, columns, filters=filters, order=order,
+                                          limit=limit or None, offset=offset, count=True)
+        return rows, total if total is not None else len(rows)
+    
+    @staticmethod
+    def _search_text_filters(text):
+        """Um filtro por termo sobre search_text (todos precisam aparecer), já sem acentos"""
+        terms = tokenize(text) or [normalize(text).strip().replace('%', '_')]
+        return [('search_text', 'ilike', f"%{term}%") for term in terms]
+    
+    def _text_search_filter(self, text, max_clients=None):
+        """Filtro OR: número da OS contendo o texto ou um dos clientes encontrados
+        pelo índice de busca (nome, CTO, endereço, telefone).
+        
+        Com `max_clients`, só os mais bem ranqueados entram no filtro, com um
+        aviso na tela quando a busca fica restrita a eles."""
+        pattern = text.replace('%', '_')
+        matches = self.get_client_search_index().search(text)
+        if max_clients is not None and len(matches) > max_clients:
+            st.warning(f"⚠️ {len(matches)} clientes correspondem à busca; mostrando só as OS dos "
+                       f"{max_clients} mais relevantes. Instale a view {ORDER_SEARCH_VIEW} "
+                       "(Schema Completo) para buscar em todos.")
+            matches = matches[:max_clients]
+        client_ids = [client_id for client_id, _ in matches]
+        conditions = [('order_number', 'ilike', f"%{pattern}%")]
+        if client_ids:
+            conditions.append(('client_id', 'in', client_ids))
+        return ('', 'or', conditions)
+    
+    def get_client_search_index(self):
+        """Índice de busca dos clientes, refeito só quando nome, CTO, endereço ou telefone mudam"""
+        clients = self.cache.get_or_load('clients', lambda: self._load_table('clients'))
+        cached = self.cache.get('client_search_index')
+        if cached is None or cached[0] is not clients:
+            fingerprint = client_fingerprint(clients)
+            if cached is None or cached[1] != fingerprint:
+                cached = (clients, fingerprint, ClientSearchIndex(clients))
+            else:
+                cached = (clients,) + cached[1:]
+            self.cache.set('client_search_index', cached, ttl=SEARCH_INDEX_TTL)
+        return cached[2]
+    
+    def find_order_by_number(self, order_number):
+        """OS pelo número exato (mapa número -> id da cópia local), ou None"""
+        try:
+            self.orders.sync(self.storage, delta=not self.changes.live, workers=self.fetch_workers)
+            return self.orders.get_by_number(order_number.strip().upper())
+        except Exception as e:
+            st.error(f"Erro ao buscar OS: {e}")
+            return None
+    
+    def search_orders(self, text, limit=20):
+        """OS ranqueadas por número, cliente, CTO, endereço ou telefone, sem diferenciar
+        acentos e maiúsculas."""
+        if not text or not text.strip():
+            return []
+        try:
+            self.orders.sync(self.storage, delta=not self.changes.live, workers=self.fetch_workers)
+            index = self.get_order_search_index(self.get_client_search_index())
+            return [order for order in (self.orders.get(order_id) for order_id, _ in index.search(text, limit))
+                    if order]
+        except Exception as e:
+            st.error(f"Erro ao buscar ordens: {e}")
+            return []
+    
+    def get_order_search_index(self, client_index):
+        """Índice de busca das OS sobre a cópia local.
+        
+        Só a primeira busca do processo espera a construção. Depois, as OS
+        alteradas entram no índice existente como delta; após carga completa,
+        mudança nos clientes ou delta grande demais, o índice é refeito em
+        segundo plano e o anterior continua servindo até a troca.
+        """
+        cached = self.cache.get('order_search_index')
+        if cached is None:
+            version = self.orders.version
+            cached = (version, OrderSearchIndex(self.orders.all(), client_index))
+            self.cache.set('order_search_index', cached, ttl=SEARCH_INDEX_TTL)
+            return cached[1]
+        built_version, index = cached
+        version, changed = self.orders.changes_since(built_version)
+        if changed:
+            orders = [(order_id, self.orders.get(order_id)) for order_id in changed]
+            index = index.updated([order for _, order in orders if order],
+                                  [order_id for order_id, order in orders if order is None])
+            self.cache.set('order_search_index', (version, index), ttl=SEARCH_INDEX_TTL)
+        if changed is None or index.client_index is not client_index or index.pending > ORDER_SEARCH_MAX_PENDING:
+            self._rebuild_order_search_index(client_index)
+        return index
+    
+    def _rebuild_order_search_index(self, client_index):
+        """Refaz o índice de busca das OS numa thread daemon, se nenhuma outra já estiver refazendo"""
+        if not _order_search_build.acquire(blocking=False):
+            return
+        
+        def build():
+            try:
+                # Versão lida antes das linhas: mudanças no meio do caminho voltam no próximo delta
+                version = self.orders.version
+                index = OrderSearchIndex(self.orders.all(), client_index)
+                self.cache.set('order_search_index', (version, index), ttl=SEARCH_INDEX_TTL)
+            finally:
+                _order_search_build.release()
+        
+        threading.Thread(target=build, name="order-search-index", daemon=True).start()
+    
+    def get_dispatch_engine(self):
+        """Motor de despacho (dispatch.DispatchEngine) sobre a cópia local das ordens.
+        Refeito quando ordens, serviços ou técnicos mudam ou o dia vira; None em erro."""
+        try:
+            self.orders.sync(self.storage, delta=not self.changes.live, workers=self.fetch_workers)
+            services = self.cache.get_or_load('services', lambda: self._load_table('services'))
+            technicians = self.cache.get_or_load('technicians', lambda: self._load_table('technicians'))
+            key = (self.orders.version, date.today())
+            cached = self.cache.get('dispatch_engine')
+            if cached is None or cached[0] != key or cached[1] is not services or cached[2] is not technicians:
+                cached = (key, services, technicians, DispatchEngine(self.orders.all(), services, technicians))
+                self.cache.set('dispatch_engine', cached, ttl=SEARCH_INDEX_TTL)
+            return cached[3]
+        except Exception as e:
+            st.error(f"Erro ao montar sugestão de técnicos: {e}")
+            return None
+    
+    def find_schedule_conflicts(self, technician_id, scheduled_date, scheduled_time, service_id,
+                                exclude_order_id=None):
+        """OS do técnico que se sobrepõem ao horário pedido, pela duração dos serviços.
+        Só a agenda de hoje em diante é considerada; [] se o horário está livre."""
+        engine = self.get_dispatch_engine()
+        if engine is None:
+            return []
+        order_ids = engine.conflicts(technician_id, scheduled_date, scheduled_time, service_id, exclude_order_id)
+        return [order for order in (self.orders.get(order_id) for order_id in order_ids) if order]
+    
+    def find_batch_conflicts(self, orders, keep_conflicting=False):
+        """Conflitos de agenda de um lote de novas OS (ver DispatchEngine.batch_conflicts)"""
+        engine = self.get_dispatch_engine()
+        if engine is None:
+            return [([], []) for _ in orders]
+        return engine.batch_conflicts(orders, keep_conflicting)
+    
+    def next_free_slot(self, technician_id, scheduled_date, service_id, not_before=None):
+        """Próximo horário (datetime) em que o técnico comporta o serviço, ou None"""
+        engine = self.get_dispatch_engine()
+        return engine.next_free(technician_id, scheduled_date, service_id, not_before) if engine else None
+    
+    def plan_day_routes(self, day, workers=None):
+        """Rota otimizada do dia de cada técnico (routing.plan_routes), com order_number.
+        
+        As coordenadas vêm do cadastro de clientes em cache; OS canceladas ficam
+        de fora. Rotas de técnicos cujas paradas não mudaram são reaproveitadas
+        do cache do dia. DataFrame vazio se não houver OS ou em erro.
+        """
+        try:
+            orders = self.get_orders_between(day, day, columns=ORDER_ROUTE_SELECT)
+            orders = [o for o in orders if o.get('technician_id') and o.get('status') not in FREE_STATUSES]
+            if not orders:
+                return pd.DataFrame()
+            clients = {c['id']: c for c in self.cache.get_or_load('clients', lambda: self._load_table('clients'))}
+            services = {s['id']: s for s in self.cache.get_or_load('services', lambda: self._load_table('services'))}
+            stops = pd.DataFrame({
+                'order_id': [o['id'] for o in orders],
+                'technician_id': [o['technician_id'] for o in orders],
+                'latitude': [clients.get(o['client_id'], {}).get('latitude') for o in orders],
+                'longitude': [clients.get(o['client_id'], {}).get('longitude') for o in orders],
+                'priority': [o.get('priority') for o in orders],
+                'duration_hours': pd.to_numeric(pd.Series(
+                    [services.get(o['service_id'], {}).get('duration') for o in orders]), errors='coerce'),
+                'scheduled_time': [o.get('scheduled_time') for o in orders],
+            })
+            cache_key = f"routes:{day}"
+            day_cache = self.cache.get(cache_key) or {}
+            routes = plan_routes(stops, workers=workers, cache=day_cache)
+            self.cache.set(cache_key, day_cache, ttl=SEARCH_INDEX_TTL)
+            numbers = {o['id']: o['order_number'] for o in orders}
+            routes.insert(0, 'order_number', routes['order_id'].map(numbers))
+            return routes
+        except Exception as e:
+            st.error(f"Erro ao planejar rotas: {e}")
+            return pd.DataFrame()
+    
+    def refresh_calendar_feeds(self):
+        """Feeds ICS (fiber_calendar.CalendarFeeds) em dia com as ordens.
+        Sem mudança nas ordens, referências ou no dia nada é refeito; None em erro."""
+        try:
+            self.orders.sync(self.storage, delta=not self.changes.live, workers=self.fetch_workers)
+            clients = self.cache.get_or_load('clients', lambda: self._load_table('clients'))
+            services = self.cache.get_or_load('services', lambda: self._load_table('services'))
+            technicians = self.cache.get_or_load('technicians', lambda: self._load_table('technicians'))
+            feeds = self.calendar_feeds
+            key = (self.orders.version, date.today())
+            if (feeds.source is None or feeds.source[0] != key
+                    or any(old is not new for old, new in zip(feeds.source[1:], (clients, services, technicians)))):
+                feeds.refresh(self.orders.all(), clients, services, technicians)
+                feeds.source = (key, clients, services, technicians)
+            return feeds
+        except Exception as e:
+            st.error(f"Erro ao montar feeds de calendário: {e}")
+            return None
+    
+    def get_kpi_frames(self, date_from=None, date_to=None, with_technicians=True):
+        """Frames de fatos para os KPIs de dashboard e relatórios.
+        
+        Lê os agregados mantidos no servidor (order_rollup_daily e
+        technician_rollup_daily, ou order_rollup_totals sem período) quando
+        estão instalados; senão calcula a partir de todas as ordens.
+        Retorna (frame_ordens, frame_tecnicos); o segundo é None quando
+        `with_technicians=False`. Chamadas repetidas no mesmo rerun reaproveitam
+        o resultado (os frames não devem ser alterados por quem os recebe).
+        """
+        key = (date_from, date_to, with_technicians)
+        if key not in self._kpi_frames:
+            self._kpi_frames[key] = self._load_kpi_frames(date_from, date_to, with_technicians)
+        return self._kpi_frames[key]
+    
+    def _load_kpi_frames(self, date_from, date_to, with_technicians):
+        if self.cache.get('rollups_available') is not False:
+            try:
+                if date_from is None and date_to is None:
+                    calls = {'orders': lambda: self._select_all('order_rollup_totals',
+                                                                order=['status', 'service_type', 'region'])}
+                else:
+                    calls = {'orders': lambda: self._select_all('order_rollup_daily', date_from=date_from,
+                                                                date_to=date_to,
+                                                                order=['day', 'status', 'service_type', 'region'])}
+                if with_technicians:
+                    # Rollup de técnicos e cadastro de técnicos vão junto com o de ordens
+                    calls['technician_rows'] = lambda: self._select_all(
+                        'technician_rollup_daily', date_from=date_from, date_to=date_to,
+                        order=['day', 'technician_id'])
+                    calls['technicians'] = self.get_all_technicians
+                results, errors = self.fetch_parallel(calls)
+                if errors.keys() - {'technicians'}:
+                    raise next(error for name, error in errors.items() if name != 'technicians')
+                self.report_fetch_errors(errors)
+                technician_frame = None
+                if with_technicians:
+                    technician_frame = metrics.build_technician_rollup_frame(results['technician_rows'],
+                                                                             results.get('technicians', []))
+                return metrics.build_rollup_frame(results['orders']), technician_frame
+            except Exception:
+                # Rollups não instalados: evita tentar de novo a cada renderização
+                self.cache.set('rollups_available', False)
+        
+        results, errors = self.fetch_parallel({'orders': self.get_all_orders, 'services': self.get_all_services,
+                                               'technicians': self.get_all_technicians})
+        self.report_fetch_errors(errors)
+        frame = metrics.build_orders_frame(results.get('orders', []), results.get('services', []),
+                                           results.get('technicians', []))
+        frame = metrics.filter_period(frame, date_from, date_to)
+        return frame, frame if with_technicians else None
+    
+    def _select_all(self, table, columns='*', date_from=None, date_to=None, date_column='day', order=()):
+        """Lê todas as linhas em páginas, já que o PostgREST limita o tamanho de cada resposta"""
+        filters = []
+        if date_from:
+            filters.append((date_column, 'gte', str(date_from)))
+        if date_to:
+            filters.append((date_column, 'lte', str(date_to)))
+        rows = []
+        start = 0
+        while True:
+            page, _ = self.storage.select(table, columns, filters=filters, order=order,
+                                          limit=ROLLUP_PAGE_SIZE, offset=start)
+            rows.extend(page)
+            if len(page) < ROLLUP_PAGE_SIZE:
+                return rows
+            start += ROLLUP_PAGE_SIZE
+    
     def get_orders_dataframe(self):
-        orders = self.get_all_orders()
+        # Ordens da cópia local + tabelas de referência em cache: só o delta vai à rede
+        return self.build_orders_dataframe(self.get_all_orders())
+    
+    def build_orders_dataframe(self, orders):
+        """Frame tipado de OS para as páginas: categorias para status, prioridade,
+        serviço, tipo, técnico, região, CTO e plano; datetime64 em Data e Hora
+        (data + horário agendados); float em Valor e Sinal (dBm). A formatação
+        fica para a exibição (ORDER_COLUMN_CONFIG)."""
         if not orders:
             return pd.DataFrame()
         
-        clients = {c['id']: c for c in self.get_all_clients()}
-        services = {s['id']: s for s in self.get_all_services()}
-        technicians = {t['id']: t for t in self.get_all_technicians()}
+        frame = pd.DataFrame.from_records(orders, columns=ORDER_FRAME_SOURCE_COLUMNS)
+        # Linhas com relações embutidas dispensam as tabelas de referência
+        embedded = "clients" in orders[0]
+        related = {}
+        for relation, (key, fields, load) in {
+            "clients": ("client_id", ["name", "cto", "plan"], self.get_all_clients),
+            "services": ("service_id", ["name", "type"], self.get_all_services),
+            "technicians": ("technician_id", ["name", "region"], self.get_all_technicians),
+        }.items():
+            if embedded:
+                related[relation] = pd.DataFrame.from_records([order.get(relation) or {} for order in orders],
+                                                              columns=fields)
+            else:
+                table = pd.DataFrame.from_records(load(), columns=["id"] + fields).drop_duplicates("id")
+                table = table.set_index("id")
+                related[relation] = pd.DataFrame({field: frame[key].map(table[field]) for field in fields})
+        clients, services, technicians = related["clients"], related["services"], related["technicians"]
         
-        orders_list = []
-        for order in orders:
-            client = clients.get(order["client_id"], {})
-            service = services.get(order["service_id"], {})
-            technician = technicians.get(order["technician_id"], {})
-            orders_list.append({
-                "ID": order["id"],
-                "OS": order["order_number"],
-                "Cliente": client.get("name", "N/A"),
-                "Serviço": service.get("name", "N/A"),
-                "Tipo": service.get("type", "N/A"),
-                "Técnico": technician.get("name", "N/A"),
-                "Região": technician.get("region", "N/A"),
-                "Data": order["scheduled_date"],
-                "Hora": order["scheduled_time"],
-                "Status": order["status"],
-                "Prioridade": order["priority"],
-                "CTO": client.get("cto", "N/A"),
-                "Plano": client.get("plan", "N/A"),
-                "Valor": f"R$ {order['estimated_cost']:.2f}",
-                "Sinal (dBm)": order.get("signal_level", "-")
-            })
-        return pd.DataFrame(orders_list)
+        scheduled_date = frame["scheduled_date"].astype("string").str.slice(0, 10)
+        # Horário "HH:MM" ou "HH:MM:SS": os minutos bastam
+        scheduled_time = frame["scheduled_time"].astype("string").str.slice(0, 5)
+        dates = pd.to_datetime(scheduled_date, format="%Y-%m-%d", errors="coerce")
+        times = pd.to_datetime(scheduled_date + " " + scheduled_time, format="%Y-%m-%d %H:%M", errors="coerce")
+        return pd.DataFrame({
+            "ID": frame["id"].astype("int64"),
+            "OS": frame["order_number"].astype("string"),
+            "Cliente": clients["name"].fillna("N/A").astype("string"),
+            "Serviço": _category(services["name"]),
+            "Tipo": _category(services["type"]),
+            "Técnico": _category(technicians["name"]),
+            "Região": _category(technicians["region"]),
+            "Data": dates,
+            "Hora": times,
+            "Status": _category(frame["status"], metrics.STATUS_CATEGORIES),
+            "Prioridade": _category(frame["priority"], metrics.PRIORITY_CATEGORIES),
+            "CTO": _category(clients["cto"]),
+            "Plano": _category(clients["plan"]),
+            "Valor": pd.to_numeric(frame["estimated_cost"], errors="coerce").astype("float64"),
+            "Sinal (dBm)": pd.to_numeric(frame["signal_level"], errors="coerce").astype("float64"),
+        })
     
     def add_client(self, client_data):
         try:
-            result = self.supabase.table('clients').insert(client_data).execute()
-            return result.data
+            rows = self.storage.insert('clients', [client_data])
+            self._publish('clients', 'INSERT', rows)
+            return rows
         except Exception as e:
             st.error(f"Erro ao adicionar cliente: {e}")
             return None
     
     def add_service(self, service_data):
         try:
-            result = self.supabase.table('services').insert(service_data).execute()
-            return result.data
+            rows = self.storage.insert('services', [service_data])
+            self._publish('services', 'INSERT', rows)
+            return rows
         except Exception as e:
             st.error(f"Erro ao adicionar serviço: {e}")
             return None
     
     def add_technician(self, technician_data):
         try:
-            result = self.supabase.table('technicians').insert(technician_data).execute()
-            return result.data
+            rows = self.storage.insert('technicians', [technician_data])
+            self._publish('technicians', 'INSERT', rows)
+            return rows
         except Exception as e:
             st.error(f"Erro ao adicionar técnico: {e}")
             return None
     
     def add_equipment(self, equipment_data):
         try:
-            result = self.supabase.table('equipment').insert(equipment_data).execute()
-            return result.data
+            rows = self.storage.insert('equipment', [equipment_data])
+            self._publish('equipment', 'INSERT', rows)
+            return rows
         except Exception as e:
             st.error(f"Erro ao adicionar equipamento: {e}")
             return None
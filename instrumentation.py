@@ -0,0 +1,201 @@
+import contextvars
+import json
+import threading
+import time
+from collections import Counter, deque
+
+# Linhas serializadas para estimar o tamanho do payload de cada chamada
+PAYLOAD_SAMPLE_ROWS = 50
+
+# Reruns guardados para exportação (os mais antigos são descartados)
+RECENT_RERUNS = 200
+
+_current_rerun = contextvars.ContextVar("current_rerun", default=None)
+
+
+def estimate_payload_bytes(rows):
+    """Tamanho aproximado em JSON, extrapolado de uma amostra das linhas"""
+    if not rows:
+        return 0
+    sample = rows[:PAYLOAD_SAMPLE_ROWS]
+    size = len(json.dumps(sample, default=str, ensure_ascii=False).encode("utf-8"))
+    return int(size * len(rows) / len(sample))
+
+
+class RerunMetrics:
+    """Chamadas ao backend e tempo de renderização de uma execução do script"""
+
+    def __init__(self, page=None):
+        self.page = page
+        self.started_at = time.time()
+        self.render_seconds = None
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def add_call(self, call):
+        with self._lock:
+            self.calls.append(call)
+
+    def duplicates(self):
+        """Consultas idênticas repetidas no mesmo rerun: {(tabela, assinatura): vezes}"""
+        counts = Counter((call["table"], call["signature"]) for call in self.calls if call["operation"] == "select")
+        return {key: count for key, count in counts.items() if count > 1}
+
+    def summary(self):
+        duplicates = self.duplicates()
+        by_table = {}
+        for call in self.calls:
+            entry = by_table.setdefault(f"{call['operation']}:{call['table']}",
+                                        {"calls": 0, "seconds": 0.0, "rows": 0, "bytes": 0})
+            entry["calls"] += 1
+            entry["seconds"] += call["seconds"]
+            entry["rows"] += call["rows"]
+            entry["bytes"] += call["bytes"]
+        return {
+            "page": self.page,
+            "started_at": self.started_at,
+            "render_seconds": self.render_seconds,
+            "backend_calls": len(self.calls),
+            "backend_seconds": sum(call["seconds"] for call in self.calls),
+            "duplicate_fetches": sum(count - 1 for count in duplicates.values()),
+            "duplicates_by_table": {f"select:{table}": count - 1 for (table, _), count in duplicates.items()},
+            "by_table": by_table,
+        }
+
+
+class MetricsRecorder:
+    """Coleta métricas por rerun e totais do processo (exportáveis para o Prometheus).
+
+    O rerun corrente fica num ContextVar: cada sessão do Streamlit roda o script
+    na sua própria thread, então chamadas de sessões diferentes não se misturam.
+    """
+
+    def __init__(self, recent=RECENT_RERUNS, log_path=None):
+        self.recent = deque(maxlen=recent)
+        # Se definido, cada rerun é anexado a este arquivo como uma linha JSON
+        self.log_path = log_path
+        self.call_totals = Counter()
+        self.call_seconds = Counter()
+        self.call_rows = Counter()
+        self.call_bytes = Counter()
+        self.duplicate_totals = Counter()
+        self.page_renders = Counter()
+        self.page_seconds = Counter()
+        self._lock = threading.Lock()
+
+    def start_rerun(self, page=None):
+        rerun = RerunMetrics(page)
+        _current_rerun.set(rerun)
+        return rerun
+
+    def current(self):
+        return _current_rerun.get()
+
+    def record_call(self, operation, table, seconds, rows, payload_bytes, signature):
+        key = (operation, table)
+        with self._lock:
+            self.call_totals[key] += 1
+            self.call_seconds[key] += seconds
+            self.call_rows[key] += rows
+            self.call_bytes[key] += payload_bytes
+        rerun = self.current()
+        if rerun is not None:
+            rerun.add_call({"operation": operation, "table": table, "seconds": seconds, "rows": rows,
+                            "bytes": payload_bytes, "signature": signature})
+
+    def finish_rerun(self, render_seconds):
+        """Fecha o rerun corrente, acumula os totais e devolve o resumo"""
+        rerun = self.current()
+        if rerun is None:
+            return None
+        rerun.render_seconds = render_seconds
+        summary = rerun.summary()
+        with self._lock:
+            self.page_renders[rerun.page] += 1
+            self.page_seconds[rerun.page] += render_seconds
+            for (table, _), count in rerun.duplicates().items():
+                self.duplicate_totals[table] += count - 1
+            self.recent.append(summary)
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        _current_rerun.set(None)
+        return summary
+
+    def to_json_lines(self):
+        with self._lock:
+            return "".join(json.dumps(summary, ensure_ascii=False) + "\n" for summary in self.recent)
+
+    def to_prometheus(self):
+        """Totais do processo no formato texto de exposição do Prometheus"""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        with self._lock:
+            family("fiber_os_backend_calls_total", "counter", "Chamadas ao backend de dados",
+                   [({"operation": op, "table": table}, count) for (op, table), count in self.call_totals.items()])
+            family("fiber_os_backend_seconds_total", "counter", "Tempo gasto em chamadas ao backend",
+                   [({"operation": op, "table": table}, f"{seconds:.6f}")
+                    for (op, table), seconds in self.call_seconds.items()])
+            family("fiber_os_backend_rows_total", "counter", "Linhas devolvidas pelo backend",
+                   [({"operation": op, "table": table}, rows) for (op, table), rows in self.call_rows.items()])
+            family("fiber_os_backend_payload_bytes_total", "counter", "Tamanho estimado dos payloads (JSON)",
+                   [({"operation": op, "table": table}, size) for (op, table), size in self.call_bytes.items()])
+            family("fiber_os_duplicate_fetches_total", "counter", "Consultas repetidas dentro de um mesmo rerun",
+                   [({"table": table}, count) for table, count in self.duplicate_totals.items()])
+            family("fiber_os_page_renders_total", "counter", "Renderizações por página",
+                   [({"page": page}, count) for page, count in self.page_renders.items()])
+            family("fiber_os_page_render_seconds_total", "counter", "Tempo de renderização por página",
+                   [({"page": page}, f"{seconds:.6f}") for page, seconds in self.page_seconds.items()])
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class InstrumentedStorage:
+    """Envolve um StorageBackend medindo tempo, linhas e payload de cada chamada"""
+
+    def __init__(self, storage, recorder):
+        self.storage = storage
+        self.recorder = recorder
+
+    @property
+    def name(self):
+        return self.storage.name
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def _call(self, operation, table, signature, *args, **kwargs):
+        started = time.perf_counter()
+        result = getattr(self.storage, operation)(table, *args, **kwargs)
+        seconds = time.perf_counter() - started
+        rows = result[0] if operation == "select" else result
+        rows = rows or []
+        self.recorder.record_call(operation, table, seconds, len(rows), estimate_payload_bytes(rows), signature)
+        return result
+
+    def select(self, table, columns="*", filters=(), order=(), limit=None, offset=0, count=False):
+        signature = repr((columns, list(filters), list(order), limit, offset, count))
+        return self._call("select", table, signature, columns, filters=filters, order=order, limit=limit,
+                          offset=offset, count=count)
+
+    def insert(self, table, rows):
+        return self._call("insert", table, None, rows)
+
+    def update(self, table, values, filters):
+        return self._call("update", table, None, values, filters)
+
+    def delete(self, table, filters):
+        return self._call("delete", table, None, filters)
+
+    def upsert(self, table, rows):
+        return self._call("upsert", table, None, rows)
@@ -1,5 +1,48 @@
 import streamlit as st
-import pandas as pd
+from fiber_service_manager import ORDER_COLUMN_CONFIG
+
+PAGE_SIZE_OPTIONS = [25, 50, 100, 200]
+
+STATUS_OPTIONS = ["Agendado", "Em Campo", "Aguardando Peças", "Concluído", "Cancelado"]
+
+def completion_form():
+    """Campos de conclusão da OS (sinal, satisfação, observações e equipamentos)"""
+    completion_data = {}
+    st.markdown("**📊 Dados de Conclusão:**")
+    col_a, col_b = st.columns(2)
+    with col_a:
+        completion_data["signal_level"] = st.text_input("📶 Nível de Sinal Final (dBm)", placeholder="Ex: -18.5")
+        completion_data["customer_satisfaction"] = st.select_slider("😊 Satisfação do Cliente",
+                                                                   options=[1, 2, 3, 4, 5],
+                                                                   value=5,
+                                                                   format_func=lambda x: f"{x} {'⭐' * x}")
+    with col_b:
+        completion_data["observations"] = st.text_area("📋 Observações Finais",
+                                                       height=80,
+                                                       placeholder="Observações sobre o atendimento...")
+        equipment_used_text = st.text_area("📦 Equipamentos Utilizados",
+                                           height=80,
+                                           placeholder="Ex: ONT Nokia, Cabo Drop 50m")
+        completion_data["equipment_used"] = equipment_used_text.split(',') if equipment_used_text else []
+    return completion_data
+
+def rows_by_id(df):
+    """Frame indexado pelo id da OS, para achar a linha selecionada sem varrer a tabela"""
+    return df.set_index(df["ID"].astype(int), drop=False)
+
+def order_labels(df):
+    """Rótulos "OS | Cliente | Status | Data" por id, montados de forma vetorizada"""
+    labels = (df["OS"] + " | " + df["Cliente"] + " | " + df["Status"].astype("string") + " | "
+              + df["Data"].dt.strftime("%d/%m/%Y").fillna("-"))
+    return dict(zip(df["ID"].astype(int).tolist(), labels))
+
+def detail_labels(df):
+    """Rótulos com ícones de status e prioridade por id"""
+    status_icon = df["Status"].astype("string").map({"Concluído": "🟢", "Em Campo": "🟡"}).fillna("⚪")
+    priority_icon = df["Prioridade"].astype("string").map({"Urgente": "🚨", "Alta": "🔴"}).fillna("🔵")
+    labels = (status_icon + " " + priority_icon + " " + df["OS"] + " - " + df["Cliente"]
+              + " (" + df["Tipo"].astype("string") + ")")
+    return dict(zip(df["ID"].astype(int).tolist(), labels))
 
 def show_manage_orders(manager):
     """Página para gerenciar ordens de fibra óptica"""
@@ -16,32 +59,35 @@ def show_manage_orders(manager):
     with col4:
         region_filter = st.selectbox("Região", ["Todas", "Centro", "Zona Sul", "Zona Norte", "Zona Oeste", "Zona Leste"])
 
-    # DataFrame das ordens
-    df = manager.get_orders_dataframe()
-
     # Busca rápida tipo autocomplete antes da exibição da tabela
-    search_term = st.text_input("🔍 Buscar OS, Cliente, CTO...", placeholder="Ex: João, OS123, CTO-001")
-    df_display = df.copy()
-    if search_term:
-        df_display = df_display[
-            df_display["OS"].str.contains(search_term, case=False, na=False) |
-            df_display["Cliente"].str.contains(search_term, case=False, na=False) |
-            df_display["CTO"].str.contains(search_term, case=False, na=False)
-        ]
-
-    # Aplicar filtros
-    if status_filter != "Todos":
-        df_display = df_display[df_display["Status"] == status_filter]
-    if priority_filter != "Todas":
-        df_display = df_display[df_display["Prioridade"] == priority_filter]
-    if service_type_filter != "Todos":
-        df_display = df_display[df_display["Tipo"] == service_type_filter]
-    if region_filter != "Todas":
-        df_display = df_display[df_display["Região"] == region_filter]
+    search_term = st.text_input("🔍 Buscar OS, Cliente, CTO, Endereço, Telefone...", placeholder="Ex: Joao, OS123, CTO-001")
+    page_size = st.selectbox("Itens por página", PAGE_SIZE_OPTIONS, index=1, key="manage_orders_page_size")
+
+    # Filtros e paginação são aplicados no servidor: só a página exibida é transferida
+    page = st.session_state.get("manage_orders_page", 1)
+    filters = {
+        "status": None if status_filter == "Todos" else status_filter,
+        "priority": None if priority_filter == "Todas" else priority_filter,
+        "service_type": None if service_type_filter == "Todos" else service_type_filter,
+        "region": None if region_filter == "Todas" else region_filter,
+        "text": search_term or None,
+    }
+    orders, total = manager.query_orders(**filters, limit=page_size, offset=(page - 1) * page_size)
+    total_pages = max(1, -(-total // page_size))
+    if page > total_pages:
+        page = total_pages
+        orders, total = manager.query_orders(**filters, limit=page_size, offset=(page - 1) * page_size)
+    st.session_state["manage_orders_page"] = page
+    df_display = manager.build_orders_dataframe(orders)
 
     # Exibir tabela SEM a coluna ID
     if not df_display.empty:
-        st.dataframe(df_display.drop(columns=["ID"]), use_container_width=True)
+        st.dataframe(df_display.drop(columns=["ID"]), column_config=ORDER_COLUMN_CONFIG, use_container_width=True)
+        col_page, col_total = st.columns([1, 3])
+        with col_page:
+            st.number_input("Página", min_value=1, max_value=total_pages, step=1, key="manage_orders_page")
+        with col_total:
+            st.caption(f"{total} OS encontradas · página {page} de {total_pages}")
     else:
         st.info("📝 Nenhuma OS encontrada com os filtros aplicados ou busca.")
 
@@ -54,83 +100,77 @@ def show_manage_orders(manager):
         if len(df_display) > 0:
             st.markdown("**🔍 Buscar OS para Atualizar:**")
             search_method = st.radio("Método de Busca:",
-                                    ["📋 Por Lista", "🔍 Por Pesquisa", "📱 Por Número"],
+                                    ["📋 Por Lista", "🔍 Por Pesquisa", "📱 Por Número", "☑️ Em Lote"],
                                     horizontal=True)
+            # As opções dos widgets são ids; o rótulo vem de um mapa id -> texto
             selected_order_id = None
-            selected_order_display = None
+            selected_row = None
 
             if search_method == "📋 Por Lista":
-                order_options = []
-                for _, row in df_display.iterrows():
-                    display_text = f"{row['OS']} | {row['Cliente']} | {row['Status']} | {row['Data']}"
-                    order_options.append(display_text)
-                if order_options:
-                    selected_order_display = st.selectbox("Selecionar OS:", order_options)
-                    selected_order_id = df_display[df_display["OS"] == selected_order_display.split(" | ")[0]]["ID"].iloc[0]
+                labels = order_labels(df_display)
+                selected_order_id = st.selectbox("Selecionar OS:", list(labels), format_func=labels.get)
+                selected_row = rows_by_id(df_display).loc[selected_order_id]
 
             elif search_method == "🔍 Por Pesquisa":
                 search_term2 = st.text_input("Digite nome do cliente ou OS:", placeholder="Ex: João Silva ou OS123")
-                filtered_df2 = df_display.copy()
-                if search_term2:
-                    filtered_df2 = filtered_df2[
-                        filtered_df2["Cliente"].str.contains(search_term2, case=False, na=False) |
-                        filtered_df2["OS"].str.contains(search_term2, case=False, na=False)
-                    ]
+                # Busca em todas as OS pelo índice (sem acentos), não só na página exibida
+                filtered_df2 = manager.build_orders_dataframe(manager.search_orders(search_term2)) if search_term2 else df_display
                 if not filtered_df2.empty:
-                    search_options = []
-                    for _, row in filtered_df2.iterrows():
-                        display_text = f"{row['OS']} | {row['Cliente']} | {row['Status']} | {row['Data']}"
-                        search_options.append(display_text)
-                    selected_order_display = st.selectbox("Resultados da Busca:", search_options)
-                    selected_order_id = filtered_df2[filtered_df2["OS"] == selected_order_display.split(" | ")[0]]["ID"].iloc[0]
+                    labels = order_labels(filtered_df2)
+                    selected_order_id = st.selectbox("Resultados da Busca:", list(labels), format_func=labels.get)
+                    selected_row = rows_by_id(filtered_df2).loc[selected_order_id]
                 elif search_term2:
                     st.warning("❌ Nenhuma OS encontrada com este termo")
 
             elif search_method == "📱 Por Número":
                 os_number = st.text_input("Número da OS:", placeholder="Ex: OS12345678")
                 if os_number:
-                    matching_rows = df_display[df_display["OS"] == os_number.upper()]
-                    if not matching_rows.empty:
-                        row = matching_rows.iloc[0]
-                        selected_order_display = f"{row['OS']} | {row['Cliente']} | {row['Status']} | {row['Data']}"
-                        selected_order_id = row["ID"]
-                        st.success(f"✅ OS encontrada: {row['Cliente']}")
+                    order = manager.find_order_by_number(os_number)
+                    if order:
+                        selected_row = manager.build_orders_dataframe([order]).iloc[0]
+                        selected_order_id = order["id"]
+                        st.success(f"✅ OS encontrada: {selected_row['Cliente']}")
                     else:
                         st.error("❌ OS não encontrada")
 
+            elif search_method == "☑️ Em Lote":
+                batch_labels = order_labels(df_display)
+                order_numbers = dict(zip(df_display["ID"].astype(int), df_display["OS"]))
+                select_all = st.checkbox(f"Selecionar todas as {len(batch_labels)} OS da página")
+                batch_ids = list(batch_labels) if select_all else st.multiselect(
+                    "Selecionar OS:", list(batch_labels), format_func=batch_labels.get)
+                if batch_ids:
+                    batch_status = st.selectbox("🔄 Novo Status:", STATUS_OPTIONS, key="batch_status")
+                    batch_completion = completion_form() if batch_status == "Concluído" else None
+                    if st.button(f"🔄 Atualizar {len(batch_ids)} OS", type="primary", use_container_width=True,
+                                 disabled=manager.offline):
+                        results = manager.bulk_update_status(batch_ids, batch_status, batch_completion)
+                        failed = [order_numbers[order_id] for order_id, ok in results.items() if not ok]
+                        updated = len(results) - len(failed)
+                        if updated:
+                            st.success(f"✅ {updated} OS atualizadas para: **{batch_status}**")
+                        if failed:
+                            st.error("❌ Não foi possível atualizar: " + ", ".join(failed))
+                        else:
+                            st.rerun()
+
             # Se uma OS foi selecionada, mostra opções de atualização e exclusão
-            if selected_order_id and selected_order_display:
+            if selected_order_id is not None and selected_row is not None:
                 st.markdown("---")
-                st.markdown(f"**📋 OS Selecionada:** `{selected_order_display.split(' | ')[0]}`")
-                st.markdown(f"**👤 Cliente:** {selected_order_display.split(' | ')[1]}")
-                st.markdown(f"**📊 Status Atual:** {selected_order_display.split(' | ')[2]}")
+                st.markdown(f"**📋 OS Selecionada:** `{selected_row['OS']}`")
+                st.markdown(f"**👤 Cliente:** {selected_row['Cliente']}")
+                st.markdown(f"**📊 Status Atual:** {selected_row['Status']}")
 
-                current_status = selected_order_display.split(' | ')[2]
-                status_options = ["Agendado", "Em Campo", "Aguardando Peças", "Concluído", "Cancelado"]
+                current_status = selected_row['Status']
+                status_options = STATUS_OPTIONS
                 new_status = st.selectbox("🔄 Novo Status:",
                                           status_options,
                                           index=status_options.index(current_status) if current_status in status_options else 0)
 
-                completion_data = {}
-                if new_status == "Concluído":
-                    st.markdown("**📊 Dados de Conclusão:**")
-                    col_a, col_b = st.columns(2)
-                    with col_a:
-                        completion_data["signal_level"] = st.text_input("📶 Nível de Sinal Final (dBm)", placeholder="Ex: -18.5")
-                        completion_data["customer_satisfaction"] = st.select_slider("😊 Satisfação do Cliente",
-                                                                                   options=[1, 2, 3, 4, 5],
-                                                                                   value=5,
-                                                                                   format_func=lambda x: f"{x} {'⭐' * x}")
-                    with col_b:
-                        completion_data["observations"] = st.text_area("📋 Observações Finais",
-                                                                       height=80,
-                                                                       placeholder="Observações sobre o atendimento...")
-                        equipment_used_text = st.text_area("📦 Equipamentos Utilizados",
-                                                           height=80,
-                                                           placeholder="Ex: ONT Nokia, Cabo Drop 50m")
-                        completion_data["equipment_used"] = equipment_used_text.split(',') if equipment_used_text else []
-
-                if st.button("🔄 Atualizar Status", type="primary", use_container_width=True):
+                completion_data = completion_form() if new_status == "Concluído" else {}
+
+                if st.button("🔄 Atualizar Status", type="primary", use_container_width=True,
+                             disabled=manager.offline):
                     result = manager.update_order_status(selected_order_id, new_status,
                                                          completion_data if new_status == "Concluído" else None)
                     if result:
@@ -143,8 +183,10 @@ def show_manage_orders(manager):
 
                 # Botão para excluir OS com confirmação extra
                 st.markdown("---")
-                confirm_delete = st.checkbox("Confirmo que desejo excluir esta OS permanentemente.", value=False)
-                if st.button("🗑️ Excluir OS Selecionada", type="secondary", use_container_width=True):
+                confirm_delete = st.checkbox("Confirmo que desejo excluir esta OS permanentemente.", value=False,
+                                             disabled=manager.offline)
+                if st.button("🗑️ Excluir OS Selecionada", type="secondary", use_container_width=True,
+                             disabled=manager.offline):
                     if confirm_delete:
                         result = manager.delete_order(selected_order_id)
                         if result:
@@ -163,57 +205,38 @@ def show_manage_orders(manager):
                                         horizontal=True,
                                         key="detail_search")
         detail_order_id = None
-        detail_display = None
 
         if detail_search_method == "📋 Lista Completa":
-            detail_options = []
-            for _, row in df_display.iterrows():
-                status_icon = "🟢" if row['Status'] == "Concluído" else "🟡" if row['Status'] == "Em Campo" else "⚪"
-                priority_icon = "🚨" if row['Prioridade'] == "Urgente" else "🔴" if row['Prioridade'] == "Alta" else "🔵"
-                display_text = f"{status_icon} {priority_icon} {row['OS']} - {row['Cliente']} ({row['Tipo']})"
-                detail_options.append(display_text)
-            if detail_options:
-                detail_display = st.selectbox("Selecionar OS:", detail_options, key="detail_list")
-                os_number = detail_display.split(" - ")[0].split(" ")[-1]
-                detail_order_id = df_display[df_display["OS"] == os_number]["ID"].iloc[0]
+            if not df_display.empty:
+                labels = detail_labels(df_display)
+                detail_order_id = st.selectbox("Selecionar OS:", list(labels), format_func=labels.get, key="detail_list")
 
         elif detail_search_method == "🎯 Busca Rápida":
             detail_search = st.text_input("🔍 Buscar:", placeholder="Cliente, OS, CTO...", key="detail_search_input")
-            detail_filtered = df_display.copy()
-            if detail_search:
-                detail_filtered = detail_filtered[
-                    detail_filtered["Cliente"].str.contains(detail_search, case=False, na=False) |
-                    detail_filtered["OS"].str.contains(detail_search, case=False, na=False) |
-                    detail_filtered["CTO"].str.contains(detail_search, case=False, na=False)
-                ]
+            detail_filtered = (manager.build_orders_dataframe(manager.search_orders(detail_search, limit=5))
+                               if detail_search else df_display.head(5))
             if not detail_filtered.empty:
-                for _, row in detail_filtered.head(5).iterrows():
-                    if st.button(f"👁️ {row['OS']} - {row['Cliente']}", key=f"detail_btn_{row['ID']}"):
-                        detail_order_id = row["ID"]
-                        detail_display = f"{row['OS']} - {row['Cliente']}"
+                for order_id, number, client in zip(detail_filtered["ID"], detail_filtered["OS"], detail_filtered["Cliente"]):
+                    if st.button(f"👁️ {number} - {client}", key=f"detail_btn_{order_id}"):
+                        detail_order_id = order_id
             elif detail_search:
                 st.info("🔍 Nenhum resultado encontrado")
 
         elif detail_search_method == "🔢 Por Número":
             detail_os_number = st.text_input("📱 Número da OS:", placeholder="Ex: OS12345678", key="detail_os_input")
             if detail_os_number:
-                detail_match = df_display[df_display["OS"] == detail_os_number.upper()]
-                if not detail_match.empty:
-                    row = detail_match.iloc[0]
-                    detail_order_id = row["ID"]
-                    detail_display = f"{row['OS']} - {row['Cliente']}"
-                    st.info(f"📋 OS encontrada: {row['Cliente']}")
+                order = manager.find_order_by_number(detail_os_number)
+                if order:
+                    detail_order_id = order["id"]
+                    st.info(f"📋 OS encontrada: {order['order_number']}")
 
         if detail_order_id:
-            orders = manager.get_all_orders()
-            selected_order_data = next((o for o in orders if o["id"] == detail_order_id), None)
+            # Uma requisição com cliente, serviço e técnico embutidos (ou o cache LRU)
+            selected_order_data = manager.get_order(int(detail_order_id))
             if selected_order_data:
-                clients = manager.get_all_clients()
-                services = manager.get_all_services()
-                technicians = manager.get_all_technicians()
-                client = next((c for c in clients if c["id"] == selected_order_data["client_id"]), {})
-                service = next((s for s in services if s["id"] == selected_order_data["service_id"]), {})
-                technician = next((t for t in technicians if t["id"] == selected_order_data["technician_id"]), {})
+                client = selected_order_data.get("clients") or {}
+                service = selected_order_data.get("services") or {}
+                technician = selected_order_data.get("technicians") or {}
 
                 with st.expander(f"📋 Detalhes - {selected_order_data['order_number']}", expanded=True):
                     st.markdown(f"""
@@ -0,0 +1,149 @@
+import pandas as pd
+
+STATUS_CATEGORIES = ["Agendado", "Em Campo", "Aguardando Peças", "Concluído", "Cancelado"]
+PRIORITY_CATEGORIES = ["Baixa", "Normal", "Alta", "Urgente"]
+PENDING_STATUSES = ["Agendado", "Em Campo"]
+
+ORDER_COLUMNS = ["id", "service_id", "technician_id", "scheduled_date", "status", "priority", "estimated_cost"]
+
+
+def build_orders_frame(orders, services, technicians):
+    """Monta o DataFrame tipado (uma linha por OS) usado por todos os KPIs.
+
+    Serviço e técnico são resolvidos com joins por hash (Series.map sobre
+    índices por id), sem varrer as listas de referência para cada ordem.
+    A coluna `orders` vale 1 em cada linha, o que deixa o frame com o mesmo
+    formato dos rollups (build_rollup_frame), onde ela é uma contagem.
+    """
+    frame = pd.DataFrame.from_records(orders, columns=ORDER_COLUMNS)
+    services_df = pd.DataFrame.from_records(services, columns=["id", "type"]).set_index("id")
+    technicians_df = pd.DataFrame.from_records(technicians, columns=["id", "name", "region"]).set_index("id")
+
+    frame["service_type"] = frame["service_id"].map(services_df["type"]).fillna("Outros").astype("category")
+    frame["technician_name"] = frame["technician_id"].map(technicians_df["name"]).fillna("N/A")
+    frame["region"] = frame["technician_id"].map(technicians_df["region"]).fillna("N/A").astype("category")
+    frame["status"] = pd.Categorical(frame["status"], categories=STATUS_CATEGORIES)
+    frame["priority"] = pd.Categorical(frame["priority"], categories=PRIORITY_CATEGORIES)
+    frame["date"] = pd.to_datetime(frame["scheduled_date"], errors="coerce")
+    frame["estimated_cost"] = pd.to_numeric(frame["estimated_cost"], errors="coerce").fillna(0.0).astype("float64")
+    frame["orders"] = 1
+    frame["completed"] = (frame["status"] == "Concluído").astype("int64")
+    frame["installations"] = (frame["service_type"] == "Instalação").astype("int64")
+    frame["repairs"] = (frame["service_type"] == "Reparo").astype("int64")
+    frame["revenue"] = frame["estimated_cost"].where(frame["completed"] == 1, 0.0)
+    return frame.drop(columns=["scheduled_date"])
+
+
+def build_rollup_frame(rows):
+    """Frame de fatos a partir de order_rollup_daily ou order_rollup_totals.
+
+    Cada linha já é uma contagem (`orders`) por dia, status, tipo e região;
+    as funções de KPI abaixo somam essa coluna em vez de contar linhas.
+    """
+    frame = pd.DataFrame.from_records(rows, columns=["day", "status", "service_type", "region", "orders", "revenue"])
+    frame["date"] = pd.to_datetime(frame["day"], errors="coerce")
+    frame["status"] = pd.Categorical(frame["status"], categories=STATUS_CATEGORIES)
+    frame["service_type"] = frame["service_type"].fillna("Outros").astype("category")
+    frame["region"] = frame["region"].fillna("N/A").astype("category")
+    frame["orders"] = pd.to_numeric(frame["orders"], errors="coerce").fillna(0).astype("int64")
+    frame["revenue"] = pd.to_numeric(frame["revenue"], errors="coerce").fillna(0.0).astype("float64")
+    return frame.drop(columns=["day"])
+
+
+def build_technician_rollup_frame(rows, technicians):
+    """Frame por técnico e dia a partir de technician_rollup_daily"""
+    columns = ["day", "technician_id", "orders", "completed", "installations", "repairs", "revenue"]
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    technicians_df = pd.DataFrame.from_records(technicians, columns=["id", "name", "region"]).set_index("id")
+    frame["technician_name"] = frame["technician_id"].map(technicians_df["name"]).fillna("N/A")
+    frame["region"] = frame["technician_id"].map(technicians_df["region"]).fillna("N/A").astype("category")
+    frame["date"] = pd.to_datetime(frame["day"], errors="coerce")
+    for column in ["orders", "completed", "installations", "repairs"]:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").fillna(0).astype("int64")
+    frame["revenue"] = pd.to_numeric(frame["revenue"], errors="coerce").fillna(0.0).astype("float64")
+    return frame.drop(columns=["day"])
+
+
+def filter_period(frame, start_date=None, end_date=None):
+    mask = pd.Series(True, index=frame.index)
+    if start_date is not None:
+        mask &= frame["date"] >= pd.Timestamp(start_date)
+    if end_date is not None:
+        mask &= frame["date"] <= pd.Timestamp(end_date)
+    return frame[mask]
+
+
+def status_counts(frame):
+    counts = frame.groupby("status", observed=False)["orders"].sum()
+    return counts.reindex(STATUS_CATEGORIES, fill_value=0)
+
+
+def summary(frame):
+    """KPIs principais do conjunto de ordens"""
+    counts = status_counts(frame)
+    total = int(frame["orders"].sum())
+    completed = int(counts["Concluído"])
+    return {
+        "total": total,
+        "pending": int(counts["Agendado"]),
+        "in_progress": int(counts["Em Campo"]),
+        "completed": completed,
+        "installations": int(frame.loc[frame["service_type"] == "Instalação", "orders"].sum()),
+        "revenue": float(frame["revenue"].sum()),
+        "completion_rate": completed / total * 100 if total else 0.0,
+    }
+
+
+def type_distribution(frame):
+    counts = frame.groupby("service_type", observed=True)["orders"].sum()
+    return counts[counts > 0]
+
+
+def region_distribution(frame):
+    counts = frame.groupby("region", observed=True)["orders"].sum()
+    return counts[counts > 0]
+
+
+def service_type_report(frame):
+    """Total, concluídas, pendentes, taxa de conclusão e receita por tipo de serviço"""
+    report = frame.assign(
+        completed_orders=frame["orders"].where(frame["status"] == "Concluído", 0),
+        pending_orders=frame["orders"].where(frame["status"].isin(PENDING_STATUSES), 0),
+    ).groupby("service_type", observed=True).agg(
+        total=("orders", "sum"),
+        completed=("completed_orders", "sum"),
+        pending=("pending_orders", "sum"),
+        revenue=("revenue", "sum"),
+    )
+    report = report[report["total"] > 0].copy()
+    report["completion_rate"] = report["completed"] / report["total"] * 100
+    return report.reset_index()
+
+
+def technician_report(frame):
+    """Produtividade por técnico (frame de ordens ou de technician_rollup_daily)"""
+    report = frame.groupby("technician_id", sort=False).agg(
+        name=("technician_name", "first"),
+        region=("region", "first"),
+        total=("orders", "sum"),
+        completed=("completed", "sum"),
+        installations=("installations", "sum"),
+        repairs=("repairs", "sum"),
+        revenue=("revenue", "sum"),
+    )
+    report = report[report["total"] > 0].copy()
+    report["completion_rate"] = report["completed"] / report["total"] * 100
+    report["avg_revenue"] = (report["revenue"] / report["completed"]).where(report["completed"] > 0, 0.0)
+    return report.reset_index()
+
+
+def region_type_matrix(frame, types=("Instalação", "Reparo")):
+    """Matriz região × tipo; tipos fora de `types` são somados em "Outros" """
+    bucket = frame["service_type"].astype("object").where(frame["service_type"].isin(types), "Outros")
+    matrix = pd.crosstab(frame["region"].astype("object"), bucket, values=frame["orders"], aggfunc="sum")
+    return matrix.reindex(columns=[*types, "Outros"]).fillna(0).astype("int64")
+
+
+def daily_counts(frame):
+    counts = frame.groupby("date")["orders"].sum().sort_index()
+    return counts[counts > 0]
@@ -1,5 +1,7 @@
 import streamlit as st
 from fiber_calendar import FiberOpticCalendarIntegration
+from bulk_import import show_bulk_import
+from dispatch import not_before_for
 from datetime import datetime, time
 import pandas as pd
 
@@ -7,47 +9,68 @@ def show_new_order(manager):
     """Formulário para criar nova OS de fibra óptica"""
     st.header("📝 Nova Ordem de Serviço - Fibra Óptica")
 
-    clients = manager.get_all_clients()
-    services = manager.get_all_services()
-    technicians = manager.get_all_technicians()
-    equipment = manager.get_all_equipment()
+    # Tabelas fora do cache são buscadas ao mesmo tempo
+    clients, services, technicians, equipment = manager.load_reference_tables(
+        "clients", "services", "technicians", "equipment")
 
     if not all([clients, services, technicians]):
         st.error("❌ Erro ao carregar dados do banco. Verifique a conexão.")
         return
 
-    with st.form("new_fiber_order_form"):
-        st.subheader("👤 Informações do Cliente")
-        col1, col2 = st.columns(2)
+    # Cliente, serviço e data ficam fora do formulário: mudá-los refaz a sugestão de técnico e horário
+    st.subheader("👤 Informações do Cliente")
+    col1, col2 = st.columns(2)
 
-        with col1:
-            client_options = {f"{c['name']} - {c['cto']} ({c['plan']})": c['id'] for c in clients}
-            selected_client = st.selectbox("🏠 Cliente", options=list(client_options.keys()))
-            client_id = client_options[selected_client]
-            client = next(c for c in clients if c['id'] == client_id)
-            st.info(f"📍 **Endereço:** {client['address']}\n\n📞 **Tel:** {client['phone']}")
+    with col1:
+        client_options = {f"{c['name']} - {c['cto']} ({c['plan']})": c['id'] for c in clients}
+        selected_client = st.selectbox("🏠 Cliente", options=list(client_options.keys()))
+        client_id = client_options[selected_client]
+        client = next(c for c in clients if c['id'] == client_id)
+        st.info(f"📍 **Endereço:** {client['address']}\n\n📞 **Tel:** {client['phone']}")
 
-        with col2:
-            st.text_input("🌐 CTO", value=client['cto'], disabled=True)
-            st.text_input("📊 Plano Atual", value=client['plan'], disabled=True)
+    with col2:
+        st.text_input("🌐 CTO", value=client['cto'], disabled=True)
+        st.text_input("📊 Plano Atual", value=client['plan'], disabled=True)
 
-        st.subheader("🔧 Informações do Serviço")
+    st.subheader("🔧 Informações do Serviço")
+    col1, col2 = st.columns(2)
+    with col1:
+        service_options = {f"{s['name']} ({s['type']}) - R$ {s['price']:.2f}": s['id'] for s in services}
+        selected_service = st.selectbox("⚙️ Tipo de Serviço", options=list(service_options.keys()))
+        service_id = service_options[selected_service]
+        service = next(s for s in services if s['id'] == service_id)
+    with col2:
+        scheduled_date = st.date_input("📅 Data do Agendamento", min_value=datetime.now().date())
+
+    # Técnicos ranqueados por região do cliente, especialidade, nível, carga do dia e horário livre
+    engine = manager.get_dispatch_engine()
+    ranking = engine.rank(client_id, service_id, scheduled_date, not_before_for(scheduled_date)) if engine else None
+    if ranking is not None and not ranking.empty:
+        tech_ids = ranking["id"].tolist()
+        tech_labels = {
+            row.id: (f"{row.name} - {row.region} ({row.level}) · {row.committed_hours:.1f}h no dia · "
+                     + (f"livre às {row.start_time.strftime('%H:%M')}" if row.available else "sem horário livre"))
+            for row in ranking.itertuples()
+        }
+        best = ranking.iloc[0]
+        suggested_time = best["start_time"] if best["available"] else time(8, 0)
+        if best["available"]:
+            st.caption(f"🤖 Sugestão: **{best['name']}** ({best['region']}) às {suggested_time.strftime('%H:%M')}"
+                       + (" · mesma região do cliente" if best["region_match"] else ""))
+        else:
+            st.warning("⚠️ Nenhum técnico tem horário livre para a duração deste serviço nesta data.")
+    else:
+        tech_ids = [t['id'] for t in technicians]
+        tech_labels = {t['id']: f"{t['name']} - {t['region']} ({t['level']})" for t in technicians}
+        suggested_time = time(8, 0)
+
+    with st.form("new_fiber_order_form"):
+        st.subheader("👨‍🔧 Técnico e Horário")
         col1, col2 = st.columns(2)
 
         with col1:
-            service_options = {f"{s['name']} ({s['type']}) - R$ {s['price']:.2f}": s['id'] for s in services}
-            selected_service = st.selectbox("⚙️ Tipo de Serviço", options=list(service_options.keys()))
-            service_id = service_options[selected_service]
-            service = next(s for s in services if s['id'] == service_id)
-            if service['type'] in ['Instalação', 'Reparo', 'Manutenção']:
-                filtered_techs = [t for t in technicians if service['type'].lower() in t['specialty'].lower()]
-                if not filtered_techs:
-                    filtered_techs = technicians
-            else:
-                filtered_techs = technicians
-            tech_options = {f"{t['name']} - {t['region']} ({t['level']})": t['id'] for t in filtered_techs}
-            selected_tech = st.selectbox("👨‍🔧 Técnico Responsável", options=list(tech_options.keys()))
-            technician_id = tech_options[selected_tech]
+            technician_id = st.selectbox("👨‍🔧 Técnico Responsável", options=tech_ids, format_func=tech_labels.get)
+            scheduled_time = st.time_input("🕐 Hora do Agendamento", value=suggested_time)
 
         with col2:
             default_priority = "Alta" if service['type'] == "Reparo" else "Normal"
@@ -57,13 +80,6 @@ def show_new_order(manager):
             service_price = service['price']
             estimated_cost = st.number_input("💰 Custo Estimado (R$)", value=service_price, min_value=0.0)
 
-        st.subheader("📅 Agendamento")
-        col1, col2 = st.columns(2)
-        with col1:
-            scheduled_date = st.date_input("📅 Data do Agendamento", min_value=datetime.now().date())
-        with col2:
-            scheduled_time = st.time_input("🕐 Hora do Agendamento", value=time(8, 0))
-
         st.subheader("🔍 Informações Técnicas")
         col1, col2 = st.columns(2)
         with col1:
@@ -87,9 +103,20 @@ def show_new_order(manager):
         else:
             selected_equipment = []
 
-        submitted = st.form_submit_button("🚀 Criar Ordem de Serviço")
+        allow_conflict = st.checkbox("⚠️ Agendar mesmo se o técnico já tiver OS neste horário")
+        submitted = st.form_submit_button("🚀 Criar Ordem de Serviço", disabled=manager.offline)
         if submitted:
-            if description.strip():
+            conflicts = manager.find_schedule_conflicts(technician_id, scheduled_date, scheduled_time, service_id)
+            if conflicts and not allow_conflict:
+                numbers = ", ".join(f"{o['order_number']} ({str(o['scheduled_time'])[:5]})" for o in conflicts)
+                st.error(f"❌ Conflito de agenda: o técnico já tem {numbers} sobrepondo este horário "
+                         f"(duração do serviço: {service.get('duration', 2)}h).")
+                now = not_before_for(scheduled_date)
+                free = manager.next_free_slot(technician_id, scheduled_date, service_id,
+                                              max(now, scheduled_time) if now else scheduled_time)
+                if free:
+                    st.info(f"💡 Próximo horário livre deste técnico: {free.strftime('%d/%m/%Y às %H:%M')}")
+            elif description.strip():
                 equipment_cost = 0
                 equipment_list = []
                 for eq_desc in selected_equipment:
@@ -156,9 +183,21 @@ def show_new_order(manager):
                         if equipment_list:
                             st.markdown(f"**📦 Equipamentos:** {', '.join(equipment_list)}")
                     if calendar_result["status"] == "success":
-                        st.success("📅 Evento agendado no Google Agenda!")
+                        # Botões de download não podem ficar dentro do formulário: o .ics da última OS criada fica abaixo dele
+                        st.session_state["new_order_ics"] = (new_order['order_number'], calendar_result["ics"])
+                        st.success("📅 Evento de agenda gerado: baixe o .ics abaixo ou assine o feed do "
+                                   "técnico na página Calendário.")
                     st.balloons()
                 else:
                     st.error("❌ Erro ao criar ordem de serviço")
             else:
                 st.error("⚠️ Por favor, preencha a descrição do serviço.")
+
+    if "new_order_ics" in st.session_state:
+        order_number, ics = st.session_state["new_order_ics"]
+        st.download_button(f"⬇️ Baixar evento da {order_number} (.ics)", ics.encode("utf-8"),
+                           file_name=f"{order_number}.ics", mime="text/calendar")
+
+    st.markdown("---")
+    with st.expander("📥 Importar OS em Lote (CSV/XLSX)"):
+        show_bulk_import(manager)
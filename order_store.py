@@ -0,0 +1,204 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from storage import iter_rows
+
+# Linhas por página nas leituras (limite padrão de max-rows do PostgREST)
+ORDER_PAGE_SIZE = 1000
+
+# Ids por requisição em filtros in.(...), para manter a URL curta
+ID_CHUNK_SIZE = 200
+
+
+class OrderStore:
+    """Cópia local de service_orders, sincronizada pelo watermark de updated_at.
+
+    A primeira sincronização baixa a tabela inteira (em páginas por id); as
+    seguintes trazem apenas as linhas com updated_at a partir do último valor
+    visto. Exclusões não aparecem nesse delta, então de tempos em tempos o
+    conjunto de ids é reconciliado com o servidor.
+    """
+
+    def __init__(self, min_sync_interval=2, reconcile_interval=300, overlap_seconds=5):
+        self.min_sync_interval = min_sync_interval
+        self.reconcile_interval = reconcile_interval
+        # Margem de releitura: cobre transações confirmadas depois do último delta
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.watermark = None
+        self.version = 0
+        self.delta_supported = True
+        self._orders = {}
+        # Id -> versão da última mudança, desde a última carga completa (versão em _replaced_version)
+        self._changed_at = {}
+        self._replaced_version = 0
+        # Número da OS -> id, mantido junto com _orders
+        self._ids_by_number = {}
+        self._loaded = False
+        self._last_sync = 0.0
+        self._last_reconcile = 0.0
+        self._lock = threading.Lock()
+
+    def all(self):
+        with self._lock:
+            return list(self._orders.values())
+
+    def get(self, order_id):
+        with self._lock:
+            return self._orders.get(order_id)
+
+    def get_by_number(self, order_number):
+        with self._lock:
+            return self._orders.get(self._ids_by_number.get(order_number))
+
+    def changes_since(self, version):
+        """(versão atual, ids incluídos, alterados ou excluídos depois de `version`).
+
+        Os ids vêm como None se houve carga completa depois de `version`: aí
+        não há como saber o que mudou e quem depende da cópia refaz tudo.
+        """
+        with self._lock:
+            if version < self._replaced_version:
+                return self.version, None
+            return self.version, [order_id for order_id, changed in self._changed_at.items() if changed > version]
+
+    def sync(self, storage, force=False, delta=True, workers=1):
+        """Atualiza a cópia local; retorna True se algo mudou.
+
+        Com `delta=False` (mudanças chegando por um change feed) só a carga
+        inicial e a reconciliação periódica de ids vão ao servidor.
+        `workers > 1` busca as páginas da carga completa em paralelo.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded and not force and now - self._last_sync < self.min_sync_interval:
+                return False
+            if not self._loaded or not self.delta_supported:
+                changed = self._full_load(storage, workers)
+            else:
+                changed = self._delta(storage) if delta else False
+                if now - self._last_reconcile >= self.reconcile_interval:
+                    changed = self._reconcile(storage) or changed
+            self._last_sync = now
+            return changed
+
+    def upsert(self, rows):
+        """Aplica linhas já conhecidas (ex.: retorno de insert/update feitos por esta instância)"""
+        with self._lock:
+            self._merge(rows)
+
+    def remove(self, order_ids):
+        with self._lock:
+            removed = [row for row in (self._orders.pop(order_id, None) for order_id in order_ids) if row]
+            for row in removed:
+                self._ids_by_number.pop(row.get('order_number'), None)
+            if removed:
+                self.version += 1
+                self._mark(row['id'] for row in removed)
+
+    def apply_change(self, event, record, old_record):
+        """Aplica uma notificação do change feed (INSERT, UPDATE ou DELETE)"""
+        if event == "DELETE":
+            order_id = (old_record or record).get('id')
+            if order_id is not None:
+                self.remove([order_id])
+        elif record.get('id') is not None:
+            self.upsert([record])
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def seed(self, rows):
+        """Carga inicial com linhas já disponíveis (ex.: snapshot local), sem ir ao servidor.
+
+        Só vale com a cópia ainda vazia; o delta seguinte parte do maior
+        updated_at das linhas. Retorna True se as linhas foram usadas.
+        """
+        with self._lock:
+            if self._loaded:
+                return False
+            self._replace(rows)
+            return True
+
+    def reload(self, storage, workers=1):
+        """Carga completa buscada fora do lock: leituras seguem na cópia atual até a troca"""
+        rows = [row for page in iter_rows(storage, 'service_orders', chunk_size=ORDER_PAGE_SIZE, workers=workers)
+                for row in page]
+        with self._lock:
+            self._replace(rows)
+            self._last_sync = time.monotonic()
+
+    def _full_load(self, storage, workers=1):
+        rows = [row for page in iter_rows(storage, 'service_orders', chunk_size=ORDER_PAGE_SIZE, workers=workers)
+                for row in page]
+        return self._replace(rows)
+
+    def _replace(self, rows):
+        self._orders = {row['id']: row for row in rows}
+        self._ids_by_number = {row.get('order_number'): row['id'] for row in rows}
+        self.watermark = self._max_updated_at(rows)
+        # Sem a coluna updated_at (schema básico) toda sincronização é uma carga completa
+        self.delta_supported = bool(rows) and 'updated_at' in rows[0]
+        self._loaded = True
+        self._last_reconcile = time.monotonic()
+        self.version += 1
+        self._replaced_version = self.version
+        self._changed_at = {}
+        return True
+
+    def _delta(self, storage):
+        since = self.watermark - self.overlap if self.watermark else None
+        filters = [('updated_at', 'gte', since.isoformat())] if since is not None else []
+        rows = [row for page in iter_rows(storage, 'service_orders', filters=filters, chunk_size=ORDER_PAGE_SIZE)
+                for row in page]
+        return self._merge(rows)
+
+    def _reconcile(self, storage):
+        """Remove ordens excluídas no servidor e busca as que faltam localmente"""
+        remote_ids = {row['id'] for page in iter_rows(storage, 'service_orders', 'id', chunk_size=ORDER_PAGE_SIZE)
+                      for row in page}
+        self._last_reconcile = time.monotonic()
+
+        changed = False
+        deleted = self._orders.keys() - remote_ids
+        for order_id in deleted:
+            self._ids_by_number.pop(self._orders.pop(order_id).get('order_number'), None)
+            changed = True
+        missing = sorted(remote_ids - self._orders.keys())
+        for start in range(0, len(missing), ID_CHUNK_SIZE):
+            chunk = missing[start:start + ID_CHUNK_SIZE]
+            page, _ = storage.select('service_orders', filters=[('id', 'in', chunk)])
+            changed = self._merge(page) or changed
+        if changed:
+            self.version += 1
+            self._mark(deleted)
+        return changed
+
+    def _merge(self, rows):
+        changed = []
+        for row in rows:
+            previous = self._orders.get(row['id'])
+            if previous != row:
+                if previous and previous.get('order_number') != row.get('order_number'):
+                    self._ids_by_number.pop(previous.get('order_number'), None)
+                self._orders[row['id']] = row
+                self._ids_by_number[row.get('order_number')] = row['id']
+                changed.append(row['id'])
+        latest = self._max_updated_at(rows)
+        if latest and (self.watermark is None or latest > self.watermark):
+            self.watermark = latest
+        if changed:
+            self.version += 1
+            self._mark(changed)
+        return bool(changed)
+
+    def _mark(self, order_ids):
+        for order_id in order_ids:
+            self._changed_at[order_id] = self.version
+
+    @staticmethod
+    def _max_updated_at(rows):
+        values = [row['updated_at'] for row in rows if row.get('updated_at')]
+        if not values:
+            return None
+        return max(datetime.fromisoformat(value) for value in values)
@@ -0,0 +1,209 @@
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import time
+
+import numpy as np
+import pandas as pd
+
+from dispatch import WORKDAY_START, WORKDAY_END, DEFAULT_DURATION_HOURS
+
+EARTH_RADIUS_KM = 6371.0
+
+# Velocidade média em área urbana, usada para estimar o deslocamento entre clientes
+TRAVEL_SPEED_KMH = 25.0
+
+# Prioridades atendidas antes das demais, nesta ordem; o resto forma um único grupo
+PRIORITY_ORDER = ["Urgente"]
+
+# Com menos rotas que isso o pool de processos custa mais do que economiza
+PROCESS_POOL_MIN_ROUTES = 50
+
+ROUTE_COLUMNS = ["order_id", "technician_id", "sequence", "arrival", "departure", "distance_km", "within_workday"]
+
+
+def distance_matrix(latitudes, longitudes):
+    """Distâncias (km, haversine) entre todos os pares de pontos"""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    half_dlat = (lat[:, None] - lat[None, :]) / 2
+    half_dlon = (lon[:, None] - lon[None, :]) / 2
+    a = np.sin(half_dlat) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(half_dlon) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _path_length(dist, path, anchor=None):
+    route = ([anchor] if anchor is not None else []) + list(path)
+    return sum(dist[a][b] for a, b in zip(route, route[1:]))
+
+
+def _nearest_neighbour(dist, nodes, anchor=None):
+    """Caminho guloso pelo ponto mais próximo ainda não visitado.
+
+    Partindo de `anchor` (fora do caminho) quando informado; senão cada ponto
+    é testado como partida e fica o caminho mais curto.
+    """
+    best, best_length = None, math.inf
+    for start in ([None] if anchor is not None else nodes):
+        path = [] if start is None else [start]
+        remaining = [node for node in nodes if node != start]
+        current = anchor if start is None else start
+        while remaining:
+            row = dist[current]
+            current = min(remaining, key=row.__getitem__)
+            remaining.remove(current)
+            path.append(current)
+        length = _path_length(dist, path, anchor)
+        if length < best_length:
+            best, best_length = path, length
+    return best
+
+
+def _two_opt(dist, path, anchor=None):
+    """Melhora um caminho aberto invertendo trechos enquanto isso o encurtar.
+
+    Sem `anchor` as pontas são livres (um trecho pode incluir o primeiro ou o
+    último ponto); com `anchor` o caminho continua saindo dele.
+    """
+    route = ([anchor] if anchor is not None else []) + list(path)
+    first = 1 if anchor is not None else 0
+    n = len(route)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(first, n - 1):
+            for j in range(i + 1, n):
+                before = dist[route[i - 1]][route[i]] if i > 0 else 0.0
+                after = dist[route[j]][route[j + 1]] if j + 1 < n else 0.0
+                swapped = ((dist[route[i - 1]][route[j]] if i > 0 else 0.0)
+                           + (dist[route[i]][route[j + 1]] if j + 1 < n else 0.0))
+                if swapped < before + after - 1e-9:
+                    route[i:j + 1] = route[i:j + 1][::-1]
+                    improved = True
+    return route[first:]
+
+
+def _priority_group(priority):
+    return PRIORITY_ORDER.index(priority) if priority in PRIORITY_ORDER else len(PRIORITY_ORDER)
+
+
+def plan_route(stops):
+    """Ordena as paradas de um técnico num dia.
+
+    `stops` é uma tupla de listas (ids, latitudes, longitudes, prioridades,
+    durações em horas, horários agendados). Urgentes vêm primeiro; dentro de
+    cada grupo de prioridade, vizinho mais próximo seguido de 2-opt, e o grupo
+    seguinte parte do último ponto do anterior. Paradas sem coordenadas
+    fecham o seu grupo, pelo horário agendado. Retorna tuplas (id, sequência,
+    chegada, saída em minutos do dia, km do trecho) a partir do início da jornada.
+    """
+    order_ids, latitudes, longitudes, priorities, durations, times = stops
+    located = [i for i in range(len(order_ids)) if latitudes[i] is not None and longitudes[i] is not None]
+    dist = distance_matrix([latitudes[i] for i in located], [longitudes[i] for i in located]).tolist()
+    node_of = {stop: node for node, stop in enumerate(located)}
+
+    sequence, anchor = [], None
+    for group in sorted({_priority_group(priority) for priority in priorities}):
+        members = [i for i in range(len(order_ids)) if _priority_group(priorities[i]) == group]
+        nodes = [node_of[i] for i in members if i in node_of]
+        if nodes:
+            path = _two_opt(dist, _nearest_neighbour(dist, nodes, anchor), anchor)
+            sequence += [located[node] for node in path]
+            anchor = path[-1]
+        sequence += sorted((i for i in members if i not in node_of), key=lambda i: str(times[i] or ""))
+
+    result, clock, previous = [], WORKDAY_START, None
+    for position, stop in enumerate(sequence, start=1):
+        node = node_of.get(stop)
+        km = dist[previous][node] if previous is not None and node is not None else 0.0
+        arrival = clock + math.ceil(km / TRAVEL_SPEED_KMH * 60)
+        clock = arrival + round(float(durations[stop]) * 60)
+        result.append((order_ids[stop], position, arrival, clock, km))
+        if node is not None:
+            previous = node
+    return result
+
+
+def _minute_time(minute):
+    """Minutos do dia -> datetime.time; None se a rota passa da meia-noite"""
+    minute = int(minute)
+    return time(minute // 60, minute % 60) if minute < 24 * 60 else None
+
+
+def _coordinates(values):
+    # None (e não NaN) para coordenada ausente: NaN != NaN invalidaria o cache a cada chamada
+    return [None if pd.isna(value) else float(value) for value in values]
+
+
+def plan_routes(stops, workers=None, cache=None):
+    """Rotas do dia de todos os técnicos.
+
+    `stops` é um DataFrame com order_id, technician_id, latitude, longitude,
+    priority, duration_hours e scheduled_time. `cache` (dict técnico ->
+    (paradas, resultado)) guarda as rotas já calculadas no dia: só técnicos
+    cujas paradas mudaram são refeitos. Com `workers` > 1 e rotas suficientes,
+    o cálculo vai para um pool de processos. Retorna um DataFrame com
+    ROUTE_COLUMNS, ordenado por técnico e sequência.
+    """
+    cache = {} if cache is None else cache
+    tasks = {}
+    for technician_id, group in stops.groupby("technician_id", sort=False):
+        group = group.sort_values("order_id")
+        task = (
+            group["order_id"].tolist(),
+            _coordinates(group["latitude"]),
+            _coordinates(group["longitude"]),
+            group["priority"].tolist(),
+            group["duration_hours"].fillna(DEFAULT_DURATION_HOURS).astype(float).tolist(),
+            group["scheduled_time"].tolist(),
+        )
+        cached = cache.get(technician_id)
+        if cached is None or cached[0] != task:
+            tasks[technician_id] = task
+    for technician_id in set(cache) - set(stops["technician_id"]):
+        del cache[technician_id]
+
+    if workers and workers > 1 and len(tasks) >= PROCESS_POOL_MIN_ROUTES:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            planned = list(pool.map(plan_route, tasks.values(), chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        planned = [plan_route(task) for task in tasks.values()]
+    for (technician_id, task), route in zip(tasks.items(), planned):
+        cache[technician_id] = (task, route)
+
+    rows = [(order_id, technician_id, position, arrival, departure, km)
+            for technician_id in stops["technician_id"].unique()
+            for order_id, position, arrival, departure, km in cache[technician_id][1]]
+    frame = pd.DataFrame(rows, columns=ROUTE_COLUMNS[:-1])
+    frame["within_workday"] = frame["departure"] <= WORKDAY_END
+    frame["arrival"] = frame["arrival"].map(_minute_time)
+    frame["departure"] = frame["departure"].map(_minute_time)
+    return frame.sort_values(["technician_id", "sequence"], ignore_index=True)
+
+
+def random_stops(n_technicians=200, stops_per_technician=10, seed=42):
+    """Paradas sintéticas na Grande São Paulo, para medir o planejador"""
+    rng = np.random.default_rng(seed)
+    n = n_technicians * stops_per_technician
+    return pd.DataFrame({
+        "order_id": np.arange(1, n + 1),
+        "technician_id": np.repeat(np.arange(1, n_technicians + 1), stops_per_technician),
+        "latitude": rng.uniform(-23.75, -23.45, n),
+        "longitude": rng.uniform(-46.80, -46.40, n),
+        "priority": rng.choice(["Baixa", "Normal", "Alta", "Urgente"], n, p=[0.2, 0.5, 0.2, 0.1]),
+        "duration_hours": rng.choice([0.5, 1.0, 2.0], n),
+        "scheduled_time": [f"{minute // 60:02d}:{minute % 60:02d}" for minute in rng.integers(16, 36, n) * 30],
+    })
+
+
+if __name__ == "__main__":
+    # Uso: python routing.py [técnicos] [paradas_por_técnico] [processos]
+    import time as clock
+
+    args = [int(arg) for arg in sys.argv[1:]]
+    stops = random_stops(*args[:2])
+    started = clock.perf_counter()
+    routes = plan_routes(stops, workers=args[2] if len(args) > 2 else None)
+    elapsed = clock.perf_counter() - started
+    print(f"{routes['technician_id'].nunique()} rotas, {len(routes)} paradas em {elapsed:.2f}s; "
+          f"{routes['distance_km'].sum():.0f} km no total")
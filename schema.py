@@ -1,11 +1,12 @@
 import streamlit as st
+from fiber_service_manager import FiberOpticServiceManager
 
 def show_database_schema():
     """Mostra o schema SQL para criar as tabelas no Supabase"""
     st.markdown("---")
     st.subheader("🗄️ Schema do Banco de Dados")
     
-    tab1, tab2 = st.tabs(["📋 Schema Básico", "🔧 Schema Completo"])
+    tab1, tab2, tab3 = st.tabs(["📋 Schema Básico", "🔧 Schema Completo", "📈 Rollups"])
     
     with tab1:
         st.markdown("**Execute primeiro este schema básico no Supabase:**")
@@ -70,12 +71,20 @@ CREATE TABLE IF NOT EXISTS service_orders (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- 6. Metadados da aplicação (versão do schema/seed já aplicada)
+CREATE TABLE IF NOT EXISTS app_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
 -- Desabilitar RLS temporariamente para testes
 ALTER TABLE clients DISABLE ROW LEVEL SECURITY;
 ALTER TABLE services DISABLE ROW LEVEL SECURITY;
 ALTER TABLE technicians DISABLE ROW LEVEL SECURITY;
 ALTER TABLE equipment DISABLE ROW LEVEL SECURITY;
 ALTER TABLE service_orders DISABLE ROW LEVEL SECURITY;
+ALTER TABLE app_meta DISABLE ROW LEVEL SECURITY;
         """
         
         st.code(basic_sql, language="sql")
@@ -98,11 +107,20 @@ ADD COLUMN IF NOT EXISTS customer_satisfaction INTEGER,
 ADD COLUMN IF NOT EXISTS equipment_used JSONB DEFAULT '[]'::jsonb,
 ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
 
+-- Coordenadas do cliente (opcionais), usadas pelo planejador de rotas
+ALTER TABLE clients
+ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+
 -- Criar índices para melhor performance
 CREATE INDEX IF NOT EXISTS idx_service_orders_status ON service_orders(status);
 CREATE INDEX IF NOT EXISTS idx_service_orders_scheduled_date ON service_orders(scheduled_date);
 CREATE INDEX IF NOT EXISTS idx_service_orders_client_id ON service_orders(client_id);
 CREATE INDEX IF NOT EXISTS idx_service_orders_technician_id ON service_orders(technician_id);
+CREATE INDEX IF NOT EXISTS idx_service_orders_service_id ON service_orders(service_id);
+CREATE INDEX IF NOT EXISTS idx_service_orders_priority ON service_orders(priority);
+-- Sincronização por delta (updated_at >= última marca) sem varrer a tabela inteira
+CREATE INDEX IF NOT EXISTS idx_service_orders_updated_at ON service_orders(updated_at);
 
 -- Função para atualizar updated_at automaticamente
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -117,52 +135,231 @@ $ language 'plpgsql';
 CREATE TRIGGER update_service_orders_updated_at 
     BEFORE UPDATE ON service_orders 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Busca textual das ordens no servidor: número da OS e nome, CTO, endereço e
+-- telefone do cliente, sem acentos e em minúsculas (coluna search_text)
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE OR REPLACE VIEW service_orders_search AS
+SELECT o.*, lower(unaccent(concat_ws(' ', o.order_number, c.name, c.cto, c.address, c.phone))) AS search_text
+FROM service_orders o
+LEFT JOIN clients c ON c.id = o.client_id;
+
+-- Notificações de mudança (Supabase Realtime) usadas para invalidar os caches do app
+ALTER PUBLICATION supabase_realtime ADD TABLE service_orders, clients, services, technicians, equipment;
         """
         
         st.code(advanced_sql, language="sql")
     
+    with tab3:
+        st.markdown("**Tabelas de agregados usadas pelo Dashboard e Relatórios (opcional):**")
+        
+        rollup_sql = """
+-- AGREGADOS MANTIDOS POR TRIGGER: DASHBOARD E RELATÓRIOS LEEM ESTAS TABELAS
+-- EM VEZ DE BAIXAR TODAS AS ORDENS
+
+-- Contagem e receita por dia, status, tipo de serviço e região
+CREATE TABLE IF NOT EXISTS order_rollup_daily (
+    day DATE NOT NULL,
+    status TEXT NOT NULL,
+    service_type TEXT NOT NULL,
+    region TEXT NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status, service_type, region)
+);
+
+-- Produtividade por técnico e dia
+CREATE TABLE IF NOT EXISTS technician_rollup_daily (
+    day DATE NOT NULL,
+    technician_id BIGINT NOT NULL REFERENCES technicians(id),
+    orders INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    installations INTEGER NOT NULL DEFAULT 0,
+    repairs INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, technician_id)
+);
+
+-- Totais de todo o histórico (poucas linhas: status × tipo × região)
+CREATE OR REPLACE VIEW order_rollup_totals AS
+SELECT status, service_type, region, SUM(orders)::INTEGER AS orders, SUM(revenue) AS revenue
+FROM order_rollup_daily
+GROUP BY status, service_type, region;
+
+-- Soma (sign = 1) ou subtrai (sign = -1) uma ordem dos agregados, no tipo de serviço e região informados
+CREATE OR REPLACE FUNCTION apply_order_rollup(o service_orders, sign INTEGER, v_type TEXT, v_region TEXT)
+RETURNS VOID AS $$
+DECLARE
+    v_revenue DECIMAL(14,2);
+BEGIN
+    v_revenue := CASE WHEN o.status = 'Concluído' THEN COALESCE(o.estimated_cost, 0) ELSE 0 END;
+
+    INSERT INTO order_rollup_daily AS r (day, status, service_type, region, orders, revenue)
+    VALUES (o.scheduled_date, COALESCE(o.status, 'Agendado'), v_type, v_region, sign, sign * v_revenue)
+    ON CONFLICT (day, status, service_type, region) DO UPDATE
+    SET orders = r.orders + EXCLUDED.orders, revenue = r.revenue + EXCLUDED.revenue;
+
+    IF o.technician_id IS NOT NULL THEN
+        INSERT INTO technician_rollup_daily AS r (day, technician_id, orders, completed, installations, repairs, revenue)
+        VALUES (o.scheduled_date, o.technician_id, sign,
+                sign * (o.status = 'Concluído')::INTEGER,
+                sign * (v_type = 'Instalação')::INTEGER,
+                sign * (v_type = 'Reparo')::INTEGER,
+                sign * v_revenue)
+        ON CONFLICT (day, technician_id) DO UPDATE
+        SET orders = r.orders + EXCLUDED.orders,
+            completed = r.completed + EXCLUDED.completed,
+            installations = r.installations + EXCLUDED.installations,
+            repairs = r.repairs + EXCLUDED.repairs,
+            revenue = r.revenue + EXCLUDED.revenue;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mesmo, com o tipo e a região atuais do serviço e do técnico da ordem
+CREATE OR REPLACE FUNCTION apply_order_rollup(o service_orders, sign INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    PERFORM apply_order_rollup(o, sign,
+                               COALESCE((SELECT type FROM services WHERE id = o.service_id), 'Outros'),
+                               COALESCE((SELECT region FROM technicians WHERE id = o.technician_id), 'N/A'));
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION maintain_order_rollups()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_order_rollup(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_order_rollup(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS service_orders_rollups ON service_orders;
+CREATE TRIGGER service_orders_rollups
+    AFTER INSERT OR UPDATE OR DELETE ON service_orders
+    FOR EACH ROW EXECUTE FUNCTION maintain_order_rollups();
+
+-- Serviço que muda de tipo ou técnico que muda de região: as ordens dele saem do grupo
+-- antigo e entram no novo (senão a subtração de uma edição posterior cairia no grupo errado)
+CREATE OR REPLACE FUNCTION reclassify_service_rollups()
+RETURNS TRIGGER AS $$
+DECLARE
+    o service_orders;
+    v_region TEXT;
+BEGIN
+    FOR o IN SELECT * FROM service_orders WHERE service_id = NEW.id LOOP
+        v_region := COALESCE((SELECT region FROM technicians WHERE id = o.technician_id), 'N/A');
+        PERFORM apply_order_rollup(o, -1, COALESCE(OLD.type, 'Outros'), v_region);
+        PERFORM apply_order_rollup(o, 1, COALESCE(NEW.type, 'Outros'), v_region);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reclassify_technician_rollups()
+RETURNS TRIGGER AS $$
+DECLARE
+    o service_orders;
+    v_type TEXT;
+BEGIN
+    FOR o IN SELECT * FROM service_orders WHERE technician_id = NEW.id LOOP
+        v_type := COALESCE((SELECT type FROM services WHERE id = o.service_id), 'Outros');
+        PERFORM apply_order_rollup(o, -1, v_type, COALESCE(OLD.region, 'N/A'));
+        PERFORM apply_order_rollup(o, 1, v_type, COALESCE(NEW.region, 'N/A'));
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS services_rollups ON services;
+CREATE TRIGGER services_rollups
+    AFTER UPDATE OF type ON services
+    FOR EACH ROW WHEN (OLD.type IS DISTINCT FROM NEW.type)
+    EXECUTE FUNCTION reclassify_service_rollups();
+
+DROP TRIGGER IF EXISTS technicians_rollups ON technicians;
+CREATE TRIGGER technicians_rollups
+    AFTER UPDATE OF region ON technicians
+    FOR EACH ROW WHEN (OLD.region IS DISTINCT FROM NEW.region)
+    EXECUTE FUNCTION reclassify_technician_rollups();
+
+-- Carga inicial a partir das ordens existentes
+TRUNCATE order_rollup_daily, technician_rollup_daily;
+
+INSERT INTO order_rollup_daily (day, status, service_type, region, orders, revenue)
+SELECT o.scheduled_date, COALESCE(o.status, 'Agendado'), COALESCE(s.type, 'Outros'), COALESCE(t.region, 'N/A'),
+       COUNT(*), COALESCE(SUM(o.estimated_cost) FILTER (WHERE o.status = 'Concluído'), 0)
+FROM service_orders o
+LEFT JOIN services s ON s.id = o.service_id
+LEFT JOIN technicians t ON t.id = o.technician_id
+GROUP BY 1, 2, 3, 4;
+
+INSERT INTO technician_rollup_daily (day, technician_id, orders, completed, installations, repairs, revenue)
+SELECT o.scheduled_date, o.technician_id, COUNT(*),
+       COUNT(*) FILTER (WHERE o.status = 'Concluído'),
+       COUNT(*) FILTER (WHERE s.type = 'Instalação'),
+       COUNT(*) FILTER (WHERE s.type = 'Reparo'),
+       COALESCE(SUM(o.estimated_cost) FILTER (WHERE o.status = 'Concluído'), 0)
+FROM service_orders o
+LEFT JOIN services s ON s.id = o.service_id
+WHERE o.technician_id IS NOT NULL
+GROUP BY 1, 2;
+
+ALTER TABLE order_rollup_daily DISABLE ROW LEVEL SECURITY;
+ALTER TABLE technician_rollup_daily DISABLE ROW LEVEL SECURITY;
+        """
+        
+        st.code(rollup_sql, language="sql")
+        
+        st.info("ℹ️ Sem estas tabelas o Dashboard e os Relatórios continuam funcionando, calculando os indicadores a partir de todas as ordens.")
+    
     st.markdown("---")
     st.subheader("🔍 Status das Tabelas")
     
     # Verifica se as tabelas existem
     if st.button("🔍 Verificar Tabelas no Supabase"):
         manager = FiberOpticServiceManager()
-        if manager.supabase:
+        if manager.storage:
             try:
                 # Testa cada tabela
                 tables_status = {}
                 
                 # Testa clients
                 try:
-                    result = manager.supabase.table('clients').select('id').limit(1).execute()
+                    result = manager.storage.select('clients', 'id', limit=1)
                     tables_status['clients'] = "✅ OK"
                 except Exception as e:
                     tables_status['clients'] = f"❌ Erro: {str(e)[:50]}"
                 
                 # Testa services
                 try:
-                    result = manager.supabase.table('services').select('id').limit(1).execute()
+                    result = manager.storage.select('services', 'id', limit=1)
                     tables_status['services'] = "✅ OK"
                 except Exception as e:
                     tables_status['services'] = f"❌ Erro: {str(e)[:50]}"
                 
                 # Testa technicians
                 try:
-                    result = manager.supabase.table('technicians').select('id').limit(1).execute()
+                    result = manager.storage.select('technicians', 'id', limit=1)
                     tables_status['technicians'] = "✅ OK"
                 except Exception as e:
                     tables_status['technicians'] = f"❌ Erro: {str(e)[:50]}"
                 
                 # Testa equipment
                 try:
-                    result = manager.supabase.table('equipment').select('id').limit(1).execute()
+                    result = manager.storage.select('equipment', 'id', limit=1)
                     tables_status['equipment'] = "✅ OK"
                 except Exception as e:
                     tables_status['equipment'] = f"❌ Erro: {str(e)[:50]}"
                 
                 # Testa service_orders
                 try:
-                    result = manager.supabase.table('service_orders').select('id').limit(1).execute()
+                    result = manager.storage.select('service_orders', 'id', limit=1)
                     tables_status['service_orders'] = "✅ OK"
                 except Exception as e:
                     tables_status['service_orders'] = f"❌ Erro: {str(e)[:50]}"
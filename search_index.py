@@ -0,0 +1,279 @@
+import bisect
+import copy
+import itertools
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+# Pontuação por tipo de casamento do termo com um token
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+SUBSTRING_SCORE = 1
+
+# Peso de cada campo do cliente no ranking
+CLIENT_FIELDS = {"name": 4, "cto": 3, "phone": 2, "address": 1}
+
+# Pontuação dos casamentos pelo número da OS (acima de qualquer campo de cliente)
+ORDER_NUMBER_SCORES = {"exact": 40, "prefix": 30, "substring": 15}
+
+# Termos menores que isso só casam por token exato ou prefixo
+NGRAM_SIZE = 3
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+
+def normalize(text):
+    """Casefold sem acentos: "João" e "JOAO" viram "joao" """
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text):
+    return _TOKEN.findall(normalize(text))
+
+
+def _ngrams(token):
+    return {token[i:i + NGRAM_SIZE] for i in range(len(token) - NGRAM_SIZE + 1)}
+
+
+def _gather(offsets, token_positions):
+    """Índices das postings dos tokens informados (concatenação de faixas do CSR)"""
+    starts = offsets[token_positions]
+    lengths = offsets[token_positions + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    # arange por faixa sem laço: deslocamento de cada faixa repetido pelo seu tamanho
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return np.arange(total) + shifts
+
+
+class SearchIndex:
+    """Índice invertido de tokens com busca exata, por prefixo e por trecho (n-gramas).
+
+    `documents` é uma sequência de (id, {campo: texto}); `weights` dá o peso
+    de cada campo. As postings ficam em formato CSR (arrays numpy ordenados
+    por token), então um prefixo vira uma fatia contígua e a pontuação de
+    todos os documentos sai de operações vetorizadas.
+    """
+
+    def __init__(self, documents, weights):
+        best = defaultdict(dict)
+        ids = []
+        for position, (doc_id, fields) in enumerate(documents):
+            ids.append(doc_id)
+            for field, text in fields.items():
+                weight = weights.get(field, 1)
+                tokens = tokenize(text)
+                if field == "phone" and len(tokens) > 1:
+                    # Telefone também como um único número ("11999991111")
+                    tokens.append("".join(tokens))
+                for token in tokens:
+                    if weight > best[token].get(position, 0):
+                        best[token][position] = weight
+        self.ids = np.array(ids)
+        self.tokens = sorted(best)
+        lengths = [len(best[token]) for token in self.tokens]
+        self.offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        self.docs = np.fromiter((doc for token in self.tokens for doc in best[token]),
+                                dtype=np.int64, count=int(self.offsets[-1]))
+        self.weights = np.fromiter((weight for token in self.tokens for weight in best[token].values()),
+                                   dtype=np.float32, count=int(self.offsets[-1]))
+        grams = defaultdict(list)
+        for position, token in enumerate(self.tokens):
+            for gram in _ngrams(token):
+                grams[gram].append(position)
+        self.grams = {gram: np.array(positions) for gram, positions in grams.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def term_scores(self, term):
+        """Array com a pontuação de cada documento (na ordem de `ids`) para um termo normalizado"""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        low = bisect.bisect_left(self.tokens, term)
+        high = bisect.bisect_left(self.tokens, term + "\uffff")
+        if high > low:
+            postings = slice(self.offsets[low], self.offsets[high])
+            np.maximum.at(scores, self.docs[postings], self.weights[postings] * PREFIX_SCORE)
+            if self.tokens[low] == term:
+                exact = slice(self.offsets[low], self.offsets[low + 1])
+                np.maximum.at(scores, self.docs[exact], self.weights[exact] * EXACT_SCORE)
+        if len(term) >= NGRAM_SIZE:
+            candidates = None
+            for gram in _ngrams(term):
+                positions = self.grams.get(gram)
+                if positions is None:
+                    candidates = None
+                    break
+                candidates = positions if candidates is None else np.intersect1d(candidates, positions,
+                                                                                  assume_unique=True)
+            if candidates is not None:
+                # Confere o trecho (os n-gramas podem estar fora de ordem) e descarta os prefixos já contados
+                inner = np.array([p for p in candidates.tolist() if not low <= p < high and term in self.tokens[p]],
+                                 dtype=np.int64)
+                postings = _gather(self.offsets, inner)
+                if len(postings):
+                    np.maximum.at(scores, self.docs[postings], self.weights[postings] * SUBSTRING_SCORE)
+        return scores
+
+    def search(self, text, limit=None):
+        """[(id, pontuação)] dos documentos que contêm todos os termos, melhores primeiro"""
+        terms = tokenize(text)
+        if not terms or not len(self.ids):
+            return []
+        total = np.zeros(len(self.ids), dtype=np.float32)
+        matched = np.ones(len(self.ids), dtype=bool)
+        for term in terms:
+            scores = self.term_scores(term)
+            total += scores
+            matched &= scores > 0
+        positions = np.flatnonzero(matched)
+        positions = positions[np.argsort(-total[positions], kind="stable")][:limit]
+        return [(self.ids[p].item(), float(total[p])) for p in positions]
+
+
+class ClientSearchIndex(SearchIndex):
+    """Clientes por nome, CTO, endereço e telefone"""
+
+    def __init__(self, clients):
+        super().__init__(((client["id"], {field: client.get(field) for field in CLIENT_FIELDS})
+                          for client in clients), CLIENT_FIELDS)
+        self.positions = {client_id: position for position, client_id in enumerate(self.ids.tolist())}
+
+
+def client_fingerprint(clients):
+    """Identifica o conteúdo indexável da lista de clientes (para não refazer o índice à toa)"""
+    return hash(tuple((c.get("id"),) + tuple(c.get(field) for field in CLIENT_FIELDS) for c in clients))
+
+
+class OrderSearchIndex:
+    """Busca de OS pelo número ou pelos dados do cliente.
+
+    Números de OS ficam ordenados (prefixo = fatia, por bisect) e concatenados
+    numa única string (trecho via str.find). A pontuação dos clientes vem do
+    ClientSearchIndex e é levada às ordens por um array cliente-de-cada-OS.
+    Em empate, as OS com data agendada mais recente vêm primeiro.
+
+    OS alteradas depois da construção entram por `updated`: a versão antiga
+    é mascarada e a nova vai para uma lista pequena, varrida linha a linha.
+    """
+
+    def __init__(self, orders, client_index):
+        self.client_index = client_index
+        rows = sorted(self._row(order) for order in orders)
+        self.numbers = [row[0] for row in rows]
+        self._base_ids = np.array([row[1] for row in rows], dtype=object)
+        # Clientes sem cadastro apontam para uma posição extra, sempre com pontuação zero
+        self._base_clients = np.array([self._client_position(row[2]) for row in rows], dtype=np.int64)
+        dates = np.array([row[3] for row in rows], dtype=object)
+        by_date = np.argsort(dates, kind="stable")
+        self._base_recency = np.argsort(by_date, kind="stable").astype(np.float64)
+        self._sorted_dates = dates[by_date]
+        self._positions = {order_id: position for position, order_id in enumerate(self._base_ids.tolist())}
+        self._base_live = np.ones(len(rows), dtype=bool)
+        # "\n" separa os números; offsets[i] é onde começa o i-ésimo
+        self.haystack = "\n".join(self.numbers)
+        self.offsets = np.concatenate(([0], np.cumsum([len(number) + 1 for number in self.numbers])))
+        self.extra = {}
+        self.pending = 0
+        self._combine()
+
+    @staticmethod
+    def _row(order):
+        return (normalize(order.get("order_number")), order["id"], order.get("client_id"),
+                order.get("scheduled_date") or "")
+
+    def _client_position(self, client_id):
+        return self.client_index.positions.get(client_id, len(self.client_index))
+
+    def _combine(self):
+        """Arrays de busca: OS da construção seguidas das alteradas depois dela"""
+        extra = list(self.extra.items())
+        self.extra_numbers = [row[0] for _, row in extra]
+        self.ids = np.concatenate((self._base_ids, np.array([order_id for order_id, _ in extra], dtype=object)))
+        self.client_positions = np.concatenate(
+            (self._base_clients, np.array([row[1] for _, row in extra], dtype=np.int64)))
+        # Alteradas entram entre as da construção com a mesma data (desempate só precisa da ordem)
+        extra_recency = np.searchsorted(self._sorted_dates, np.array([row[2] for _, row in extra], dtype=object),
+                                        side="right") - 0.5
+        self.recency = np.concatenate((self._base_recency, extra_recency.astype(np.float64)))
+        self.live = np.concatenate((self._base_live, np.ones(len(extra), dtype=bool)))
+
+    def updated(self, orders, removed_ids=()):
+        """Cópia do índice com as OS de `orders` incluídas/atualizadas e as de `removed_ids` excluídas.
+
+        Não refaz o índice: custa proporcional às mudanças. `pending` conta as
+        OS alteradas desde a construção, para saber quando vale refazer tudo.
+        """
+        index = copy.copy(self)
+        index.extra = dict(self.extra)
+        index._base_live = self._base_live.copy()
+        touched = 0
+        for order_id in itertools.chain((order["id"] for order in orders), removed_ids):
+            position = self._positions.get(order_id)
+            if position is not None and index._base_live[position]:
+                index._base_live[position] = False
+                touched += 1
+            elif index.extra.pop(order_id, None) is None and position is None:
+                touched += 1
+        for order in orders:
+            number, order_id, client_id, scheduled = self._row(order)
+            index.extra[order_id] = (number, self._client_position(client_id), scheduled)
+        index.pending = self.pending + touched
+        index._combine()
+        return index
+
+    def _number_scores(self, term):
+        scores = np.zeros(len(self.numbers), dtype=np.float32)
+        low = bisect.bisect_left(self.numbers, term)
+        high = bisect.bisect_left(self.numbers, term + "\uffff")
+        if len(term) >= NGRAM_SIZE:
+            # A faixa dos prefixos é contígua na string: só o resto precisa de find
+            for begin, end in ((0, int(self.offsets[low])), (int(self.offsets[high]), len(self.haystack))):
+                hits = []
+                found = self.haystack.find(term, begin, end)
+                while found != -1:
+                    hits.append(found)
+                    found = self.haystack.find(term, found + 1, end)
+                if hits:
+                    scores[np.searchsorted(self.offsets, hits, side="right") - 1] = ORDER_NUMBER_SCORES["substring"]
+        scores[low:high] = ORDER_NUMBER_SCORES["prefix"]
+        if high > low and self.numbers[low] == term:
+            scores[low] = ORDER_NUMBER_SCORES["exact"]
+        return scores
+
+    def _extra_number_scores(self, term):
+        scores = np.zeros(len(self.extra_numbers), dtype=np.float32)
+        for position, number in enumerate(self.extra_numbers):
+            if number == term:
+                scores[position] = ORDER_NUMBER_SCORES["exact"]
+            elif number.startswith(term):
+                scores[position] = ORDER_NUMBER_SCORES["prefix"]
+            elif len(term) >= NGRAM_SIZE and term in number:
+                scores[position] = ORDER_NUMBER_SCORES["substring"]
+        return scores
+
+    def search(self, text, limit=20):
+        """[(id da OS, pontuação)], melhores primeiro"""
+        terms = tokenize(text)
+        if not terms or not len(self.ids):
+            return []
+        total = np.zeros(len(self.ids), dtype=np.float32)
+        matched = self.live.copy()
+        for term in terms:
+            client_scores = np.append(self.client_index.term_scores(term), np.float32(0))
+            numbers = np.concatenate((self._number_scores(term), self._extra_number_scores(term)))
+            scores = np.maximum(numbers, client_scores[self.client_positions])
+            total += scores
+            matched &= scores > 0
+        positions = np.flatnonzero(matched)
+        # Pontuação primeiro, data mais recente como desempate
+        keys = total[positions].astype(np.float64) * (len(self.numbers) + 1) + self.recency[positions]
+        if len(positions) > limit:
+            top = np.argpartition(-keys, limit - 1)[:limit]
+            positions, keys = positions[top], keys[top]
+        order = np.argsort(-keys, kind="stable")
+        return [(self.ids[p], float(total[p])) for p in positions[order]]
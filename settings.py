@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+from export import show_export
 
 def show_settings(manager):
     """Configurações específicas para fibra óptica"""
@@ -22,8 +23,16 @@ def show_settings(manager):
                     address = st.text_area("📍 Endereço Completo", height=100)
                     cto = st.text_input("🌐 CTO", placeholder="Ex: CTO-001")
                     plan = st.selectbox("📊 Plano", ["50MB", "100MB", "200MB", "300MB", "500MB", "1GB"])
+                # Coordenadas opcionais: sem elas o cliente entra na rota pelo horário agendado
+                col1, col2 = st.columns(2)
+                with col1:
+                    latitude = st.number_input("🧭 Latitude (opcional)", value=None, min_value=-90.0,
+                                               max_value=90.0, format="%.6f")
+                with col2:
+                    longitude = st.number_input("🧭 Longitude (opcional)", value=None, min_value=-180.0,
+                                                max_value=180.0, format="%.6f")
                 
-                if st.form_submit_button("➕ Adicionar Cliente"):
+                if st.form_submit_button("➕ Adicionar Cliente", disabled=manager.offline):
                     if name and phone and address:
                         new_client = {
                             "name": name,
@@ -33,6 +42,8 @@ def show_settings(manager):
                             "cto": cto,
                             "plan": plan
                         }
+                        if latitude is not None and longitude is not None:
+                            new_client.update(latitude=latitude, longitude=longitude)
                         result = manager.add_client(new_client)
                         if result:
                             st.success("✅ Cliente adicionado com sucesso!")
@@ -63,7 +74,7 @@ def show_settings(manager):
                     price = st.number_input("💰 Preço (R$)", min_value=0.0)
                     duration = st.number_input("⏱️ Duração (horas)", min_value=1, value=2)
                 
-                if st.form_submit_button("➕ Adicionar Serviço"):
+                if st.form_submit_button("➕ Adicionar Serviço", disabled=manager.offline):
                     if name:
                         new_service = {
                             "name": name,
@@ -102,7 +113,7 @@ def show_settings(manager):
                                         ["Centro", "Zona Sul", "Zona Norte", "Zona Oeste", "Zona Leste"])
                     level = st.selectbox("⭐ Nível", ["Júnior", "Pleno", "Sênior"])
                 
-                if st.form_submit_button("➕ Adicionar Técnico"):
+                if st.form_submit_button("➕ Adicionar Técnico", disabled=manager.offline):
                     if name:
                         new_tech = {
                             "name": name,
@@ -139,7 +150,7 @@ def show_settings(manager):
                 with col2:
                     price = st.number_input("💰 Preço (R$)", min_value=0.0)
                 
-                if st.form_submit_button("➕ Adicionar Equipamento"):
+                if st.form_submit_button("➕ Adicionar Equipamento", disabled=manager.offline):
                     if name:
                         new_equipment = {
                             "name": name,
@@ -170,15 +181,18 @@ def show_settings(manager):
     with col1:
         st.info("🗄️ **Banco de Dados**\nConectado ao Supabase")
         if st.button("🔄 Recarregar Dados", help="Recarrega todos os dados do banco"):
+            manager.cache.invalidate()
             st.rerun()
     
     with col2:
         st.info("📊 **Estatísticas**\nDados em tempo real")
-        orders = manager.get_all_orders()
-        clients = manager.get_all_clients()
-        st.metric("Total de Registros", len(orders) + len(clients))
+        counts, errors = manager.fetch_parallel({"orders": manager.get_all_orders, "clients": manager.get_all_clients})
+        manager.report_fetch_errors(errors)
+        st.metric("Total de Registros", sum(len(rows) for rows in counts.values()))
     
     with col3:
         st.info("🔗 **Integração**\nGoogle Calendar habilitado")
-        if st.button("📤 Exportar Relatório", help="Exporta dados para análise"):
-            st.info("📋 Funcionalidade em desenvolvimento")
\ No newline at end of file
+    
+    with st.expander("📤 Exportar Relatório", expanded=False):
+        st.caption("Exporta as ordens de serviço com cliente, serviço e técnico para análise")
+        show_export(manager)
\ No newline at end of file
@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from data_cache import TableCache
+from order_store import OrderStore
+from storage import StorageBackend, SQLiteStorage, fan_out
+
+SNAPSHOT_TABLES = ("clients", "services", "technicians", "equipment")
+
+# Ordens agendadas há mais que isso ficam fora do snapshot (as futuras entram todas)
+SNAPSHOT_ORDER_PAST_DAYS = 90
+SNAPSHOT_META_KEY = "snapshot_saved_at"
+
+# No modo offline os dados não mudam: o cache do snapshot não precisa expirar cedo
+OFFLINE_CACHE_TTL = 24 * 3600
+
+
+class OfflineError(RuntimeError):
+    """Escrita tentada com o backend indisponível (dados servidos do snapshot)"""
+
+
+class ReadOnlyStorage(StorageBackend):
+    """Snapshot local servido como backend somente leitura"""
+
+    name = "snapshot"
+
+    def __init__(self, storage, saved_at):
+        self.storage = storage
+        self.saved_at = saved_at
+
+    def select(self, table, columns="*", filters=(), order=(), limit=None, offset=0, count=False):
+        return self.storage.select(table, columns, filters=filters, order=order, limit=limit, offset=offset,
+                                   count=count)
+
+    def _read_only(self, *args, **kwargs):
+        raise OfflineError("sem conexão com o banco de dados; modo somente leitura")
+
+    insert = update = delete = upsert = _read_only
+
+
+def recent_orders(orders, today=None, past_days=SNAPSHOT_ORDER_PAST_DAYS):
+    """Ordens agendadas a partir de `past_days` dias atrás"""
+    since = ((today or date.today()) - timedelta(days=past_days)).isoformat()
+    return [order for order in orders if str(order.get("scheduled_date") or "")[:10] >= since]
+
+
+def write_snapshot(path, tables, orders, saved_at=None):
+    """Grava tabelas de referência (dict nome -> linhas) e ordens num arquivo SQLite.
+
+    O arquivo é montado em memória e trocado de uma vez (os.replace): quem
+    lê nunca vê um snapshot pela metade. Colunas que o schema local não tem
+    são descartadas. Retorna o instante gravado (UTC).
+    """
+    saved_at = saved_at or datetime.now(timezone.utc)
+    storage = SQLiteStorage(":memory:")
+    connection = storage.connection
+    with storage._lock, connection:
+        for table, rows in list(tables.items()) + [("service_orders", orders)]:
+            known = [row["name"] for row in connection.execute(f"PRAGMA table_info({table})")]
+            columns = [column for column in known if rows and column in rows[0]]
+            if not columns:
+                continue
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [[storage._encode(column, row.get(column)) for column in columns] for row in rows])
+        connection.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)",
+                           (SNAPSHOT_META_KEY, saved_at.isoformat()))
+    temporary = f"{path}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    target = sqlite3.connect(temporary)
+    try:
+        connection.backup(target)
+    finally:
+        target.close()
+        connection.close()
+    os.replace(temporary, path)
+    return saved_at
+
+
+def load_snapshot(path):
+    """Copia o snapshot para um SQLiteStorage em memória; retorna (storage, salvo_em) ou (None, None).
+
+    A cópia em memória não segura o arquivo aberto, então um snapshot novo
+    pode substituí-lo a qualquer momento.
+    """
+    if not path or not os.path.exists(path):
+        return None, None
+    storage = SQLiteStorage(":memory:")
+    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        source.backup(storage.connection)
+    except sqlite3.Error:
+        return None, None
+    finally:
+        source.close()
+    rows, _ = storage.select("app_meta", "value", filters=[("key", "eq", SNAPSHOT_META_KEY)])
+    if not rows:
+        return None, None
+    return storage, datetime.fromisoformat(rows[0]["value"])
+
+
+def snapshot_rows(storage):
+    """Tabelas de referência e ordens do snapshot: (dict nome -> linhas, ordens)"""
+    tables = {table: storage.select(table, order=["id"])[0] for table in SNAPSHOT_TABLES}
+    return tables, storage.select("service_orders", order=["id"])[0]
+
+
+def age_text(saved_at, now=None):
+    """Idade do snapshot por extenso ("há 5 min", "há 3 h", "há 2 dias")"""
+    seconds = max(((now or datetime.now(timezone.utc)) - saved_at).total_seconds(), 0)
+    if seconds < 3600:
+        return f"há {int(seconds // 60)} min"
+    if seconds < 2 * 86400:
+        return f"há {int(seconds // 3600)} h"
+    return f"há {int(seconds // 86400)} dias"
+
+
+class SnapshotState:
+    """Estado do snapshot local no processo, compartilhado entre sessões.
+
+    Guarda quando o snapshot foi gravado, se as páginas ainda estão sendo
+    servidas por ele depois de um cold start, a última verificação do backend
+    e, no modo offline, o backend somente leitura com cache e cópia de ordens
+    próprios (os do modo normal não são misturados com dados antigos).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.saved_at = None
+        # Instante do snapshot que está servindo as páginas até a carga completa terminar
+        self.serving_since = None
+        # Dados do cold start ainda não substituídos por uma carga completa do backend
+        self.refresh_pending = False
+        self.last_error = None
+        self._available = True
+        self._probed_at = None
+        self._offline = None
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def backend_available(self, probe, timeout, interval):
+        """Resultado de `probe()` (sem exceção em até `timeout` s), refeito no máximo a cada `interval` s"""
+        with self._lock:
+            now = time.monotonic()
+            if self._probed_at is not None and now - self._probed_at < interval:
+                return self._available
+            # Marca antes de testar: reruns simultâneos não repetem a verificação
+            self._probed_at = now
+        _, errors = fan_out({"probe": probe}, timeout)
+        with self._lock:
+            self._available = not errors
+            if errors:
+                self.last_error = errors["probe"]
+            return self._available
+
+    def backend_failed(self, error):
+        """Falha numa carga do backend: sai do cold start e marca o backend como
+        indisponível até a próxima verificação (que roda após o intervalo)"""
+        with self._lock:
+            self.serving_since = None
+            self.last_error = error
+            self._available = False
+            self._probed_at = time.monotonic()
+
+    def offline_resources(self):
+        """(ReadOnlyStorage, TableCache, OrderStore) sobre o snapshot em disco, ou None sem snapshot"""
+        with self._lock:
+            if self._offline is None:
+                storage, saved_at = load_snapshot(self.path)
+                if storage is None:
+                    return None
+                self.saved_at = self.saved_at or saved_at
+                self._offline = (ReadOnlyStorage(storage, saved_at), TableCache(ttl=OFFLINE_CACHE_TTL), OrderStore())
+            return self._offline
+
+    def run_in_background(self, target):
+        """Executa `target` numa thread daemon se nenhuma outra estiver rodando; True se disparou"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return False
+            self._worker = threading.Thread(target=self._run, args=(target,), name="snapshot", daemon=True)
+            self._worker.start()
+            return True
+
+    def _run(self, target):
+        try:
+            target()
+        except Exception as e:
+            self.last_error = e
+
+    def saved(self, saved_at):
+        """Registra um snapshot novo; o modo offline passa a usá-lo na próxima vez"""
+        with self._lock:
+            self.saved_at = saved_at
+            self._offline = None
+
+    def due(self, interval):
+        """True se não há snapshot gravado neste processo há mais de `interval` segundos"""
+        return self.saved_at is None or (datetime.now(timezone.utc) - self.saved_at).total_seconds() >= interval
+
+    @property
+    def refreshing(self):
+        return self._worker is not None and self._worker.is_alive()
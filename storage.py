@@ -0,0 +1,521 @@
+import contextvars
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Filtros são tuplas (coluna, operador, valor). Operadores: eq, neq, gt, gte,
+# lt, lte, in, ilike (padrão SQL com %) e ("", "or", [filtros]) para OR.
+# Ordenação é uma lista de colunas ou de tuplas (coluna, desc).
+
+# Linhas por página nas leituras em lote (limite padrão de max-rows do PostgREST)
+DEFAULT_PAGE_SIZE = 1000
+
+# Relações embutidas aceitas nas seleções: nome da tabela -> chave estrangeira em service_orders
+EMBEDDED_RELATIONS = {"clients": "client_id", "services": "service_id", "technicians": "technician_id"}
+
+
+def _order_terms(order):
+    return [(term, False) if isinstance(term, str) else term for term in order]
+
+
+class StorageBackend:
+    """Operações de dados usadas pelo FiberOpticServiceManager.
+
+    `select` devolve (linhas, total); total só é calculado com `count=True`.
+    `columns` segue a sintaxe de seleção do PostgREST, inclusive relações
+    embutidas como "id,clients(name,cto)". Escritas devolvem as linhas afetadas.
+    """
+
+    name = None
+    # Máximo de linhas por resposta imposto pelo servidor (None: o limite pedido é respeitado)
+    max_rows = None
+
+    def select(self, table, columns="*", filters=(), order=(), limit=None, offset=0, count=False):
+        raise NotImplementedError
+
+    def insert(self, table, rows):
+        raise NotImplementedError
+
+    def update(self, table, values, filters):
+        raise NotImplementedError
+
+    def delete(self, table, filters):
+        raise NotImplementedError
+
+    def upsert(self, table, rows):
+        raise NotImplementedError
+
+
+def iter_rows(storage, table, columns="*", filters=(), chunk_size=DEFAULT_PAGE_SIZE, workers=1):
+    """Todas as linhas de `table` em páginas de até `chunk_size`, em ordem de id.
+
+    Pagina por chave (id > último visto), não por offset: cada página custa o
+    mesmo em qualquer profundidade. `chunk_size` é limitado ao `max_rows` do
+    backend, e com limite no servidor a leitura só termina numa página vazia:
+    uma resposta truncada abaixo do pedido não é confundida com o fim. Com
+    `workers > 1` e sem filtros, a faixa de ids é dividida em intervalos de
+    `chunk_size` ids buscados em paralelo; as páginas continuam saindo em
+    ordem e no máximo 2 * workers ficam em memória. Com filtros a leitura é
+    sempre sequencial: as linhas que passam ficam espalhadas pela faixa de
+    ids, e dividi-la geraria uma requisição por intervalo quase vazio.
+    """
+    if storage.max_rows:
+        chunk_size = min(chunk_size, storage.max_rows)
+    own, relations = parse_select(columns)
+    if own not in (["*"], []) and "id" not in own:
+        columns = ",".join(["id"] + own + [f"{name}({','.join(fields)})" for name, fields in relations.items()])
+    filters = list(filters)
+    if workers > 1 and not filters:
+        yield from _iter_id_ranges(storage, table, columns, filters, chunk_size, workers)
+        return
+    last_id = None
+    while True:
+        page_filters = filters + ([("id", "gt", last_id)] if last_id is not None else [])
+        page, _ = storage.select(table, columns, filters=page_filters, order=["id"], limit=chunk_size)
+        if not page:
+            return
+        yield page
+        # Sem limite no servidor o limite pedido é respeitado: página curta é a última
+        if not storage.max_rows and len(page) < chunk_size:
+            return
+        last_id = page[-1]["id"]
+
+
+def _iter_id_ranges(storage, table, columns, filters, chunk_size, workers):
+    first, _ = storage.select(table, "id", filters=filters, order=["id"], limit=1)
+    last, _ = storage.select(table, "id", filters=filters, order=[("id", True)], limit=1)
+    if not first:
+        return
+    low, high = first[0]["id"], last[0]["id"]
+    if not isinstance(low, int):
+        # Ids não numéricos não se dividem em faixas: volta para a leitura sequencial
+        yield from iter_rows(storage, table, columns, filters, chunk_size)
+        return
+
+    def fetch(start):
+        # Ids são únicos e a faixa tem no máximo `chunk_size` (<= max_rows) ids:
+        # cabe numa resposta, e uma página curta só quer dizer ids faltando
+        page_filters = filters + [("id", "gte", start), ("id", "lt", start + chunk_size)]
+        return storage.select(table, columns, filters=page_filters, order=["id"], limit=chunk_size)[0]
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for start in range(low, high + 1, chunk_size):
+            # Cada tarefa roda numa cópia do contexto: métricas do rerun corrente continuam valendo
+            pending.append(pool.submit(contextvars.copy_context().run, fetch, start))
+            if len(pending) >= 2 * workers:
+                page = pending.popleft().result()
+                if page:
+                    yield page
+        while pending:
+            page = pending.popleft().result()
+            if page:
+                yield page
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def fan_out(calls, timeout=None):
+    """Executa funções sem argumentos ao mesmo tempo, uma thread para cada.
+
+    `calls` é um dict nome -> função. `timeout` (segundos, ou dict nome ->
+    segundos) é o prazo de cada chamada, contado do disparo de todas: a
+    espera total fica perto da chamada mais lenta, não da soma. Cada tarefa
+    roda numa cópia do contexto (contextvars) de quem chamou. Retorna
+    (resultados, erros), dicts por nome; em `erros` fica a exceção levantada
+    ou um TimeoutError. Uma chamada que estoura o prazo não é interrompida,
+    só tem o resultado descartado.
+    """
+    if not calls:
+        return {}, {}
+    pool = ThreadPoolExecutor(max_workers=len(calls))
+    started = time.monotonic()
+    futures = {name: pool.submit(contextvars.copy_context().run, call) for name, call in calls.items()}
+    results, errors = {}, {}
+    try:
+        for name, future in futures.items():
+            limit = timeout.get(name) if isinstance(timeout, dict) else timeout
+            remaining = None if limit is None else max(started + limit - time.monotonic(), 0)
+            try:
+                results[name] = future.result(timeout=remaining)
+            except TimeoutError as e:
+                errors[name] = e if future.done() else TimeoutError(f"sem resposta em {limit:g}s")
+            except Exception as e:
+                errors[name] = e
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, errors
+
+
+class SupabaseStorage(StorageBackend):
+    """Backend sobre o cliente Supabase (PostgREST)"""
+
+    name = "supabase"
+    max_rows = DEFAULT_PAGE_SIZE
+
+    def __init__(self, client):
+        self.client = client
+
+    def select(self, table, columns="*", filters=(), order=(), limit=None, offset=0, count=False):
+        query = self.client.table(table).select(columns, count="exact" if count else None)
+        query = self._apply_filters(query, filters)
+        for column, desc in _order_terms(order):
+            query = query.order(column, desc=desc)
+        if limit is not None:
+            query = query.range(offset, offset + limit - 1)
+        result = query.execute()
+        return result.data, result.count
+
+    def insert(self, table, rows):
+        return self.client.table(table).insert(rows).execute().data
+
+    def update(self, table, values, filters):
+        return self._apply_filters(self.client.table(table).update(values), filters).execute().data
+
+    def delete(self, table, filters):
+        return self._apply_filters(self.client.table(table).delete(), filters).execute().data
+
+    def upsert(self, table, rows):
+        return self.client.table(table).upsert(rows).execute().data
+
+    def _apply_filters(self, query, filters):
+        for column, op, value in filters:
+            if op == "or":
+                query = query.or_(",".join(self._or_term(*term) for term in value))
+            elif op == "in":
+                query = query.in_(column, list(value))
+            else:
+                query = getattr(query, op)(column, value)
+        return query
+
+    @staticmethod
+    def _or_term(column, op, value):
+        if op == "in":
+            return f"{column}.in.({','.join(str(v) for v in value)})"
+        if op == "ilike":
+            # Na sintaxe or=(...) o curinga é *; reservados viram curinga de um caractere
+            value = re.sub(r'[,()*:."\\]', "_", value).replace("%", "*")
+        return f"{column}.{op}.{value}"
+
+
+# Letras acentuadas do Latin-1 e Latin Extended-A -> letra base: cobre quase todo texto
+# em português sem o NFKD, que domina o custo de um ilike sobre dezenas de milhares de linhas
+_ACCENT_FOLD = {code: base for code, (base, *marks) in
+                ((code, unicodedata.normalize("NFKD", chr(code))) for code in range(0xC0, 0x180))
+                if base.isascii() and marks and all(unicodedata.combining(mark) for mark in marks)}
+
+
+def _casefold(value):
+    if value is None:
+        return None
+    text = str(value).translate(_ACCENT_FOLD)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return text.casefold()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clients (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    email TEXT,
+    address TEXT NOT NULL,
+    cto TEXT,
+    plan TEXT,
+    latitude REAL,
+    longitude REAL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS services (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    price REAL DEFAULT 0,
+    duration INTEGER DEFAULT 2,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS technicians (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    specialty TEXT NOT NULL,
+    region TEXT NOT NULL,
+    level TEXT NOT NULL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS equipment (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    price REAL DEFAULT 0,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS service_orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_number TEXT NOT NULL UNIQUE,
+    client_id INTEGER REFERENCES clients(id),
+    service_id INTEGER REFERENCES services(id),
+    technician_id INTEGER REFERENCES technicians(id),
+    scheduled_date TEXT NOT NULL,
+    scheduled_time TEXT NOT NULL,
+    description TEXT NOT NULL,
+    status TEXT DEFAULT 'Agendado',
+    priority TEXT DEFAULT 'Normal',
+    estimated_cost REAL DEFAULT 0,
+    signal_level TEXT,
+    observations TEXT,
+    cto_reference TEXT,
+    completed_at TEXT,
+    customer_satisfaction INTEGER,
+    equipment_used TEXT DEFAULT '[]',
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS app_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_service_orders_status ON service_orders(status);
+CREATE INDEX IF NOT EXISTS idx_service_orders_scheduled_date ON service_orders(scheduled_date);
+CREATE INDEX IF NOT EXISTS idx_service_orders_client_id ON service_orders(client_id);
+CREATE INDEX IF NOT EXISTS idx_service_orders_technician_id ON service_orders(technician_id);
+CREATE INDEX IF NOT EXISTS idx_service_orders_service_id ON service_orders(service_id);
+CREATE INDEX IF NOT EXISTS idx_service_orders_priority ON service_orders(priority);
+CREATE INDEX IF NOT EXISTS idx_service_orders_updated_at ON service_orders(updated_at);
+
+CREATE TRIGGER IF NOT EXISTS update_service_orders_updated_at
+AFTER UPDATE ON service_orders FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE service_orders SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE id = NEW.id;
+END;
+
+-- Busca textual das ordens: número da OS e nome, CTO, endereço e telefone do cliente.
+-- Aqui o texto fica cru: o ilike do SQLite já compara sem acentos (casefold nos dois lados)
+CREATE VIEW IF NOT EXISTS service_orders_search AS
+SELECT o.*, COALESCE(o.order_number, '') || ' ' || COALESCE(c.name, '') || ' ' || COALESCE(c.cto, '')
+            || ' ' || COALESCE(c.address, '') || ' ' || COALESCE(c.phone, '') AS search_text
+FROM service_orders o
+LEFT JOIN clients c ON c.id = o.client_id;
+
+-- Rollups como views: mesmas colunas das tabelas mantidas por trigger no Supabase
+CREATE VIEW IF NOT EXISTS order_rollup_daily AS
+SELECT o.scheduled_date AS day, COALESCE(o.status, 'Agendado') AS status,
+       COALESCE(s.type, 'Outros') AS service_type, COALESCE(t.region, 'N/A') AS region,
+       COUNT(*) AS orders,
+       COALESCE(SUM(CASE WHEN o.status = 'Concluído' THEN o.estimated_cost END), 0) AS revenue
+FROM service_orders o
+LEFT JOIN services s ON s.id = o.service_id
+LEFT JOIN technicians t ON t.id = o.technician_id
+GROUP BY 1, 2, 3, 4;
+
+CREATE VIEW IF NOT EXISTS order_rollup_totals AS
+SELECT status, service_type, region, SUM(orders) AS orders, SUM(revenue) AS revenue
+FROM order_rollup_daily
+GROUP BY status, service_type, region;
+
+CREATE VIEW IF NOT EXISTS technician_rollup_daily AS
+SELECT o.scheduled_date AS day, o.technician_id, COUNT(*) AS orders,
+       SUM(o.status = 'Concluído') AS completed,
+       SUM(s.type = 'Instalação') AS installations,
+       SUM(s.type = 'Reparo') AS repairs,
+       COALESCE(SUM(CASE WHEN o.status = 'Concluído' THEN o.estimated_cost END), 0) AS revenue
+FROM service_orders o
+LEFT JOIN services s ON s.id = o.service_id
+WHERE o.technician_id IS NOT NULL
+GROUP BY 1, 2;
+"""
+
+# Colunas adicionadas depois da primeira versão do schema: (tabela, coluna, tipo),
+# criadas ao abrir um arquivo antigo
+SQLITE_ADDED_COLUMNS = [
+    ("clients", "latitude", "REAL"),
+    ("clients", "longitude", "REAL"),
+]
+
+# Colunas guardadas como JSON em texto no SQLite (JSONB no Supabase)
+JSON_COLUMNS = {"equipment_used"}
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_SQL_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _ident(name):
+    if not _IDENTIFIER.fullmatch(name):
+        raise ValueError(f"Identificador inválido: {name!r}")
+    return f'"{name}"'
+
+
+def parse_select(columns):
+    """Separa uma seleção PostgREST em colunas próprias e relações embutidas"""
+    own, relations = [], {}
+    for term in re.findall(r"\w+\([^)]*\)|[^,]+", columns.replace(" ", "")):
+        match = re.fullmatch(r"(\w+)\(([^)]*)\)", term)
+        if match:
+            relations[match.group(1)] = match.group(2).split(",")
+        elif term:
+            own.append(term)
+    return own, relations
+
+
+class SQLiteStorage(StorageBackend):
+    """Backend local em SQLite (arquivo ou ":memory:") com o mesmo schema e índices.
+
+    Serve como modo offline e como base determinística para benchmarks.
+    Uma única conexão é compartilhada entre threads, protegida por lock.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.create_function("casefold", 1, _casefold, deterministic=True)
+        self.connection.execute("PRAGMA journal_mode=WAL" if path != ":memory:" else "PRAGMA journal_mode=MEMORY")
+        self.connection.executescript(SQLITE_SCHEMA)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        for table, column, kind in SQLITE_ADDED_COLUMNS:
+            existing = {row["name"] for row in self.connection.execute(f"PRAGMA table_info({_ident(table)})")}
+            if column not in existing:
+                self.connection.execute(f"ALTER TABLE {_ident(table)} ADD COLUMN {_ident(column)} {kind}")
+
+    def select(self, table, columns="*", filters=(), order=(), limit=None, offset=0, count=False):
+        own, relations = parse_select(columns)
+        if own == ["*"] or not own:
+            column_sql = "*"
+        else:
+            # Chaves estrangeiras das relações embutidas entram na consulta e saem do resultado
+            extra = [EMBEDDED_RELATIONS[name] for name in relations if EMBEDDED_RELATIONS[name] not in own]
+            column_sql = ", ".join(_ident(column) for column in own + extra)
+        where_sql, params = self._where(filters)
+        sql = f"SELECT {column_sql} FROM {_ident(table)}{where_sql}"
+        terms = _order_terms(order)
+        if terms:
+            sql += " ORDER BY " + ", ".join(f"{_ident(c)} {'DESC' if desc else 'ASC'}" for c, desc in terms)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        with self._lock:
+            rows = [self._decode(row) for row in self.connection.execute(sql, params)]
+            total = None
+            if count:
+                total = self.connection.execute(f"SELECT COUNT(*) FROM {_ident(table)}{where_sql}", params).fetchone()[0]
+            if relations:
+                self._embed(rows, relations, drop_keys=own not in (["*"], []) and set(extra))
+        return rows, total
+
+    def insert(self, table, rows):
+        rows = [rows] if isinstance(rows, dict) else rows
+        inserted = []
+        with self._lock, self.connection:
+            for row in rows:
+                columns = list(row)
+                sql = (f"INSERT INTO {_ident(table)} ({', '.join(_ident(c) for c in columns)}) "
+                       f"VALUES ({', '.join('?' for _ in columns)}) RETURNING *")
+                cursor = self.connection.execute(sql, [self._encode(c, row[c]) for c in columns])
+                inserted.append(self._decode(cursor.fetchone()))
+        return inserted
+
+    def update(self, table, values, filters):
+        columns = list(values)
+        where_sql, params = self._where(filters)
+        sql = (f"UPDATE {_ident(table)} SET {', '.join(f'{_ident(c)} = ?' for c in columns)}"
+               f"{where_sql} RETURNING *")
+        with self._lock, self.connection:
+            cursor = self.connection.execute(sql, [self._encode(c, values[c]) for c in columns] + params)
+            rows = [self._decode(row) for row in cursor.fetchall()]
+        # RETURNING é avaliado antes do trigger de updated_at; relê as linhas atualizadas
+        if rows and table == "service_orders":
+            rows, _ = self.select(table, filters=[("id", "in", [row["id"] for row in rows])], order=["id"])
+        return rows
+
+    def delete(self, table, filters):
+        where_sql, params = self._where(filters)
+        with self._lock, self.connection:
+            cursor = self.connection.execute(f"DELETE FROM {_ident(table)}{where_sql} RETURNING *", params)
+            return [self._decode(row) for row in cursor.fetchall()]
+
+    def upsert(self, table, rows):
+        rows = [rows] if isinstance(rows, dict) else rows
+        upserted = []
+        with self._lock, self.connection:
+            for row in rows:
+                columns = list(row)
+                sql = (f"INSERT OR REPLACE INTO {_ident(table)} ({', '.join(_ident(c) for c in columns)}) "
+                       f"VALUES ({', '.join('?' for _ in columns)}) RETURNING *")
+                cursor = self.connection.execute(sql, [self._encode(c, row[c]) for c in columns])
+                upserted.append(self._decode(cursor.fetchone()))
+        return upserted
+
+    def _where(self, filters):
+        clauses, params = [], []
+        for column, op, value in filters:
+            clause, clause_params = self._condition(column, op, value)
+            clauses.append(clause)
+            params.extend(clause_params)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _condition(self, column, op, value):
+        if op == "or":
+            parts = [self._condition(*term) for term in value]
+            return "(" + " OR ".join(clause for clause, _ in parts) + ")", [p for _, ps in parts for p in ps]
+        if op == "in":
+            values = list(value)
+            if not values:
+                return "0", []
+            return f"{_ident(column)} IN ({', '.join('?' for _ in values)})", values
+        if op == "ilike":
+            return f"casefold({_ident(column)}) LIKE casefold(?)", [value]
+        return f"{_ident(column)} {_SQL_OPERATORS[op]} ?", [value]
+
+    def _embed(self, rows, relations, drop_keys):
+        for relation, columns in relations.items():
+            foreign_key = EMBEDDED_RELATIONS[relation]
+            ids = sorted({row[foreign_key] for row in rows if row.get(foreign_key) is not None})
+            related = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                column_sql = ", ".join(_ident(c) for c in dict.fromkeys(["id"] + columns))
+                sql = f"SELECT {column_sql} FROM {_ident(relation)} WHERE id IN ({', '.join('?' for _ in chunk)})"
+                for item in self.connection.execute(sql, chunk):
+                    item = dict(item)
+                    related[item["id"]] = {c: item[c] for c in columns}
+            for row in rows:
+                row[relation] = related.get(row.get(foreign_key))
+        if drop_keys:
+            for row in rows:
+                for key in drop_keys:
+                    row.pop(key, None)
+
+    @staticmethod
+    def _encode(column, value):
+        if column in JSON_COLUMNS or isinstance(value, (list, dict)):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    @staticmethod
+    def _decode(row):
+        data = dict(row)
+        for column in JSON_COLUMNS & data.keys():
+            if isinstance(data[column], str):
+                try:
+                    data[column] = json.loads(data[column])
+                except ValueError:
+                    pass
+        return data
@@ -0,0 +1,53 @@
+from datetime import date, datetime, time
+
+import pandas as pd
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+from bulk_import import prepare_orders, read_import_file
+
+CLIENTS = [{"id": 1, "name": "João Silva"}]
+SERVICES = [{"id": 2, "name": "Instalação Fibra 100MB", "price": 150.0}]
+TECHNICIANS = [{"id": 3, "name": "Carlos Técnico"}]
+HEADER = ["Cliente", "Serviço", "Técnico", "Data", "Hora", "Descrição"]
+
+
+@pytest.fixture
+def xlsx_path(tmp_path):
+    """Planilha real: linha 2 com células nativas de data e hora, linha 3 com os mesmos valores como texto"""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    sheet.append(["João Silva", "Instalação Fibra 100MB", "Carlos Técnico", datetime(2026, 11, 3), time(9, 0),
+                  "Instalação nova"])
+    sheet.append(["João Silva", "Instalação Fibra 100MB", "Carlos Técnico", "03/11/2026", "09:00",
+                  "Instalação nova"])
+    path = tmp_path / "ordens.xlsx"
+    workbook.save(path)
+    return path
+
+
+def test_xlsx_native_date_and_time_cells(xlsx_path):
+    df = read_import_file(str(xlsx_path))
+    orders, source_rows, errors = prepare_orders(df, CLIENTS, SERVICES, TECHNICIANS)
+    assert errors.empty
+    assert [order["scheduled_date"] for order in orders] == ["2026-11-03", "2026-11-03"]
+    assert [order["scheduled_time"] for order in orders] == ["09:00", "09:00"]
+    assert list(source_rows) == [2, 3]
+
+
+def test_iso_dates_are_not_read_day_first():
+    df = pd.DataFrame([["João Silva", "Instalação Fibra 100MB", "Carlos Técnico", "2026-11-03", "09:00", "x"]],
+                      columns=HEADER, dtype=str)
+    orders, _, errors = prepare_orders(df, CLIENTS, SERVICES, TECHNICIANS)
+    assert errors.empty
+    assert date.fromisoformat(orders[0]["scheduled_date"]) == date(2026, 11, 3)
+
+
+def test_unknown_date_format_is_rejected():
+    df = pd.DataFrame([["João Silva", "Instalação Fibra 100MB", "Carlos Técnico", "11-03-2026", "09:00", "x"]],
+                      columns=HEADER, dtype=str)
+    orders, _, errors = prepare_orders(df, CLIENTS, SERVICES, TECHNICIANS)
+    assert not orders
+    assert errors["Erro"].str.contains("data inválida").all()
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from order_store import OrderStore
+from search_index import ClientSearchIndex, OrderSearchIndex
+
+CLIENTS = [
+    {"id": 1, "name": "João Silva", "cto": "CTO-001", "phone": "(11) 99999-1111", "address": "Rua Paulista, 10"},
+    {"id": 2, "name": "Maria Souza", "cto": "CTO-002", "phone": "(11) 98888-2222", "address": "Av. Brasil, 200"},
+    {"id": 3, "name": "José Santos", "cto": "CTO-013", "phone": "(21) 97777-3333", "address": "Rua das Flores, 3"},
+]
+
+QUERIES = ["os0", "os00012", "0001", "joao", "silva os0001", "cto-01", "souza", "paulista", "xyz"]
+
+
+def _order(order_id, client_id, day):
+    return {"id": order_id, "order_number": f"OS{order_id:06d}", "client_id": client_id,
+            "scheduled_date": f"2026-11-{day:02d}"}
+
+
+@pytest.fixture
+def client_index():
+    return ClientSearchIndex(CLIENTS)
+
+
+def test_updated_index_matches_full_rebuild(client_index):
+    rng = random.Random(7)
+    orders = {i: _order(i, rng.choice([1, 2, 3, 99]), rng.randint(1, 28)) for i in range(1, 301)}
+    index = OrderSearchIndex(orders.values(), client_index)
+    for _ in range(5):
+        changed = [_order(i, rng.choice([1, 2, 3]), rng.randint(1, 28)) for i in rng.sample(range(1, 400), 20)]
+        removed = [i for i in rng.sample(range(1, 400), 10) if i not in {o["id"] for o in changed}]
+        orders.update({o["id"]: o for o in changed})
+        for order_id in removed:
+            orders.pop(order_id, None)
+        index = index.updated(changed, removed)
+        rebuilt = OrderSearchIndex(orders.values(), client_index)
+        for query in QUERIES:
+            got = index.search(query, limit=1000)
+            expected = rebuilt.search(query, limit=1000)
+            assert sorted(got) == sorted(expected), query
+            assert [score for _, score in got] == [score for _, score in expected], query
+
+
+def test_changes_since_reports_ids_until_full_reload():
+    store = OrderStore()
+    store.seed([_order(1, 1, 1), _order(2, 2, 2)])
+    built = store.version
+    store.upsert([dict(_order(1, 1, 1), scheduled_date="2026-11-05")])
+    store.remove([2])
+    version, changed = store.changes_since(built)
+    assert version == store.version
+    assert sorted(changed) == [1, 2]
+    assert store.changes_since(version) == (version, [])
+    store._replace([_order(3, 3, 3)])
+    assert store.changes_since(version) == (store.version, None)